@@ -1,18 +1,28 @@
 import argparse
+import functools
+import importlib
 import logging
 import os
 import sys
 
-from pysmt import shortcuts
-
+from analyzeframework import cache
 from analyzeframework import chaotic
 from analyzeframework import cfg
+from analyzeframework import profiling
 from analyzeframework import viz
-from analyzenumerical import sum
-from analyzenumerical import parser as num_parser
-from analyzenumerical import parity
-from analyzeshape import shape
-from analyzeshape import parser as shape_parser
+
+ANALYSES = ('parity', 'parity-bits', 'sum', 'shape')
+
+# analysis -> (domain module, state class, front end package). Nothing of an
+# analysis is imported before it is chosen, see tests/test_startup.py.
+_FRONTENDS = {
+    'parity': ('analyzenumerical.parity', 'ParityState', 'analyzenumerical'),
+    'parity-bits': ('analyzenumerical.bitparity', 'BitParityState', 'analyzenumerical'),
+    'sum': ('analyzenumerical.sum', 'SumState', 'analyzenumerical'),
+    'shape': ('analyzeshape.shape', 'ShapeState', 'analyzeshape'),
+}
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
 def parse_args():
@@ -20,7 +30,7 @@ def parse_args():
     parser.add_argument('path', help='Path to source')
     parser.add_argument(
         '--type',
-        choices=['parity', 'sum', 'shape'],
+        choices=ANALYSES,
         required=True,
         help='Type of analysis to perform',
     )
@@ -48,10 +58,145 @@ def parse_args():
        default=None,
        help='Sum analysis: maximal combination size of variables to track',
     )
-    parser.set_defaults(debug=True, url=True)  # FIXME reverse later
+    parser.add_argument(
+        '--sum-demand-driven',
+        action='store_true',
+        help='Sum analysis: only track combinations the asserts refer to',
+    )
+    parser.add_argument(
+        '--worklist',
+        choices=chaotic.WORKLIST_ORDERS,
+        default=chaotic.FIFO,
+        help='Order in which chaotic iteration visits pending nodes',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Processes --worklist recursive analyzes independent loops on',
+    )
+    parser.add_argument(
+        '--widening-delay',
+        type=int,
+        required=False,
+        default=None,
+        help='Widen at loop heads after this many visits (default: never)',
+    )
+    parser.add_argument(
+        '--narrowing-passes',
+        type=int,
+        default=0,
+        help='Maximal number of narrowing passes after the fixpoint',
+    )
+    parser.add_argument(
+        '--profile',
+        type=os.path.abspath,
+        required=False,
+        help='Write per node and per edge visits, times and state sizes to this JSON file',
+    )
+    parser.add_argument(
+        '--profile-folded',
+        type=os.path.abspath,
+        required=False,
+        help='Write the per edge times as folded stacks for flame graphs to this file',
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cache_dir',
+        action='store_const',
+        const=cache.DEFAULT_DIR,
+        help=f'Keep parsed programs in {cache.DEFAULT_DIR}',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=os.path.abspath,
+        default=cache.ENV_DIR,
+        help='Keep parsed programs in this directory (default: $ANALYZE_CACHE_DIR, '
+        'no caching when unset)',
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='cache_dir',
+        action='store_const',
+        const=None,
+        help='Always parse the program',
+    )
+    parser.set_defaults(debug=False, url=True)
     return parser.parse_args()
 
 
+def _frontend(analysis):
+    try:
+        return _FRONTENDS[analysis]
+    except KeyError:
+        raise ValueError(f'Unknown analysis {analysis!r}') from None
+
+
+def state_class(analysis):
+    module, name, _ = _frontend(analysis)
+    return getattr(importlib.import_module(module), name)
+
+
+# Returns a lexer and a parser of the analysis' language
+def frontend(analysis):
+    _, _, package = _frontend(analysis)
+    parser = importlib.import_module(f'{package}.parser')
+    return parser.Lexer(), parser.Parser()
+
+
+# Files defining the grammar and the syntax tree of the analysis' language,
+# cached parses depend on them
+def grammar_files(analysis):
+    _, _, package = _frontend(analysis)
+    return (
+        os.path.join(_ROOT, 'analyzeframework', 'lang.py'),
+        os.path.join(_ROOT, package, 'lang.py'),
+        os.path.join(_ROOT, package, 'parser.py'),
+    )
+
+
+# Returns the program lines and variables of the program at path, from the
+# cache if it has parsed the same text before
+def parse(path, analysis, program_cache=None):
+    with open(path) as f:
+        source = f.read()
+    if program_cache is not None:
+        key = program_cache.key(grammar_files(analysis), source)
+        parsed = program_cache.load(key)
+        if parsed is not None:
+            return parsed
+
+    lex, par = frontend(analysis)
+    par.parse(lex.tokenize(source))
+    parsed = par.lines, par.vars
+    if program_cache is not None:
+        program_cache.store(key, parsed)
+    return parsed
+
+
+# Parses the program and returns its CFG with initial states in place
+# sum_demand_driven - sum analysis: only track the combinations the asserts
+# of the program demand
+def build_cfg(path, analysis, program_cache=None, sum_demand_driven=False):
+    state = state_class(analysis)
+    lines, vars = parse(path, analysis, program_cache)
+
+    control = cfg.ControlFlowGraph(lines)
+    initial = state.initial
+    if analysis == 'sum' and sum_demand_driven:
+        from analyzenumerical import sum
+        initial = functools.partial(
+            state.initial,
+            combinations=sum.demanded_combinations(control, vars),
+        )
+
+    for node in control.nodes.values():
+        node.state = initial(vars)
+
+    control.head.state.initialize_head(vars)
+    return control
+
+
 def main():
     opts = parse_args()
     if opts.debug:
@@ -61,32 +206,40 @@ def main():
     logging.basicConfig(level=loglevel)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
+    if opts.type == 'sum' and opts.sum_max_combination_size is not None:
+        from analyzenumerical import sum
+        sum.MAX_COMBINATION_SIZE = opts.sum_max_combination_size
+    if opts.type == 'shape':
+        from analyzeshape import focus
+        focus.reset_stats()
 
-    if opts.type == 'parity':
-        state = parity.ParityState
-        lex = num_parser.Lexer()
-        par = num_parser.Parser()
-    elif opts.type == 'sum':
-        if opts.sum_max_combination_size is not None:
-            sum.MAX_COMBINATION_SIZE = opts.sum_max_combination_size
-        state = sum.SumState
-        lex = num_parser.Lexer()
-        par = num_parser.Parser()
-    elif opts.type == 'shape':
-        state = shape.ShapeState
-        lex = shape_parser.Lexer()
-        par = shape_parser.Parser()
-
-    with open(opts.path) as f:
-        par.parse(lex.tokenize(f.read()))
-
-    control = cfg.ControlFlowGraph(par.lines)
-    for node in control.nodes.values():
-        node.state = state.initial(par.vars)
+    program_cache = None
+    if opts.cache_dir is not None:
+        program_cache = cache.ProgramCache(opts.cache_dir)
+    control = build_cfg(
+        opts.path, opts.type, program_cache, sum_demand_driven=opts.sum_demand_driven,
+    )
 
-    control.head.state.initialize_head(par.vars)
+    profiler = None
+    if opts.profile is not None or opts.profile_folded is not None:
+        profiler = profiling.Profiler()
 
-    chaotic.chaotic_iteration(control)
+    stats = chaotic.chaotic_iteration(
+        control,
+        order=opts.worklist,
+        widening_delay=opts.widening_delay,
+        narrowing_passes=opts.narrowing_passes,
+        profiler=profiler,
+        jobs=opts.jobs,
+    )
+    print(f'Fixpoint: {stats}')
+    if opts.profile is not None:
+        profiler.write_json(opts.profile)
+    if opts.profile_folded is not None:
+        profiler.write_folded(opts.profile_folded)
+    # Workers keep focus totals of their own
+    if opts.type == 'shape' and opts.jobs == 1:
+        print(f'Focus: {focus.STATS}')
     cfg_src = viz.create_cfg_dot(control)
     if opts.output_dir is not None:
         viz.output_png(
@@ -2,12 +2,21 @@ import collections
 import copy
 import logging
 
+from analyzeframework import interning
+from analyzeframework import profiling
+
 LOG = logging.getLogger(__name__)
 
 
 class AbstractState:
     TRANSFORMERS = collections.defaultdict(dict)
 
+    # Fields that are copied on write: copy() shares them between both
+    # states and mutable() duplicates a field the first time it is written
+    # through a state that shares it. States without such fields are
+    # deep copied.
+    COW_FIELDS = ()
+
     @classmethod
     def transforms(cls, stmt_type):
         def decorator(func):
@@ -16,9 +25,33 @@ class AbstractState:
         return decorator
 
     def copy(self):
-        return copy.deepcopy(self)
+        if not self.COW_FIELDS:
+            return copy.deepcopy(self)
+
+        res = copy.copy(self)
+        self._shared = set(self.COW_FIELDS)
+        res._shared = set(self.COW_FIELDS)
+        return res
+
+    # Returns the field for writing, after detaching it from other states
+    def mutable(self, field):
+        shared = self.__dict__.get('_shared')
+        if shared and field in shared:
+            setattr(self, field, self.copy_field(field, getattr(self, field)))
+            shared.remove(field)
+        return getattr(self, field)
 
-    def transform(self, statement):
+    def is_shared(self, field):
+        return field in self.__dict__.get('_shared', ())
+
+    # Duplicates a single copy-on-write field, states override this for
+    # fields holding mutable values
+    def copy_field(self, field, value):
+        return copy.copy(value)
+
+    # profiler - optional profiling.Profiler the time of both steps is
+    # charged to
+    def transform(self, statement, profiler=None):
         LOG.debug('Processing statement %s', statement)
         res = self.copy()
         try:
@@ -27,13 +60,94 @@ class AbstractState:
             LOG.warning(f'No transformer for {statement}')
             return res
 
-        transformer(res, statement)
-        res.post_transform()
+        with profiling.phase(profiler, profiling.TRANSFORM):
+            transformer(res, statement)
+        with profiling.phase(profiler, profiling.POST_TRANSFORM):
+            res.post_transform()
+        if profiler is not None:
+            profiler.transformed(res)
         return res
 
     # Augment / Coerce
     def post_transform(self):
         pass
 
+    # Differential propagation for powerset domains, whose transformers and
+    # joins work element by element. sent is what an edge carried from this
+    # node so far, None before its first use. Returns the part of the state
+    # the edge has not carried yet, None if there is none, and the new value
+    # of sent. The default carries the whole state every time.
+    def delta(self, sent):
+        return self, None
+
+    # Sizes of the state by name, as recorded by the profiler
+    def metrics(self):
+        return {}
+
     def join(self, other, arbitrary_visits):
         pass
+
+    # Partial order of the domain: True if joining self into other gives
+    # other back. NotImplemented for domains that do not define it.
+    def leq(self, other):
+        return NotImplemented
+
+    # The join and whether it changed self. A False flag means the result
+    # equals self, so iteration stops there without post_transform or a
+    # comparison; True means it may differ, which differs() then settles
+    # once post_transform ran. Domains compute the flag during their join,
+    # the default skips the join altogether when other is below self.
+    def join_changed(self, other, arbitrary_term=None):
+        if other.leq(self) is True:
+            return self, False
+        return self.join(other, arbitrary_term), True
+
+    # Used instead of join at loop heads once the widening delay is exceeded.
+    # Domains of finite height may keep the default, which is just the join.
+    def widen(self, other, arbitrary_term=None):
+        return self.join(other, arbitrary_term)
+
+    # widen with the flag of join_changed
+    def widen_changed(self, other, arbitrary_term=None):
+        if type(self).widen is AbstractState.widen:
+            return self.join_changed(other, arbitrary_term)
+        return self.widen(other, arbitrary_term), True
+
+    # Digest of the contents of the state for hash-consing, None for
+    # domains that do not intern their states. States of the same key are
+    # only unified when equal. Domains interning the components of a state
+    # replace them with the shared ones here and key the state by them.
+    def intern_key(self):
+        return None
+
+    # The state stored once for all states of the same contents. It is
+    # shared by every node holding it, so all its copy-on-write fields are
+    # marked shared for good.
+    def interned(self):
+        key = self.intern_key()
+        if key is None:
+            return self
+        res = interning.states(type(self)).intern(key, self)
+        if res is self:
+            self._shared = set(self.COW_FIELDS)
+        return res
+
+    # Cheap summary of the state that equal states share, None if the
+    # domain has none
+    def fingerprint(self):
+        return None
+
+    # Same as self != other, different fingerprints decide without
+    # comparing the states
+    def differs(self, other):
+        if self is other:
+            return False
+        fingerprint = self.fingerprint()
+        if fingerprint is not None and fingerprint != other.fingerprint():
+            return True
+        return self != other
+
+    # Refines a post-fixpoint with a recomputed (smaller) state. The default
+    # takes the recomputed state, which terminates for finite height domains.
+    def narrow(self, other):
+        return other
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+LOG = logging.getLogger(__name__)
+
+# Bump when the layout of the cached entries changes
+FORMAT_VERSION = 1
+
+# Where --cache keeps parsed programs
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'analyze')
+
+# Caching is off unless asked for, by --cache, --cache-dir or this variable
+ENV_DIR = os.environ.get('ANALYZE_CACHE_DIR')
+
+# Unpickling an entry written by other code fails with any of these, the
+# entry is then parsed again
+_LOAD_ERRORS = (
+    OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+    IndexError, TypeError, ValueError,
+)
+
+
+# Parsed programs on disk, one pickle per program. An entry is keyed by the
+# program text and by the files defining its grammar and syntax tree, so
+# editing any of them makes the old entries unreachable instead of stale.
+class ProgramCache:
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._grammars = {}
+
+    # Digest of the grammar files, read once per cache
+    def _grammar_digest(self, grammar_files):
+        grammar_files = tuple(grammar_files)
+        digest = self._grammars.get(grammar_files)
+        if digest is None:
+            h = hashlib.sha256(f'{FORMAT_VERSION}'.encode())
+            for path in grammar_files:
+                with open(path, 'rb') as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            digest = self._grammars[grammar_files] = h.digest()
+        return digest
+
+    def key(self, grammar_files, source):
+        h = hashlib.sha256(self._grammar_digest(grammar_files))
+        h.update(source.encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    # Returns the cached value, None if there is none
+    def load(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except _LOAD_ERRORS as e:
+            LOG.warning('Ignoring unreadable cache entry %s: %s', key, e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    # Written to a temporary file first, so concurrent runs never read a
+    # partial entry
+    def store(self, key, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            LOG.warning('Could not write cache entry %s: %s', key, e)
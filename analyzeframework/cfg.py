@@ -1,10 +1,8 @@
 import dataclasses
 import typing
 
-from pysmt import shortcuts
-
 from analyzeframework import lang
-from sympy import Symbol
+from analyzeframework import validity
 
 
 @dataclasses.dataclass
@@ -12,28 +10,28 @@ class Edge:
     statement: lang.Statement
     predecessor: 'Node'
     successor: 'Node'
+    # What the edge carried so far, see AbstractState.delta
+    sent: object = dataclasses.field(default=None, repr=False, compare=False)
 
     def arbitrary_term(self):
         if isinstance(self.statement, lang.Assume):
             if isinstance(self.statement.expr, lang.Truth):
-                return Symbol(f'P{self.predecessor.name}', positive=True)
+                return lang.Symbol(f'P{self.predecessor.name}')
             else:
-                return Symbol(f'T{self.predecessor.name}', positive=True)
+                return lang.Symbol(f'T{self.predecessor.name}')
         else:
             return None
 
-    def valid(self):
+    def valid(self, checker=None):
         if not isinstance(self.statement, lang.Assert):
             return True
 
-        formula = shortcuts.And(
+        if checker is None:
+            checker = validity.default_checker()
+        return checker.valid(
             self.predecessor.state.formula(),
-            shortcuts.Not(
-                self.statement.formula(),
-            ),
+            self.statement.formula(),
         )
-        cex = shortcuts.get_model(formula)
-        return cex is None
 
 
 @dataclasses.dataclass
@@ -48,6 +46,22 @@ class Node:
         return self.out_edges[0].arbitrary_term() if self.out_edges else None
 
 
+# A strongly connected part of the graph in a weak topological order: the
+# head is the node it is entered through, the body the rest of it, ordered
+# again. Every edge either goes forward in the order or leads to the head of
+# a component containing its source.
+@dataclasses.dataclass
+class Component:
+    head: Node
+    body: typing.List[typing.Union[Node, 'Component']]
+
+    def __str__(self):
+        return f'({" ".join([self.head.name, *(_element_str(e) for e in self.body)])})'
+
+
+def _element_str(element):
+    return element.name if isinstance(element, Node) else str(element)
+
 
 class ControlFlowGraph:
     def __init__(self, lines):
@@ -66,3 +80,109 @@ class ControlFlowGraph:
 
     def _get_node(self, key):
         return self.nodes.setdefault(key, Node(key))
+
+    # Depth-first walk from the head, returns the nodes in postorder and the
+    # edges leading back to a node that is still on the walk stack
+    def _depth_first(self):
+        postorder = []
+        back_edges = []
+        visited = {self.head.name}
+        on_stack = {self.head.name}
+        stack = [(self.head, iter(self.head.out_edges))]
+        while stack:
+            node, edges = stack[-1]
+            edge = next(edges, None)
+            if edge is None:
+                stack.pop()
+                on_stack.remove(node.name)
+                postorder.append(node)
+                continue
+            succ = edge.successor
+            if succ.name in on_stack:
+                back_edges.append(edge)
+            elif succ.name not in visited:
+                visited.add(succ.name)
+                on_stack.add(succ.name)
+                stack.append((succ, iter(succ.out_edges)))
+        return postorder, back_edges
+
+    # Nodes ordered by reverse postorder of a depth-first walk from the head,
+    # nodes unreachable from the head are placed last
+    def reverse_postorder(self):
+        postorder, _ = self._depth_first()
+        order = postorder[::-1]
+        reached = {n.name for n in order}
+        order.extend(n for n in self.nodes.values() if n.name not in reached)
+        return order
+
+    # Targets of back edges, every loop in the graph passes through one
+    def loop_heads(self):
+        _, back_edges = self._depth_first()
+        return {edge.successor.name for edge in back_edges}
+
+    # Tarjan's algorithm on the nodes named in names, returns the strongly
+    # connected components in topological order. Roots are taken in order.
+    @staticmethod
+    def _sccs(names, order):
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        sccs = []
+        for root in order:
+            if root.name in index:
+                continue
+            index[root.name] = low[root.name] = len(index)
+            stack.append(root)
+            on_stack.add(root.name)
+            work = [(root, iter(root.out_edges))]
+            while work:
+                node, edges = work[-1]
+                edge = next(edges, None)
+                if edge is not None:
+                    succ = edge.successor
+                    if succ.name not in names:
+                        continue
+                    if succ.name not in index:
+                        index[succ.name] = low[succ.name] = len(index)
+                        stack.append(succ)
+                        on_stack.add(succ.name)
+                        work.append((succ, iter(succ.out_edges)))
+                    elif succ.name in on_stack:
+                        low[node.name] = min(low[node.name], index[succ.name])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent.name] = min(low[parent.name], low[node.name])
+                if low[node.name] == index[node.name]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member.name)
+                        scc.append(member)
+                        if member is node:
+                            break
+                    sccs.append(scc)
+        return sccs[::-1]
+
+    def _decompose(self, names, position):
+        order = sorted((self.nodes[name] for name in names), key=lambda n: position[n.name])
+        elements = []
+        for scc in self._sccs(names, order):
+            head = min(scc, key=lambda n: position[n.name])
+            if len(scc) == 1 and not any(e.successor is head for e in head.out_edges):
+                elements.append(head)
+                continue
+            body = {n.name for n in scc if n is not head}
+            elements.append(Component(head, self._decompose(body, position)))
+        return elements
+
+    # Bourdoncle's weak topological order of the nodes reachable from the
+    # head: the strongly connected components in topological order, each
+    # split again once its head is taken out. Heads are the first nodes of
+    # their components in reverse postorder.
+    def weak_topological_order(self):
+        postorder, _ = self._depth_first()
+        position = {n.name: i for i, n in enumerate(reversed(postorder))}
+        return self._decompose(set(position), position)
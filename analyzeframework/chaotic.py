@@ -1,26 +1,266 @@
+import collections
+import dataclasses
+import heapq
 import logging
+import sys
+import time
+import typing
+
+from analyzeframework import cfg as cfg_mod
+from analyzeframework import profiling
 
 LOG = logging.getLogger(__name__)
 
+FIFO = 'fifo'
+RPO = 'rpo'
+# Bourdoncle's recursive strategy over the weak topological order
+RECURSIVE = 'recursive'
+WORKLIST_ORDERS = (FIFO, RPO, RECURSIVE)
 
-def chaotic_iteration(cfg):
-    wl = [cfg.head]
-    while wl:
-        node = wl.pop(0)
-        node.visits += 1
-
-        LOG.debug('Pop node %r (visits: %d)', node.name, node.visits)
-        for edge in node.out_edges:
-            next_node = edge.successor
-            LOG.debug('Next node is %r', next_node.name)
-            LOG.debug('State before transform: %s', node.state)
-            transformed_state = node.state.transform(edge.statement)
+
+# Plain queue, a node is appended again even if it is already pending
+class FifoWorklist:
+    def __init__(self, cfg):
+        self._queue = collections.deque()
+
+    def push(self, node):
+        self._queue.append(node)
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def __bool__(self):
+        return bool(self._queue)
+
+
+# Nodes are popped by their reverse postorder index, each node is pending
+# at most once
+class PriorityWorklist:
+    def __init__(self, cfg):
+        self._priority = {
+            node.name: i for i, node in enumerate(cfg.reverse_postorder())
+        }
+        self._heap = []
+        self._pending = set()
+
+    def push(self, node):
+        if node.name in self._pending:
+            return
+        self._pending.add(node.name)
+        heapq.heappush(self._heap, (self._priority[node.name], node.name, node))
+
+    def pop(self):
+        _, name, node = heapq.heappop(self._heap)
+        self._pending.remove(name)
+        return node
+
+    def __bool__(self):
+        return bool(self._heap)
+
+
+WORKLISTS = {
+    FIFO: FifoWorklist,
+    RPO: PriorityWorklist,
+}
+
+
+@dataclasses.dataclass
+class IterationStats:
+    order: str
+    visits: int = 0
+    transforms: int = 0
+    # Edges not transformed since the node gained nothing they did not carry
+    skipped: int = 0
+    widenings: int = 0
+    narrowing_passes: int = 0
+    elapsed: float = 0.0
+    # Head of every component the recursive strategy stabilized -> number
+    # of times its body was iterated, over all visits of the component
+    component_iterations: typing.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def __str__(self):
+        res = (
+            f'{self.order}: {self.visits} visits, '
+            f'{self.transforms} transforms, {self.widenings} widenings, '
+            f'{self.narrowing_passes} narrowing passes, {self.elapsed:.3f}s'
+        )
+        if self.skipped:
+            res += f', {self.skipped} skipped edges'
+        if self.component_iterations:
+            iterations = ', '.join(
+                f'{head} x{count}' for head, count in self.component_iterations.items()
+            )
+            res += f' (component iterations: {iterations})'
+        return res
+
+
+# Descending iteration from the post-fixpoint: every node is recomputed from
+# its predecessors, loop heads combine the old and new states with narrow
+def _narrowing(cfg, loop_heads, passes, stats, profiler):
+    order = cfg.reverse_postorder()
+    for _ in range(passes):
+        stats.narrowing_passes += 1
+        changed = False
+        for node in order:
+            if not node.in_edges:
+                continue
+            new_state = None
+            for edge in node.in_edges:
+                with profiling.on_edge(profiler, edge):
+                    transformed_state = edge.predecessor.state.transform(edge.statement, profiler)
+                    stats.transforms += 1
+                    if new_state is None:
+                        new_state = transformed_state
+                    else:
+                        with profiling.phase(profiler, profiling.JOIN):
+                            new_state = new_state.join(transformed_state, node.arbitrary_term())
+            # Charged to the last incoming edge
+            with profiling.on_edge(profiler, edge), profiling.phase(profiler, profiling.POST_TRANSFORM):
+                new_state.post_transform()
+            if node.name in loop_heads:
+                new_state = node.state.narrow(new_state)
+            if new_state.differs(node.state):
+                LOG.debug('Narrowed node %r', node.name)
+                node.state = new_state.interned()
+                if profiler is not None:
+                    profiler.updated(node)
+                changed = True
+        if not changed:
+            break
+
+
+# Visits node: the part of its state an outgoing edge has not carried yet is
+# transformed along it and combined into the successor. Returns the
+# successors whose states changed, or that were never visited.
+def _propagate(node, loop_heads, widening_delay, stats, profiler):
+    node.visits += 1
+    stats.visits += 1
+    if profiler is not None:
+        profiler.visit(node)
+
+    LOG.debug('Pop node %r (visits: %d)', node.name, node.visits)
+    changed = []
+    for edge in node.out_edges:
+        next_node = edge.successor
+        state, edge.sent = node.state.delta(edge.sent)
+        if state is None:
+            LOG.debug('Nothing new for node %r', next_node.name)
+            stats.skipped += 1
+            continue
+        LOG.debug('Next node is %r', next_node.name)
+        LOG.debug('State before transform: %s', state)
+        with profiling.on_edge(profiler, edge):
+            transformed_state = state.transform(edge.statement, profiler)
+            stats.transforms += 1
             LOG.debug('State after transform: %s', transformed_state)
-            joined_state = next_node.state.join(transformed_state, next_node.arbitrary_term())
-            joined_state.post_transform()
-            if next_node.visits == 0 or joined_state != next_node.state:
-                LOG.debug('State joined with %s', next_node.state)
-                LOG.debug('State after join: %s', joined_state)
-                wl.append(next_node)
-                LOG.debug('Append node %r',next_node.name)
-                next_node.state = joined_state
+            if (
+                widening_delay is not None
+                and
+                next_node.name in loop_heads
+                and
+                next_node.visits > widening_delay
+            ):
+                with profiling.phase(profiler, profiling.WIDEN):
+                    joined_state, changed_state = next_node.state.widen_changed(
+                        transformed_state, next_node.arbitrary_term(),
+                    )
+                stats.widenings += 1
+            else:
+                with profiling.phase(profiler, profiling.JOIN):
+                    joined_state, changed_state = next_node.state.join_changed(
+                        transformed_state, next_node.arbitrary_term(),
+                    )
+            if changed_state:
+                with profiling.phase(profiler, profiling.POST_TRANSFORM):
+                    joined_state.post_transform()
+                changed_state = joined_state.differs(next_node.state)
+        if next_node.visits == 0 or changed_state:
+            LOG.debug('State joined with %s', next_node.state)
+            LOG.debug('State after join: %s', joined_state)
+            changed.append(next_node)
+            next_node.state = joined_state.interned()
+            if profiler is not None:
+                profiler.updated(next_node)
+    return changed
+
+
+def _worklist_iteration(cfg, order, loop_heads, widening_delay, stats, profiler):
+    wl = WORKLISTS[order](cfg)
+    wl.push(cfg.head)
+    while wl:
+        node = wl.pop()
+        for next_node in _propagate(node, loop_heads, widening_delay, stats, profiler):
+            wl.push(next_node)
+            LOG.debug('Append node %r', next_node.name)
+
+
+def _component_heads(elements):
+    for element in elements:
+        if isinstance(element, cfg_mod.Component):
+            yield element.head.name
+            yield from _component_heads(element.body)
+
+
+# Visits the elements in order, every component is iterated until its head
+# is stable before the iteration moves past it. Only nodes whose state
+# changed since their last visit are visited again.
+def _stabilize(elements, pending, loop_heads, widening_delay, stats, profiler):
+    for element in elements:
+        if isinstance(element, cfg_mod.Component):
+            head = element.head
+            while head.name in pending:
+                stats.component_iterations[head.name] = stats.component_iterations.get(head.name, 0) + 1
+                _stabilize([head], pending, loop_heads, widening_delay, stats, profiler)
+                _stabilize(element.body, pending, loop_heads, widening_delay, stats, profiler)
+        elif element.name in pending:
+            pending.remove(element.name)
+            for next_node in _propagate(element, loop_heads, widening_delay, stats, profiler):
+                pending.add(next_node.name)
+
+
+# order - FIFO or RPO worklist, or RECURSIVE to stabilize the strongly
+# connected components one at a time in topological order
+# widening_delay - number of visits of a loop head after which its incoming
+# states are widened rather than joined, None disables widening
+# narrowing_passes - maximal number of descending passes after the fixpoint
+# profiler - profiling.Profiler recording visits, times and state sizes
+# jobs - number of processes the recursive strategy spreads independent
+# components over, see parallel.parallel_iteration
+def chaotic_iteration(cfg, order=FIFO, widening_delay=None, narrowing_passes=0, profiler=None, jobs=1):
+    if jobs > 1 and order != RECURSIVE:
+        raise ValueError(f'Only the {RECURSIVE} order runs in parallel')
+    if jobs > 1 and profiler is not None:
+        raise ValueError('A parallel iteration cannot be profiled')
+    if jobs > 1:
+        from analyzeframework import parallel
+        if not parallel.available():
+            LOG.error(
+                'Parallel iteration needs the fork start method, which %s does '
+                'not provide safely; iterating on one process',
+                sys.platform,
+            )
+            jobs = 1
+    stats = IterationStats(order)
+    start = time.perf_counter()
+    # Nodes start out with equal states
+    for node in cfg.nodes.values():
+        node.state = node.state.interned()
+
+    if order == RECURSIVE:
+        wto = cfg.weak_topological_order()
+        # Component heads are the widening points
+        loop_heads = set(_component_heads(wto))
+        if jobs > 1:
+            parallel.parallel_iteration(cfg, wto, jobs, loop_heads, widening_delay, stats)
+        else:
+            _stabilize(wto, {cfg.head.name}, loop_heads, widening_delay, stats, profiler)
+    else:
+        loop_heads = cfg.loop_heads()
+        _worklist_iteration(cfg, order, loop_heads, widening_delay, stats, profiler)
+
+    if narrowing_passes:
+        _narrowing(cfg, loop_heads, narrowing_passes, stats, profiler)
+
+    stats.elapsed = time.perf_counter() - start
+    LOG.info('Fixpoint reached (%s)', stats)
+    return stats
@@ -0,0 +1,42 @@
+import operator
+import weakref
+
+
+# Hash-consing of immutable values: the first value interned under a key is
+# returned for every equal value interned after it. Values are held weakly,
+# an entry lives only as long as something else refers to its value. Keys
+# are digests of the contents, kept small so the table does not hold a
+# second copy of every value.
+class Table:
+    def __init__(self):
+        self._values = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    # equal - tells whether the value found under the key has the same
+    # contents, a different one leaves value out of the table
+    def intern(self, key, value, equal=operator.eq):
+        res = self._values.setdefault(key, value)
+        if res is value:
+            self.misses += 1
+            return value
+        if not equal(res, value):
+            self.collisions += 1
+            return value
+        self.hits += 1
+        return res
+
+    def __len__(self):
+        return len(self._values)
+
+
+# Abstract state class -> table of its states
+STATES = {}
+
+
+def states(cls):
+    try:
+        return STATES[cls]
+    except KeyError:
+        return STATES.setdefault(cls, Table())
@@ -1,7 +1,9 @@
 import dataclasses
 import typing
 
-from pysmt import shortcuts
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
 
 
 @dataclasses.dataclass(frozen=True, order=True)
@@ -0,0 +1,19 @@
+import importlib.util
+import sys
+
+
+# Returns the module name, executed on its first attribute access instead of
+# here. Heavy dependencies only some runs need are bound this way, e.g. pysmt
+# is only needed once asserts are validated.
+def module(name):
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    lazy = importlib.util.module_from_spec(spec)
+    sys.modules[name] = lazy
+    loader.exec_module(lazy)
+    return lazy
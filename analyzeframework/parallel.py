@@ -0,0 +1,183 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import sys
+
+from analyzeframework import cfg as cfg_mod
+from analyzeframework import chaotic
+
+LOG = logging.getLogger(__name__)
+
+
+# Workers are forked, so they see the domains' module settings of this
+# process. Windows has no fork, and on macOS system frameworks may not
+# survive it.
+def available():
+    return sys.platform != 'darwin' and 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _nodes(element):
+    if isinstance(element, cfg_mod.Node):
+        yield element
+    else:
+        yield element.head
+        for child in element.body:
+            yield from _nodes(child)
+
+
+# Copy of a component over copies of its nodes and of the nodes its edges
+# leave to, with their states and visits. Only the edges leaving the
+# component's nodes are copied, the nodes outside it keep their first
+# outgoing edge for arbitrary_term.
+def _subgraph(component):
+    copies = {}
+
+    def copy(node):
+        res = copies.get(node.name)
+        if res is None:
+            res = copies[node.name] = cfg_mod.Node(node.name, state=node.state, visits=node.visits)
+        return res
+
+    inner = list(_nodes(component))
+    for node in inner:
+        copy(node)
+    for node in inner:
+        for edge in node.out_edges:
+            successor = edge.successor
+            if successor.name not in copies:
+                exit = copy(successor)
+                first = successor.out_edges[:1]
+                exit.out_edges = [
+                    cfg_mod.Edge(e.statement, exit, cfg_mod.Node(e.successor.name)) for e in first
+                ]
+            edge_copy = cfg_mod.Edge(edge.statement, copies[node.name], copies[successor.name], edge.sent)
+            copies[node.name].out_edges.append(edge_copy)
+            copies[successor.name].in_edges.append(edge_copy)
+
+    def rebuild(element):
+        if isinstance(element, cfg_mod.Node):
+            return copies[element.name]
+        return cfg_mod.Component(copies[element.head.name], [rebuild(e) for e in element.body])
+
+    return rebuild(component)
+
+
+# Stabilizes a copy of a component, see _subgraph, in a worker. pending are
+# the nodes of the component waiting for a visit. Returns the new states and
+# visits of the component's nodes, the states of the nodes outside it that it
+# changed, and the worker's stats.
+def _stabilize_component(component, pending, loop_heads, widening_delay):
+    stats = chaotic.IterationStats(chaotic.RECURSIVE)
+    pending = set(pending)
+    chaotic._stabilize([component], pending, loop_heads, widening_delay, stats, None)
+
+    inner = list(_nodes(component))
+    exits = {edge.successor.name: edge.successor for node in inner for edge in node.out_edges}
+    return (
+        {node.name: (node.state, node.visits) for node in inner},
+        {name: exits[name].state for name in pending},
+        stats,
+    )
+
+
+# chaotic_iteration's recursive strategy with the top-level components of the
+# weak topological order spread over jobs processes. A component is started
+# once every element with an edge into it is done, so components on
+# different paths, such as loops on the two sides of a branch, run at the
+# same time. Single nodes are visited in this process. A node two running
+# components lead to gets the join of what both of them computed.
+def parallel_iteration(cfg, wto, jobs, loop_heads, widening_delay, stats):
+    element_of = {}
+    for i, element in enumerate(wto):
+        for node in _nodes(element):
+            element_of[node.name] = i
+    depends = []
+    exits = []
+    for i, element in enumerate(wto):
+        preds = set()
+        succs = set()
+        for node in _nodes(element):
+            preds.update(element_of.get(e.predecessor.name) for e in node.in_edges)
+            succs.update(e.successor.name for e in node.out_edges if element_of[e.successor.name] != i)
+        preds.discard(None)
+        preds.discard(i)
+        depends.append(preds)
+        exits.append(succs)
+
+    pending = {cfg.head.name}
+    # Bumped on every change of a node's state, to tell whether a component
+    # that leads to the node ran alone
+    version = dict.fromkeys(element_of, 0)
+
+    def visit(node):
+        pending.discard(node.name)
+        for next_node in chaotic._propagate(node, loop_heads, widening_delay, stats, None):
+            pending.add(next_node.name)
+            version[next_node.name] += 1
+
+    def merge(index, shipped, result):
+        inner, outer, worker_stats = result
+        for name, (state, visits) in inner.items():
+            cfg.nodes[name].state = state.interned()
+            cfg.nodes[name].visits = visits
+        # What an edge carried is kept by identity, which does not survive
+        # the way back. The component is stable, so every node of it carried
+        # its whole state along its edges.
+        for name in inner:
+            node = cfg.nodes[name]
+            for edge in node.out_edges:
+                _, edge.sent = node.state.delta(None)
+        pending.difference_update(inner)
+        for name, state in outer.items():
+            node = cfg.nodes[name]
+            if version[name] != shipped[name]:
+                LOG.debug('Joining the result of component %d at %r', index, name)
+                state = node.state.join(state, node.arbitrary_term())
+                state.post_transform()
+            node.state = state.interned()
+            version[name] += 1
+            pending.add(name)
+        stats.visits += worker_stats.visits
+        stats.transforms += worker_stats.transforms
+        stats.skipped += worker_stats.skipped
+        stats.widenings += worker_stats.widenings
+        for head, count in worker_stats.component_iterations.items():
+            stats.component_iterations[head] = stats.component_iterations.get(head, 0) + count
+
+    done = set()
+    started = set()
+    running = {}
+    context = multiprocessing.get_context('fork')
+    with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=context) as pool:
+        while len(done) < len(wto):
+            progress = False
+            for i, element in enumerate(wto):
+                if i in started or not depends[i] <= done:
+                    continue
+                started.add(i)
+                progress = True
+                nodes = [node.name for node in _nodes(element)]
+                if not pending.intersection(nodes):
+                    done.add(i)
+                elif isinstance(element, cfg_mod.Node):
+                    visit(element)
+                    done.add(i)
+                else:
+                    shipped = {name: version[name] for name in nodes + sorted(exits[i])}
+                    future = pool.submit(
+                        _stabilize_component,
+                        _subgraph(element),
+                        pending.intersection(nodes),
+                        loop_heads,
+                        widening_delay,
+                    )
+                    running[future] = i, shipped
+            if progress or not running:
+                continue
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in finished:
+                i, shipped = running.pop(future)
+                merge(i, shipped, future.result())
+                done.add(i)
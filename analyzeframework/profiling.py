@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import dataclasses
+import json
+import time
+import typing
+
+# Phases an edge is processed in
+TRANSFORM = 'transform'
+JOIN = 'join'
+WIDEN = 'widen'
+POST_TRANSFORM = 'post_transform'
+
+
+def _max_metrics(current, metrics):
+    for key, value in metrics.items():
+        current[key] = max(current.get(key, value), value)
+
+
+@dataclasses.dataclass
+class NodeProfile:
+    visits: int = 0
+    # Largest value of every metric of the node state
+    metrics: typing.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class EdgeProfile:
+    statement: str
+    transforms: int = 0
+    seconds: typing.Dict[str, float] = dataclasses.field(default_factory=dict)
+    # Largest value of every metric of the transformed state
+    metrics: typing.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+# Records what chaotic_iteration spends its time on. Pass an instance as the
+# profiler argument of chaotic_iteration; without one nothing is recorded.
+# Times are charged to the edge being processed, the iteration tells which
+# one through edge().
+class Profiler:
+    def __init__(self):
+        self.nodes = collections.defaultdict(NodeProfile)
+        self.edges = {}
+        self._edge = None
+
+    @staticmethod
+    def edge_name(edge):
+        return f'{edge.predecessor.name}->{edge.successor.name}'
+
+    def visit(self, node):
+        self.nodes[node.name].visits += 1
+
+    @contextlib.contextmanager
+    def edge(self, edge):
+        name = self.edge_name(edge)
+        try:
+            profile = self.edges[name]
+        except KeyError:
+            profile = self.edges.setdefault(name, EdgeProfile(str(edge.statement)))
+        self._edge = profile
+        try:
+            yield profile
+        finally:
+            self._edge = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = self._edge.seconds
+            seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def transformed(self, state):
+        self._edge.transforms += 1
+        _max_metrics(self._edge.metrics, state.metrics())
+
+    def updated(self, node):
+        _max_metrics(self.nodes[node.name].metrics, node.state.metrics())
+
+    def to_json(self):
+        return {
+            'nodes': {
+                name: dataclasses.asdict(profile)
+                for name, profile in sorted(self.nodes.items())
+            },
+            'edges': {
+                name: dataclasses.asdict(profile)
+                for name, profile in sorted(self.edges.items())
+            },
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    # Folded stacks as read by flamegraph.pl and speedscope: one line per
+    # node, edge and phase with its time in microseconds
+    def folded(self):
+        lines = []
+        for name, profile in sorted(self.edges.items()):
+            source = name.split('->', 1)[0]
+            for phase, seconds in sorted(profile.seconds.items()):
+                lines.append(f'{source};{name};{phase} {round(seconds * 1e6)}')
+        return lines
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            f.write(''.join(f'{line}\n' for line in self.folded()))
+
+
+_NO_PROFILE = contextlib.nullcontext()
+
+
+# Profiler.phase and Profiler.edge for an optional profiler, a None
+# profiler only costs the check
+def phase(profiler, name):
+    return _NO_PROFILE if profiler is None else profiler.phase(name)
+
+
+def on_edge(profiler, edge):
+    return _NO_PROFILE if profiler is None else profiler.edge(edge)
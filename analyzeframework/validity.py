@@ -0,0 +1,73 @@
+import collections
+import logging
+
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
+
+LOG = logging.getLogger(__name__)
+
+# Verdicts a checker keeps, the least recently used are dropped first
+MAX_CACHED = 4096
+
+
+# Checks asserts against the states reaching them with a single incremental
+# solver. Each check runs in its own push/pop frame, and verdicts are cached
+# by the (hash-consed) state and assert formulas.
+class ValidityChecker:
+    def __init__(self, solver_name=None, max_cached=MAX_CACHED):
+        self.solver_name = solver_name
+        self.max_cached = max_cached
+        self._solver = None
+        self._cache = collections.OrderedDict()
+        self.checks = 0
+        self.solver_calls = 0
+
+    @property
+    def solver(self):
+        if self._solver is None:
+            self._solver = shortcuts.Solver(name=self.solver_name)
+        return self._solver
+
+    def valid(self, state_formula, assert_formula):
+        self.checks += 1
+        key = (state_formula, assert_formula)
+        try:
+            valid = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(key)
+            return valid
+
+        self.solver_calls += 1
+        self.solver.push()
+        try:
+            self.solver.add_assertion(
+                shortcuts.And(state_formula, shortcuts.Not(assert_formula)),
+            )
+            valid = not self.solver.solve()
+        finally:
+            self.solver.pop()
+
+        LOG.debug('Assert %s is %s', assert_formula, valid)
+        self._cache[key] = valid
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return valid
+
+    def clear(self):
+        self._cache.clear()
+        if self._solver is not None:
+            self._solver.exit()
+            self._solver = None
+
+
+_CHECKER = None
+
+
+def default_checker():
+    global _CHECKER
+    if _CHECKER is None:
+        _CHECKER = ValidityChecker()
+    return _CHECKER
@@ -4,9 +4,6 @@ import urllib
 
 import graphviz
 
-from analyzeshape import structure
-from analyzeshape import three_valued_logic
-
 
 def _node_label(node):
     return f'{node.name} ({node.visits})\n{node.state}'
@@ -45,13 +42,16 @@ def _stnode_name(i, j):
 
 
 def _stedge_style(val):
+    from analyzeshape import three_valued_logic
     if val == three_valued_logic.MAYBE:
         return 'dashed'
     elif val == three_valued_logic.TRUE:
         return 'solid'
 
 
+# Only shape runs import the shape analysis
 def create_shape_dot(cfgnode):
+    from analyzeshape import three_valued_logic
     state = cfgnode.state
     dot = graphviz.Digraph()
     dot.attr(label=f'Node {cfgnode.name}')
@@ -0,0 +1,320 @@
+import copy
+import dataclasses
+import logging
+import weakref
+
+from analyzenumerical import lang as lang_num
+from analyzenumerical import parity
+from analyzeframework import abstract
+from analyzeframework import lang
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
+
+
+LOG = logging.getLogger(__name__)
+
+# Per-variable modulo codes, bit i stands for the parity atom i
+_BITS = 2
+_EVEN = 1 << parity.EVEN_atom
+_ODD = 1 << parity.ODD_atom
+_TOP = _EVEN | _ODD
+_BOTTOM = 0
+
+_CODES = {
+    parity.BOTTOM: _BOTTOM,
+    parity.EVEN: _EVEN,
+    parity.ODD: _ODD,
+    parity.TOP: _TOP,
+}
+_VALUES = {code: value for value, code in _CODES.items()}
+
+
+def _get_val_parity(val):
+    return _CODES[parity._get_val_parity(val)]
+
+
+# Numbers the program variables once. Relations are n x n bit matrices
+# packed into a single int, row i at bits [i * n, (i + 1) * n).
+class SymbolTable:
+    # Held weakly, a table lives as long as the states using it
+    _TABLES = weakref.WeakValueDictionary()
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        n = len(self.symbols)
+        self.size = n
+        self.row_masks = [((1 << n) - 1) << (i * n) for i in range(n)]
+        self.column_masks = [
+            sum(1 << (i * n + j) for i in range(n)) for j in range(n)
+        ]
+        self.all_rows = (1 << (n * n)) - 1
+
+    @classmethod
+    def for_symbols(cls, symbols):
+        key = tuple(symbols)
+        try:
+            return cls._TABLES[key]
+        except KeyError:
+            return cls._TABLES.setdefault(key, cls(key))
+
+    # Tables are shared by all states of a run
+    def __deepcopy__(self, memo):
+        return self
+
+    # Pickled by its symbols, unpickling yields the shared table of the
+    # receiving process
+    def __reduce__(self):
+        return SymbolTable.for_symbols, (self.symbols,)
+
+    def bit(self, row, column):
+        return 1 << (row * self.size + column)
+
+    def row(self, relation, i):
+        n = self.size
+        bits = (relation >> (i * n)) & ((1 << n) - 1)
+        return [self.symbols[j] for j in range(n) if bits >> j & 1]
+
+
+@dataclasses.dataclass
+class BitParityState(abstract.AbstractState):
+    table: SymbolTable
+    modulo: int
+    samepar: int
+    antipar: int
+
+    # All fields are immutable ints
+    def copy(self):
+        return copy.copy(self)
+
+    def join(self, other, arbitrary_term=None):
+        return BitParityState(
+            self.table,
+            self.modulo | other.modulo,
+            self.samepar | other.samepar,
+            self.antipar | other.antipar,
+        )
+
+    def join_changed(self, other, arbitrary_term=None):
+        res = self.join(other)
+        return res, res.fingerprint() != self.fingerprint()
+
+    def leq(self, other):
+        return not (
+            self.modulo & ~other.modulo
+            or
+            self.samepar & ~other.samepar
+            or
+            self.antipar & ~other.antipar
+        )
+
+    # The whole state for a given table
+    def fingerprint(self):
+        return self.modulo, self.samepar, self.antipar
+
+    def intern_key(self):
+        return hash((self.table, self.modulo, self.samepar, self.antipar))
+
+    def get_modulo(self, symbol):
+        i = self.table.index[symbol]
+        return (self.modulo >> (i * _BITS)) & _TOP
+
+    def set_modulo(self, symbol, code):
+        shift = self.table.index[symbol] * _BITS
+        self.modulo = (self.modulo & ~(_TOP << shift)) | (code << shift)
+
+    def __str__(self):
+        lines = []
+        for i, symbol in enumerate(self.table.symbols):
+            samepar = ','.join(s.name for s in self.table.row(self.samepar, i))
+            antipar = ','.join(s.name for s in self.table.row(self.antipar, i))
+            modulo = _VALUES[self.get_modulo(symbol)]
+            lines.append(
+                f'{symbol.name}: {parity._parity_name(modulo)}, '
+                f'[{samepar}], [{antipar}]'
+            )
+        return '\n'.join(lines)
+
+    @classmethod
+    def initial(cls, symbols):
+        return cls(
+            table=SymbolTable.for_symbols(symbols),
+            modulo=0,
+            samepar=0,
+            antipar=0,
+        )
+
+    def initialize_head(self, vars):
+        pass
+
+    def reset(self):
+        self.modulo = 0
+        self.samepar = 0
+        self.antipar = 0
+
+    def formula(self):
+        clauses = []
+        symbols = self.table.symbols
+
+        # ODD <-> ! EVEN
+        for symbol in symbols:
+            clauses.append(
+                shortcuts.Iff(
+                    lang_num.Odd(symbol).formula(),
+                    shortcuts.Not(lang_num.Even(symbol).formula()),
+                ),
+            )
+
+        # Encode discovered modulo state:
+        for symbol in symbols:
+            code = self.get_modulo(symbol)
+            if code == _EVEN:
+                formula = lang_num.Even(symbol).formula()
+            elif code == _ODD:
+                formula = lang_num.Odd(symbol).formula()
+            else:
+                continue
+            clauses.append(formula)
+
+        for i, symbol in enumerate(symbols):
+            samepar = self.table.row(self.samepar, i)
+            antipar = self.table.row(self.antipar, i)
+
+            if not samepar and not antipar:
+                continue
+
+            clauses.append(
+                shortcuts.Implies(
+                    shortcuts.And(
+                        *(lang_num.Even(o).formula() for o in samepar),
+                        *(lang_num.Odd(o).formula() for o in antipar),
+                    ),
+                    lang_num.Even(symbol).formula(),
+                ),
+            )
+            clauses.append(
+                shortcuts.Implies(
+                    shortcuts.And(
+                        *(lang_num.Odd(o).formula() for o in samepar),
+                        *(lang_num.Even(o).formula() for o in antipar),
+                    ),
+                    lang_num.Odd(symbol).formula(),
+                ),
+            )
+
+        return shortcuts.And(*clauses)
+
+    def post_transform(self):
+        # Remove elements both in samepar and antipar
+        common = self.samepar & self.antipar
+        self.samepar &= ~common
+        self.antipar &= ~common
+
+    # Removes symbol from every row of both relations
+    def forget(self, symbol):
+        column = ~self.table.column_masks[self.table.index[symbol]]
+        self.samepar &= column
+        self.antipar &= column
+
+    def set_rows(self, symbol, samepar=(), antipar=()):
+        i = self.table.index[symbol]
+        row = ~self.table.row_masks[i]
+        self.samepar &= row
+        self.antipar &= row
+        for other in samepar:
+            self.samepar |= self.table.bit(i, self.table.index[other])
+        for other in antipar:
+            self.antipar |= self.table.bit(i, self.table.index[other])
+
+
+@BitParityState.transforms(lang_num.VarAssignment)
+def var_assignment(state, statement):
+    if statement.lval == statement.rval:
+        return
+
+    state.set_modulo(statement.lval, state.get_modulo(statement.rval))
+    state.forget(statement.lval)
+    state.set_rows(statement.lval, samepar=(statement.rval,))
+
+
+@BitParityState.transforms(lang_num.ValAssignment)
+def val_assignment(state, statement):
+    state.set_modulo(statement.lval, _get_val_parity(statement.rval))
+    state.forget(statement.lval)
+    state.set_rows(statement.lval)
+
+
+@BitParityState.transforms(lang_num.QMarkAssignment)
+def qmark_assignment(state, statement):
+    state.set_modulo(statement.lval, _TOP)
+    state.forget(statement.lval)
+    state.set_rows(statement.lval)
+
+
+@BitParityState.transforms(lang_num.VarIncAssignment)
+@BitParityState.transforms(lang_num.VarDecAssignment)
+def incdec_assignment(state, statement):
+    rval_modulo = state.get_modulo(statement.rval)
+    if rval_modulo == _BOTTOM:
+        raise RuntimeError('Referencing BOT symbol')
+    elif rval_modulo == _TOP:
+        p = _TOP
+    else:
+        p = _TOP & ~rval_modulo
+    state.set_modulo(statement.lval, p)
+
+    if statement.rval != statement.lval:
+        state.forget(statement.lval)
+        state.set_rows(statement.lval, antipar=(statement.rval,))
+    else:
+        table = state.table
+        i = table.index[statement.lval]
+        row = table.row_masks[i]
+        samepar_row = state.samepar & row
+        antipar_row = state.antipar & row
+        state.samepar = (state.samepar & ~row) | antipar_row
+        state.antipar = (state.antipar & ~row) | samepar_row
+
+        # Same outcome as ParityState, which moves lval from samepar to
+        # antipar and then back again: every row ends up with lval in
+        # samepar if it was in either relation
+        column = table.column_masks[i]
+        moved = (state.samepar | state.antipar) & column
+        state.samepar = (state.samepar & ~column) | moved
+        state.antipar &= ~column
+
+
+@BitParityState.transforms(lang.Skip)
+@BitParityState.transforms(lang.Assert)
+def noop(state, statement):
+    pass
+
+
+@BitParityState.transforms(lang.Assume)
+def assume(state, statement):
+    expr = statement.expr
+    if isinstance(expr, lang.Falsehood):
+        state.reset()
+    elif isinstance(expr, lang.Truth):
+        pass
+    elif isinstance(expr, lang_num.EqualsVal):
+        if state.get_modulo(expr.lval) == _ODD and (expr.rval % 2 == 0):
+            state.reset()
+        elif state.get_modulo(expr.lval) == _EVEN and (expr.rval % 2 == 1):
+            state.reset()
+        state.set_modulo(expr.lval, _get_val_parity(expr.rval))
+    elif isinstance(expr, lang_num.EqualsVar):
+        res = state.get_modulo(expr.lval) & state.get_modulo(expr.rval)
+        state.set_modulo(expr.lval, res)
+        state.set_modulo(expr.rval, res)
+
+        table = state.table
+        lval = table.index[expr.lval]
+        rval = table.index[expr.rval]
+        state.samepar |= table.bit(lval, rval) | table.bit(rval, lval)
+    elif isinstance(expr, (lang_num.NotEqualsVar, lang_num.NotEqualsVal)):
+        # No new info unless we implement equality tracking
+        pass
+    else:
+        LOG.warning(f'Missing handling for {expr}')
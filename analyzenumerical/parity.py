@@ -2,11 +2,12 @@ import dataclasses
 import logging
 import typing
 
-from pysmt import shortcuts
-
 from analyzenumerical import lang as lang_num
 from analyzeframework import abstract
 from analyzeframework import lang
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
 
 
 LOG = logging.getLogger(__name__)
@@ -49,20 +50,50 @@ class ParityState(abstract.AbstractState):
     samepar: typing.Mapping[lang.Symbol, typing.Set[lang.Symbol]]
     antipar: typing.Mapping[lang.Symbol, typing.Set[lang.Symbol]]
 
-    def join(self, other, arbitrary_term=None):
-        modulo = {}
-        for symbol in self.modulo:
-            modulo[symbol] = self.modulo[symbol].union(other.modulo[symbol])
+    COW_FIELDS = ('modulo', 'samepar', 'antipar')
 
-        samepar = {}
-        for symbol in self.samepar:
-            samepar[symbol] = self.samepar[symbol].union(other.samepar[symbol])
+    def copy_field(self, field, value):
+        if field == 'modulo':
+            return dict(value)
+        return {symbol: set(syms) for symbol, syms in value.items()}
 
-        antipar = {}
-        for symbol in self.antipar:
-            antipar[symbol] = self.antipar[symbol].union(other.antipar[symbol])
+    def join(self, other, arbitrary_term=None):
+        return self.join_changed(other, arbitrary_term)[0]
+
+    # Sets only grow under union, self changed if any of them did
+    def join_changed(self, other, arbitrary_term=None):
+        changed = False
+        fields = []
+        for field in self.COW_FIELDS:
+            theirs = getattr(other, field)
+            joined = {}
+            for symbol, values in getattr(self, field).items():
+                joined[symbol] = values.union(theirs[symbol])
+                changed = changed or len(joined[symbol]) != len(values)
+            fields.append(joined)
+        return ParityState(*fields), changed
+
+    def leq(self, other):
+        return all(
+            values <= getattr(other, field)[symbol]
+            for field in self.COW_FIELDS
+            for symbol, values in getattr(self, field).items()
+        )
 
-        return ParityState(modulo, samepar, antipar)
+    # The maps hold plain sets and dicts, which cannot be held weakly, so the
+    # state is interned as a whole
+    def intern_key(self):
+        return hash(tuple(
+            tuple((symbol, frozenset(values)) for symbol, values in getattr(self, field).items())
+            for field in self.COW_FIELDS
+        ))
+
+    # Sizes of the sets, which a join that changes the state increases
+    def fingerprint(self):
+        return tuple(
+            sum(map(len, getattr(self, field).values()))
+            for field in self.COW_FIELDS
+        )
 
     def __str__(self):
         lines = []
@@ -87,10 +118,13 @@ class ParityState(abstract.AbstractState):
         pass
 
     def reset(self):
-        for key in self.modulo:
-            self.modulo[key] = BOTTOM
-            self.samepar[key].clear()
-            self.antipar[key].clear()
+        modulo = self.mutable('modulo')
+        samepar = self.mutable('samepar')
+        antipar = self.mutable('antipar')
+        for key in modulo:
+            modulo[key] = BOTTOM
+            samepar[key].clear()
+            antipar[key].clear()
 
     def formula(self):
         clauses = []
@@ -148,8 +182,10 @@ class ParityState(abstract.AbstractState):
             samepar = self.samepar[symbol]
             antipar = self.antipar[symbol]
             common = samepar.intersection(antipar)
-            samepar.difference_update(common)
-            antipar.difference_update(common)
+            if not common:
+                continue
+            self.mutable('samepar')[symbol].difference_update(common)
+            self.mutable('antipar')[symbol].difference_update(common)
 
 
 @ParityState.transforms(lang_num.VarAssignment)
@@ -157,71 +193,84 @@ def var_assignment(state, statement):
     if statement.lval == statement.rval:
         return
 
-    state.modulo[statement.lval] = state.modulo[statement.rval]
+    modulo = state.mutable('modulo')
+    samepar = state.mutable('samepar')
+    antipar = state.mutable('antipar')
 
-    for key in state.samepar:
-        state.samepar[key].discard(statement.lval)
-        state.antipar[key].discard(statement.lval)
+    modulo[statement.lval] = modulo[statement.rval]
 
-    state.samepar[statement.lval] = {statement.rval}
-    state.antipar[statement.lval].clear()
+    for key in samepar:
+        samepar[key].discard(statement.lval)
+        antipar[key].discard(statement.lval)
+
+    samepar[statement.lval] = {statement.rval}
+    antipar[statement.lval].clear()
 
 
 @ParityState.transforms(lang_num.ValAssignment)
 def val_assignment(state, statement):
-    state.modulo[statement.lval] = _get_val_parity(statement.rval)
+    modulo = state.mutable('modulo')
+    samepar = state.mutable('samepar')
+    antipar = state.mutable('antipar')
+    modulo[statement.lval] = _get_val_parity(statement.rval)
 
-    for key in state.samepar:
-        state.samepar[key].discard(statement.lval)
-        state.antipar[key].discard(statement.lval)
+    for key in samepar:
+        samepar[key].discard(statement.lval)
+        antipar[key].discard(statement.lval)
 
-    state.samepar[statement.lval].clear()
-    state.antipar[statement.lval].clear()
+    samepar[statement.lval].clear()
+    antipar[statement.lval].clear()
 
 
 @ParityState.transforms(lang_num.QMarkAssignment)
 def qmark_assignment(state, statement):
-    state.modulo[statement.lval] = TOP
+    modulo = state.mutable('modulo')
+    samepar = state.mutable('samepar')
+    antipar = state.mutable('antipar')
+    modulo[statement.lval] = TOP
 
-    for key in state.samepar:
-        state.samepar[key].discard(statement.lval)
-        state.antipar[key].discard(statement.lval)
+    for key in samepar:
+        samepar[key].discard(statement.lval)
+        antipar[key].discard(statement.lval)
 
-    state.samepar[statement.lval].clear()
-    state.antipar[statement.lval].clear()
+    samepar[statement.lval].clear()
+    antipar[statement.lval].clear()
 
 
 @ParityState.transforms(lang_num.VarIncAssignment)
 @ParityState.transforms(lang_num.VarDecAssignment)
 def incdec_assignment(state, statement):
-    rval_modulo = state.modulo[statement.rval]
+    modulo = state.mutable('modulo')
+    samepar = state.mutable('samepar')
+    antipar = state.mutable('antipar')
+    rval_modulo = modulo[statement.rval]
     if rval_modulo == BOTTOM:
         raise RuntimeError('Referencing BOT symbol')
     elif rval_modulo == TOP:
         p = TOP
     else:
         p = TOP.difference(rval_modulo)
-    state.modulo[statement.lval] = p
+    modulo[statement.lval] = p
 
     if statement.rval != statement.lval:
-        state.samepar[statement.lval].clear()
-        state.antipar[statement.lval] = {statement.rval}
+        samepar[statement.lval].clear()
+        antipar[statement.lval] = {statement.rval}
 
-        for key in state.samepar:
-            state.samepar[key].discard(statement.lval)
-            state.antipar[key].discard(statement.lval)
+        for key in samepar:
+            samepar[key].discard(statement.lval)
+            antipar[key].discard(statement.lval)
     else:
-        tmp = state.samepar[statement.lval]
-        state.samepar[statement.lval] = state.antipar[statement.lval]
-        state.antipar[statement.lval] = tmp
+        tmp = samepar[statement.lval]
+        samepar[statement.lval] = antipar[statement.lval]
+        antipar[statement.lval] = tmp
 
-        for key in state.samepar:
-            if statement.lval in state.samepar[key]:
-                state.samepar[key].remove(statement.lval)
-                state.antipar[key].add(statement.lval)
-            if statement.lval in state.antipar[key]:
-                state.antipar[key].remove(statement.lval)
-                state.samepar[key].add(statement.lval)
+        for key in samepar:
+            if statement.lval in samepar[key]:
+                samepar[key].remove(statement.lval)
+                antipar[key].add(statement.lval)
+            if statement.lval in antipar[key]:
+                antipar[key].remove(statement.lval)
+                samepar[key].add(statement.lval)
 
 
 @ParityState.transforms(lang.Skip)
@@ -241,14 +290,16 @@ def assume(state, statement):
             state.reset()
         elif state.modulo[expr.lval] == EVEN and (expr.rval % 2 == 1):
             state.reset()
-        state.modulo[expr.lval] = _get_val_parity(expr.rval)
+        state.mutable('modulo')[expr.lval] = _get_val_parity(expr.rval)
     elif isinstance(expr, lang_num.EqualsVar):
-        res = state.modulo[expr.lval].intersection(state.modulo[expr.rval])
-        state.modulo[expr.lval] = res
-        state.modulo[expr.rval] = res
-
-        state.samepar[expr.lval].add(expr.rval)
-        state.samepar[expr.rval].add(expr.lval)
+        modulo = state.mutable('modulo')
+        samepar = state.mutable('samepar')
+        res = modulo[expr.lval].intersection(modulo[expr.rval])
+        modulo[expr.lval] = res
+        modulo[expr.rval] = res
+
+        samepar[expr.lval].add(expr.rval)
+        samepar[expr.rval].add(expr.lval)
     elif isinstance(expr, (lang_num.NotEqualsVar, lang_num.NotEqualsVal)):
         # No new info unless we implement equality tracking
         pass
@@ -1,15 +1,21 @@
 import dataclasses
 import enum
+import heapq
 import itertools
 import logging
 import typing
+import weakref
 
 import more_itertools
-from pysmt import shortcuts
+import numpy
 
 from analyzeframework import abstract
+from analyzeframework import interning
 from analyzenumerical import lang as lang_num
 from analyzeframework import lang
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
 
 LOG = logging.getLogger(__name__)
 MAX_COMBINATION_SIZE = 3
@@ -51,6 +57,12 @@ def _const_name(val):
         return str(val)
 
 
+# The order _const_join climbs: ⊤ is above every value, any other value is
+# only below itself
+def _const_leq(a, b):
+    return b is TOP or a is b or a == b
+
+
 def _const_join(a, b):
     if a == b:
         return a
@@ -65,9 +77,18 @@ def _const_join(a, b):
 @dataclasses.dataclass
 class SumTracker:
     sums: typing.Mapping[typing.Set[lang.Symbol], int]
+    # Shared by all trackers of the same keys, built on first use
+    _index: '_SumIndex' = dataclasses.field(
+        default=None, compare=False, repr=False,
+    )
 
+    # combinations - the sums to track, None tracks every combination of up
+    # to MAX_COMBINATION_SIZE variables
     @classmethod
-    def initial(cls, vars):
+    def initial(cls, vars, combinations=None):
+        if combinations is not None:
+            return cls(dict.fromkeys(combinations, BOTTOM))
+
         sums = {}
         for i in range(1, MAX_COMBINATION_SIZE + 1):
             for key in itertools.combinations(vars, i):
@@ -75,17 +96,33 @@ class SumTracker:
         return cls(sums)
 
     def reset(self):
-        for key in self:
-            self[key] = BOTTOM
+        for key in self.sums:
+            self.sums[key] = BOTTOM
 
     def join(self, other):
         return SumTracker(
             sums={
                 key: _const_join(self[key], other[key])
                 for key in self.sums.keys()
-            }
+            },
+            _index=self._index,
         )
 
+    def leq(self, other):
+        return all(_const_leq(val, other.sums[key]) for key, val in self.sums.items())
+
+    # ⊤ and ⊥ compare unequal to themselves, their names stand in for them
+    def intern_key(self):
+        return hash((tuple(self.sums), tuple(
+            _const_name(val) if val in _SPECIAL else val
+            for val in self.sums.values()
+        )))
+
+    def index(self):
+        if self._index is None:
+            self._index = _SumIndex.for_keys(tuple(self.sums))
+        return self._index
+
     def formula(self):
         clauses = []
         for syms, val in self.sums.items():
@@ -126,53 +163,231 @@ class SumTracker:
         return self.sums.keys()
 
 
-@dataclasses.dataclass
+# Position of every tracked combination and the tracked combinations that
+# strictly contain it, in the same order
+class _SumIndex:
+    # Held weakly, an index lives as long as the trackers using it
+    _INDICES = weakref.WeakValueDictionary()
+
+    def __init__(self, keys):
+        self.position = {key: i for i, key in enumerate(keys)}
+        self.supersets = {key: [] for key in keys}
+        for key in keys:
+            for i in range(1, len(key)):
+                for part in itertools.combinations(key, i):
+                    supersets = self.supersets.get(frozenset(part))
+                    if supersets is not None:
+                        supersets.append(key)
+
+    @classmethod
+    def for_keys(cls, keys):
+        try:
+            return cls._INDICES[keys]
+        except KeyError:
+            return cls._INDICES.setdefault(keys, cls(keys))
+
+
+# Pre-pass over the program: the combinations its SUM asserts can be proven
+# from. For every asserted equality these are the variables of both sides
+# together, e.g. a + b + c for SUM a = SUM b c, since that sum is often known
+# when the sides themselves are not, and all of their subsets, which
+# _deduce_sums and _deduce_sub_sums derive sums from. Every single variable is
+# kept since the transformers read them. Combinations are capped at
+# MAX_COMBINATION_SIZE and listed in the order SumTracker.initial would list
+# them.
+def demanded_combinations(control, vars):
+    index = {sym: i for i, sym in enumerate(vars)}
+    demanded = {(i,) for i in range(len(vars))}
+    for node in control.nodes.values():
+        for edge in node.out_edges:
+            if not isinstance(edge.statement, lang.Assert):
+                continue
+            for clause in edge.statement.dnf:
+                for pred in clause:
+                    if not isinstance(pred, lang_num.SumEquals):
+                        continue
+                    indices = sorted(
+                        {index[sym] for sym in (*pred.lval, *pred.rval)},
+                    )
+                    for i in range(2, MAX_COMBINATION_SIZE + 1):
+                        demanded.update(itertools.combinations(indices, i))
+
+    return [
+        frozenset(vars[i] for i in key)
+        for key in sorted(demanded, key=lambda key: (len(key), key))
+    ]
+
+
+# Kinds of the dense difference matrix entries
+_KNOWN = 0
+_TOP = 1
+_BOTTOM = 2
+
+_KIND_CONSTS = {_TOP: TOP, _BOTTOM: BOTTOM}
+
+
+# Index of the variables in the dense matrices, shared by all matrices of
+# the same variables. A pair is reversed when its symbols are not in
+# ascending order, the entry then holds the negated difference (see
+# DiffMatrix.__setitem__).
+class _Layout:
+    # Held weakly, a layout lives as long as the matrices using it
+    _LAYOUTS = weakref.WeakValueDictionary()
+
+    def __init__(self, vars):
+        self.vars = list(vars)
+        self.index = {sym: i for i, sym in enumerate(self.vars)}
+        self.reversed = numpy.array(
+            [[s1 >= s2 for s2 in self.vars] for s1 in self.vars],
+            dtype=bool,
+        ).reshape(len(self.vars), len(self.vars))
+        self.sign = numpy.where(self.reversed, -1, 1)
+        # Stored pairs in the order DiffMatrix used to list them
+        self.pairs = [
+            (i, j)
+            for i, s1 in enumerate(self.vars)
+            for j, s2 in enumerate(self.vars)
+            if s1 < s2
+        ]
+
+    @classmethod
+    def for_vars(cls, vars):
+        key = tuple(vars)
+        try:
+            return cls._LAYOUTS[key]
+        except KeyError:
+            return cls._LAYOUTS.setdefault(key, cls(key))
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+# Components of node states, by their contents
+_MATRICES = interning.Table()
+_TRACKERS = interning.Table()
+
+
+# Differences between pairs of variables. Only one entry is kept per pair
+# of symbols, mirrored to both [i, j] and [j, i], so reading a pair in
+# either order gives the same entry. Entries of kind other than _KNOWN have
+# value 0.
 class DiffMatrix:
-    val: typing.Mapping[typing.Tuple[lang.Symbol, lang.Symbol], int]
+    def __init__(self, layout, val, kind):
+        self.layout = layout
+        self.val = val
+        self.kind = kind
 
     @classmethod
     def initial(cls, vars):
-        return cls(
-            val={
-                key: BOTTOM
-                for key in itertools.product(vars, vars)
-                if key[0] < key[1]
-            }
+        layout = _Layout.for_vars(vars)
+        n = len(layout.vars)
+        kind = numpy.full((n, n), _BOTTOM, dtype=numpy.int8)
+        numpy.fill_diagonal(kind, _KNOWN)
+        return cls(layout, numpy.zeros((n, n), dtype=numpy.int64), kind)
+
+    def copy(self):
+        return DiffMatrix(self.layout, self.val.copy(), self.kind.copy())
+
+    def __eq__(self, other):
+        if not isinstance(other, DiffMatrix):
+            return NotImplemented
+        return (
+            numpy.array_equal(self.kind, other.kind)
+            and
+            numpy.array_equal(self.val, other.val)
         )
 
-    def __setitem__(self, key, value):
-        if key[0] == key[1]:
+    def __repr__(self):
+        return f'DiffMatrix({self})'
+
+    def _get(self, i, j):
+        kind = self.kind[i, j]
+        if kind == _KNOWN:
+            return int(self.val[i, j])
+        return _KIND_CONSTS[kind]
+
+    def _set(self, i, j, value):
+        if i == j:
             return
-        if key[0] >= key[1]:
-            key = (key[1], key[0])
+        if self.layout.reversed[i, j]:
             value = -value
-        self.val[key] = value
+        if value in _SPECIAL:
+            self.kind[i, j] = self.kind[j, i] = (
+                _TOP if value is TOP else _BOTTOM
+            )
+            self.val[i, j] = self.val[j, i] = 0
+        else:
+            self.kind[i, j] = self.kind[j, i] = _KNOWN
+            self.val[i, j] = self.val[j, i] = value
+
+    def __setitem__(self, key, value):
+        index = self.layout.index
+        self._set(index[key[0]], index[key[1]], value)
 
     def __getitem__(self, key):
-        if key[0] == key[1]:
-            return 0
-        if key[0] >= key[1]:
-            key = (key[1], key[0])
-        return self.val[key]
+        index = self.layout.index
+        return self._get(index[key[0]], index[key[1]])
+
+    # Same as self[sym, other] += delta for every other variable
+    def add_to_row(self, sym, delta):
+        i = self.layout.index[sym]
+        known = self.kind[i] == _KNOWN
+        val = numpy.where(known, (self.val[i] + delta) * self.layout.sign[i], 0)
+        kind = numpy.where(known, _KNOWN, _TOP).astype(numpy.int8)
+        val[i] = 0
+        kind[i] = _KNOWN
+        self.val[i] = self.val[:, i] = val
+        self.kind[i] = self.kind[:, i] = kind
+
+    # Same as self[sym, other] = TOP for every other variable
+    def forget_row(self, sym):
+        i = self.layout.index[sym]
+        self.val[i] = self.val[:, i] = 0
+        self.kind[i] = self.kind[:, i] = _TOP
+        self.kind[i, i] = _KNOWN
 
     def join(self, other):
-        return DiffMatrix(
-            val={
-                key: _const_join(
-                    self.val[key],
-                    other.val[key],
-                )
-                for key in self.val
-            },
+        # Matches _const_join entrywise, BOTTOM only yields to the other side
+        equal = (
+            (self.kind == _KNOWN)
+            &
+            (other.kind == _KNOWN)
+            &
+            (self.val == other.val)
         )
+        bottom = self.kind == _BOTTOM
+        kind = numpy.where(
+            equal,
+            _KNOWN,
+            numpy.where(bottom, other.kind, _TOP),
+        ).astype(numpy.int8)
+        val = numpy.where(kind == _KNOWN, numpy.where(bottom, other.val, self.val), 0)
+        return DiffMatrix(self.layout, val, kind)
+
+    def intern_key(self):
+        return hash((self.layout, self.kind.tobytes(), self.val.tobytes()))
+
+    # _const_leq entrywise, entries of other kinds than _KNOWN have value 0
+    def leq(self, other):
+        return bool(numpy.all(
+            (other.kind == _TOP)
+            |
+            ((self.kind == other.kind) & (self.val == other.val))
+        ))
 
     def reset(self):
-        for key in self.val:
-            self.val[key] = BOTTOM
+        self.val[:] = 0
+        self.kind[:] = _BOTTOM
+        numpy.fill_diagonal(self.kind, _KNOWN)
+
+    def items(self):
+        vars = self.layout.vars
+        for i, j in self.layout.pairs:
+            yield (vars[i], vars[j]), self._get(i, j)
 
     def formula(self):
         clauses = []
-        for key, value in self.val.items():
+        for key, value in self.items():
             if value in _SPECIAL:
                 continue
             clauses.append(
@@ -188,7 +403,7 @@ class DiffMatrix:
 
     def __str__(self):
         factoids = []
-        for key, value in self.val.items():
+        for key, value in self.items():
             if value in _SPECIAL:
                 continue
             factoids.append(
@@ -203,16 +418,23 @@ class SumState(abstract.AbstractState):
     diff: DiffMatrix
     sums: SumTracker
 
+    COW_FIELDS = ('diff', 'sums')
+
+    def copy_field(self, field, value):
+        if field == 'diff':
+            return value.copy()
+        return SumTracker(dict(value.sums), value._index)
+
     def reset(self):
-        self.diff.reset()
-        self.sums.reset()
+        self.mutable('diff').reset()
+        self.mutable('sums').reset()
 
     @classmethod
-    def initial(cls, vars):
+    def initial(cls, vars, combinations=None):
         return cls(
             vars=vars,
             diff=DiffMatrix.initial(vars),
-            sums=SumTracker.initial(vars),
+            sums=SumTracker.initial(vars, combinations),
         )
 
     def initialize_head(self, vars):
@@ -225,6 +447,22 @@ class SumState(abstract.AbstractState):
             sums=self.sums.join(other.sums),
         )
 
+    def leq(self, other):
+        return self.diff.leq(other.diff) and self.sums.leq(other.sums)
+
+    # States share their interned matrix and sums
+    def interned(self):
+        self.diff = _MATRICES.intern(self.diff.intern_key(), self.diff)
+        self.sums = _TRACKERS.intern(self.sums.intern_key(), self.sums)
+        return super().interned()
+
+    def intern_key(self):
+        return hash((self.diff.intern_key(), self.sums.intern_key()))
+
+    # Entries of every kind in the matrix, the sums are left to __eq__
+    def fingerprint(self):
+        return numpy.bincount(self.diff.kind.ravel(), minlength=3).tobytes()
+
     def formula(self):
         return shortcuts.And(
             self.diff.formula(),
@@ -234,86 +472,242 @@ class SumState(abstract.AbstractState):
     def __str__(self):
         return f'{self.sums}\n{self.diff}'
 
+    # Tracked sums and those with a known value
+    def metrics(self):
+        return {
+            'sums': len(self.sums.sums),
+            'known_sums': sum(val not in _SPECIAL for val in self.sums.sums.values()),
+        }
+
     def post_transform(self):
-        while True:
-            old = self.copy()
-            self._deduce_deltas()
-            self._deduce_vars()
-            self._deduce_sums()
-            self._deduce_sub_sums()
-            if self == old:
-                break
+        _Closure(self).run()
+
+    # Known singleton sums as (mask, values) arrays in variable order
+    def _known_vars(self):
+        vals = [self.sums[{sym}] for sym in self.diff.layout.vars]
+        known = numpy.array([v not in _SPECIAL for v in vals], dtype=bool)
+        values = numpy.array(
+            [v if k else 0 for v, k in zip(vals, known)],
+            dtype=numpy.int64,
+        )
+        return known, values
+
+
+# The deduction passes of SumState.post_transform, run in rounds until a
+# round changes nothing
+_DELTAS, _VARS, _SUMS, _SUB_SUMS = range(4)
+_PASSES = (_DELTAS, _VARS, _SUMS, _SUB_SUMS)
+
+
+# Semi-naive closure of a state. The first round visits every fact, later
+# rounds only the facts whose inputs changed since their last visit: every
+# write queues the facts depending on it, in the current round if its pass
+# has not reached them yet, otherwise in the next one. Facts are visited in
+# the same order and see the same state as when every round visits every
+# fact, so the outcome is the same, deductions overwriting each other
+# included.
+class _Closure:
+    def __init__(self, state):
+        self.state = state
+        self.n = len(state.vars)
+        self.index = state.sums.index()
+        self.sums_known, self.sums_val = state._known_vars()
+
+        # Facts with no known input can only be derived once one of their
+        # inputs changes, which queues them
+        diff = state.diff
+        known = diff.kind == _KNOWN
+        numpy.fill_diagonal(known, False)
+        related = known.any(axis=1)
+        pairs = ~known & (
+            numpy.outer(related, related)
+            |
+            numpy.outer(self.sums_known, self.sums_known)
+        )
+        numpy.fill_diagonal(pairs, False)
+        singles = ~self.sums_known & (known & self.sums_known).any(axis=1)
+
+        self.next = [{} for _ in _PASSES]
+        self.next[_DELTAS] = {
+            i * self.n + j: (i, j) for i, j in numpy.argwhere(pairs)
+        }
+        self.next[_VARS] = {i: i for i in numpy.flatnonzero(singles)}
+        sums = state.sums
+        for key, value in sums.items():
+            if value in _SPECIAL:
+                continue
+            for superset in self.index.supersets[key]:
+                position = self.index.position[superset]
+                if sums[superset] in _SPECIAL:
+                    self.next[_SUMS][position] = superset
+                else:
+                    self.next[_SUB_SUMS][position] = superset
+
+    def run(self):
+        while any(self.next):
+            self.queued = self.next
+            self.next = [{} for _ in _PASSES]
+            for self.current in _PASSES:
+                self.heap = list(self.queued[self.current])
+                heapq.heapify(self.heap)
+                while self.heap:
+                    self.position = heapq.heappop(self.heap)
+                    fact = self.queued[self.current].pop(self.position)
+                    self.deduce(fact)
+
+    def deduce(self, fact):
+        if self.current == _DELTAS:
+            self._deduce_delta(*fact)
+        elif self.current == _VARS:
+            self._deduce_var(fact)
+        elif self.current == _SUMS:
+            self._deduce_sum(fact)
+        else:
+            self._deduce_sub_sum(fact)
+
+    def queue(self, pass_, position, fact):
+        if pass_ > self.current:
+            self.queued[pass_][position] = fact
+        elif pass_ == self.current and position > self.position:
+            if position not in self.queued[pass_]:
+                self.queued[pass_][position] = fact
+                heapq.heappush(self.heap, position)
+        else:
+            self.next[pass_][position] = fact
+
+    def _queue_pairs(self, i):
+        pending = self.state.diff.kind != _KNOWN
+        for j in numpy.flatnonzero(pending[i]):
+            self.queue(_DELTAS, i * self.n + j, (i, j))
+        for j in numpy.flatnonzero(pending[:, i]):
+            self.queue(_DELTAS, j * self.n + i, (j, i))
+
+    def diff_changed(self, s1, s2):
+        # Entries of (s1, s2) are read by the pairs on the rows and columns
+        # of both symbols
+        for i in (s1, s2):
+            self._queue_pairs(i)
+            self.queue(_VARS, i, i)
+
+    def sum_changed(self, key):
+        sums = self.state.sums
+        self.queue(_SUB_SUMS, self.index.position[key], key)
+        for superset in self.index.supersets[key]:
+            if sums[superset] in _SPECIAL:
+                self.queue(_SUMS, self.index.position[superset], superset)
+            else:
+                self.queue(_SUB_SUMS, self.index.position[superset], superset)
+
+        if len(key) != 1:
+            return
+        sym, = key
+        i = self.state.diff.layout.index[sym]
+        self.sums_known[i] = True
+        self.sums_val[i] = sums[key]
+        self._queue_pairs(i)
+        known = self.state.diff.kind[i] == _KNOWN
+        for j in numpy.flatnonzero(known & ~self.sums_known):
+            self.queue(_VARS, j, j)
+
+    def set_sum(self, key, value):
+        key = frozenset(key)
+        self.state.mutable('sums')[key] = value
+        self.sum_changed(key)
+
+    # The difference of an unknown pair (s1, s2) is taken from the sums of
+    # s1 and s2, then from every s3 in turn with known (s1, s3) and (s3, s2)
+    # entries. The last such s3 wins. Since both s3 = s1 and s3 = s2 are also
+    # passed once the entry is known, and a write to a reversed pair negates
+    # the value, each of these flips the entry. Only the entries of the pair
+    # itself change while it is being derived, so the outcome is computed in
+    # closed form from the candidates.
+    # Pairs are still derived one at a time rather than by a vectorized
+    # Floyd-Warshall pass: such a pass sees none of the writes of the pairs
+    # before it in the round, and with the flips those writes change the
+    # result. Pairs take about 3% of the fixpoint time on the sum examples
+    # and generated programs, the sum partitions most of the rest.
+    def _deduce_delta(self, s1, s2):
+        diff = self.state.diff
+        if diff.kind[s1, s2] == _KNOWN:
+            return
 
-    def _deduce_deltas(self):
-        for s1 in self.vars:
-            for s2 in self.vars:
-                if self.diff[s1, s2] not in _SPECIAL:
-                    continue
-
-                if (
-                    self.sums[{s1}] not in _SPECIAL
-                    and
-                    self.sums[{s2}] not in _SPECIAL
-                ):
-                    self.diff[s1, s2] = (
-                        self.sums[{s1}] - self.sums[{s2}]
-                    )
+        reversed_pair = diff.layout.reversed[s1, s2]
+        known = False
+        value = 0
+        if self.sums_known[s1] and self.sums_known[s2]:
+            known = True
+            value = self.sums_val[s1] - self.sums_val[s2]
+            if reversed_pair:
+                value = -value
+
+        candidates = (diff.kind[s1] == _KNOWN) & (diff.kind[:, s2] == _KNOWN)
+        candidates[s1] = candidates[s2] = False
+        found = numpy.flatnonzero(candidates)
+        if len(found):
+            s3 = found[-1]
+            known = True
+            value = diff.val[s1, s3] + diff.val[s3, s2]
+            if reversed_pair:
+                value = -value
+                flips = int(s1 > s3) + int(s2 > s3)
+                if flips % 2:
+                    value = -value
+
+        if not known:
+            return
 
-                for s3 in self.vars:
-                    if (
-                        self.diff[s1, s3] not in _SPECIAL
-                        and
-                        self.diff[s3, s2] not in _SPECIAL
-                    ):
-                        self.diff[s1, s2] = (
-                            self.diff[s1, s3] + self.diff[s3, s2]
-                        )
-
-    def _deduce_vars(self):
-        for sym in self.vars:
-            if self.sums[{sym}] not in _SPECIAL:
-                continue
+        diff = self.state.mutable('diff')
+        diff.kind[s1, s2] = diff.kind[s2, s1] = _KNOWN
+        diff.val[s1, s2] = diff.val[s2, s1] = value
+        self.diff_changed(s1, s2)
 
-            for other in self.vars:
-                if (
-                    self.diff[sym, other] not in _SPECIAL
-                    and
-                    self.sums[{other}] not in _SPECIAL
-                ):
-                    self.sums[{sym}] = (
-                        self.sums[{other}] + self.diff[sym, other]
-                    )
+    # The sum of a variable is taken from the last other variable with a
+    # known sum and difference
+    def _deduce_var(self, i):
+        if self.sums_known[i]:
+            return
 
-    def _deduce_sums(self):
-        for key, value in self.sums.items():
-            if value not in _SPECIAL:
-                continue
-            for part in more_itertools.set_partitions(key):
-                if all(
-                    self.sums[p] not in _SPECIAL for p in part
-                ):
-                    self.sums[key] = sum(self.sums[p] for p in part)
-                    break
-
-    def _deduce_sub_sums(self):
-        for key, value in self.sums.items():
-            if value in _SPECIAL:
+        diff = self.state.diff
+        candidates = (diff.kind[i] == _KNOWN) & self.sums_known
+        candidates[i] = False
+        found = numpy.flatnonzero(candidates)
+        if not len(found):
+            return
+
+        other = found[-1]
+        value = int(self.sums_val[other] + diff.val[i, other])
+        self.set_sum({diff.layout.vars[i]}, value)
+
+    def _deduce_sum(self, key):
+        sums = self.state.sums
+        if sums[key] not in _SPECIAL:
+            return
+        for part in more_itertools.set_partitions(key):
+            if all(
+                sums[p] not in _SPECIAL for p in part
+            ):
+                self.set_sum(key, sum(sums[p] for p in part))
+                break
+
+    def _deduce_sub_sum(self, key):
+        value = self.state.sums[key]
+        if value in _SPECIAL:
+            return
+        for p1, p2 in more_itertools.set_partitions(key, 2):
+            v1 = self.state.sums[p1]
+            v2 = self.state.sums[p2]
+            # Skip partitions where both parts are either known or unknown
+            if (
+                (v1 in _SPECIAL and v2 in _SPECIAL)
+                or
+                (v1 not in _SPECIAL and v2 not in _SPECIAL)
+            ):
                 continue
-            for p1, p2 in more_itertools.set_partitions(key, 2):
-                v1 = self.sums[p1]
-                v2 = self.sums[p2]
-                # Skip partitions where both parts are either known or unknown
-                if (
-                    (v1 in _SPECIAL and v2 in _SPECIAL)
-                    or
-                    (v1 not in _SPECIAL and v2 not in _SPECIAL)
-                ):
-                    continue
-
-                if v1 in _SPECIAL:
-                    self.sums[p1] = value - v2
-                else:
-                    self.sums[p2] = value - v1
+
+            if v1 in _SPECIAL:
+                self.set_sum(p1, value - v2)
+            else:
+                self.set_sum(p2, value - v1)
 
 
 def _delta(new, old):
@@ -324,30 +718,30 @@ def _delta(new, old):
 
 
 def _sym_assign_sym(state, lval, rval):
-    old_val = state.sums[{lval}]
-    new_val = state.sums[{rval}]
+    diff = state.mutable('diff')
+    sums = state.mutable('sums')
+    old_val = sums[{lval}]
+    new_val = sums[{rval}]
     delta = _delta(new_val, old_val)
 
     if delta not in _SPECIAL:
         # Adjust sums that include lval by known delta
-        for key in state.sums.keys():
+        for key in sums.keys():
             if lval in key:
-                state.sums[key] += delta
+                sums[key] += delta
 
         # Adjust deltas
-        for sym in state.vars:
-            state.diff[lval, sym] -= delta
+        diff.add_to_row(lval, -delta)
     else:
         # Delta unknown, reset related sums
-        for key in state.sums.keys():
+        for key in sums.keys():
             if lval in key:
-                state.sums[key] = TOP
+                sums[key] = TOP
 
         # Reset related deltas
-        for sym in state.vars:
-            state.diff[lval, sym] = TOP
+        diff.forget_row(lval)
         # Set delta 0 to rval
-        state.diff[lval, rval] = 0
+        diff[lval, rval] = 0
 
 
 @SumState.transforms(lang_num.VarAssignment)
@@ -358,33 +752,33 @@ def var_assignment(state, statement):
 
 
 def _sym_assign_val(state, lval, rval):
-    old_val = state.sums[{lval}]
+    diff = state.mutable('diff')
+    sums = state.mutable('sums')
+    old_val = sums[{lval}]
     new_val = rval
     delta = _delta(new_val, old_val)
 
     if delta not in _SPECIAL:
         # Adjust sums that include lval by known delta
-        for key in state.sums.keys():
+        for key in sums.keys():
             if lval in key:
-                state.sums[key] += delta
+                sums[key] += delta
 
         # Adjust deltas
-        for sym in state.vars:
-            state.diff[lval, sym] -= delta
+        diff.add_to_row(lval, -delta)
     else:
         # Delta unknown, reset related sums
-        for key in state.sums.keys():
+        for key in sums.keys():
             if lval in key:
-                state.sums[key] = TOP
-        state.sums[{lval}] = new_val
+                sums[key] = TOP
+        sums[{lval}] = new_val
 
         # Reset related deltas
-        for sym in state.vars:
-            state.diff[lval, sym] = TOP
+        diff.forget_row(lval)
 
 
 def _sym_assume_val(state, lval, rval):
-    state.sums[{lval}] = rval
+    state.mutable('sums')[{lval}] = rval
 
 
 @SumState.transforms(lang_num.ValAssignment)
@@ -394,81 +788,82 @@ def val_assignment(state, statement):
 
 @SumState.transforms(lang_num.QMarkAssignment)
 def qmark_assignment(state, statement):
-    for key in state.sums.keys():
+    diff = state.mutable('diff')
+    sums = state.mutable('sums')
+    for key in sums.keys():
         if statement.lval in key:
-            state.sums[key] = TOP
+            sums[key] = TOP
 
     # Reset related deltas
-    for sym in state.vars:
-        state.diff[statement.lval, sym] = TOP
+    diff.forget_row(statement.lval)
 
 
 @SumState.transforms(lang_num.VarIncAssignment)
 def inc_assignment(state, statement):
+    diff = state.mutable('diff')
+    sums = state.mutable('sums')
     if statement.lval == statement.rval:
         delta = 1
     else:
-        old_val = state.sums[{statement.lval}]
-        new_val = state.sums[{statement.rval}] + 1
+        old_val = sums[{statement.lval}]
+        new_val = sums[{statement.rval}] + 1
         delta = _delta(new_val, old_val)
 
     if delta not in _SPECIAL:
         # Adjust sums that include lval by known delta
-        for key in state.sums.keys():
+        for key in sums.keys():
             if statement.lval in key:
-                state.sums[key] += delta
+                sums[key] += delta
 
         # Adjust known deltas
-        for sym in state.vars:
-            state.diff[statement.lval, sym] += delta
+        diff.add_to_row(statement.lval, delta)
     else:
         # Delta unknown, reset related sums
-        for key in state.sums.keys():
+        for key in sums.keys():
             if statement.lval in key:
-                state.sums[key] = TOP
-        state.sums[{statement.lval}] = new_val
+                sums[key] = TOP
+        sums[{statement.lval}] = new_val
 
         # Reset related deltas
-        for sym in state.vars:
-            state.diff[statement.lval, sym] = TOP
+        diff.forget_row(statement.lval)
 
     # If lval != rval, set their delta to 1
     if statement.lval != statement.rval:
-        state.diff[statement.lval, statement.rval] = 1
+        diff[statement.lval, statement.rval] = 1
 
 
 @SumState.transforms(lang_num.VarDecAssignment)
 def dec_assignment(state, statement):
+    diff = state.mutable('diff')
+    sums = state.mutable('sums')
     if statement.lval == statement.rval:
         delta = -1
     else:
-        old_val = state.sums[{statement.lval}]
-        new_val = state.sums[{statement.rval}] - 1
-        delta = new_val - old_val
+        old_val = sums[{statement.lval}]
+        new_val = sums[{statement.rval}] - 1
+        delta = _delta(new_val, old_val)
 
     if delta not in _SPECIAL:
         # Adjust sums that include lval by known delta
-        for key in state.sums.keys():
+        for key in sums.keys():
             if statement.lval in key:
-                state.sums[key] += delta
+                sums[key] += delta
 
         # Adjust known deltas
-        for sym in state.vars:
-            state.diff[statement.lval, sym] -= delta
+        diff.add_to_row(statement.lval, -delta)
     else:
         # Delta unknown, reset related sums
-        for key in state.sums.keys():
+        for key in sums.keys():
             if statement.lval in key:
-                state.sums[key] = TOP
-        state.sums[{statement.lval}] = new_val
+                sums[key] = TOP
+        sums[{statement.lval}] = new_val
 
         # Reset related deltas
-        for sym in state.vars:
-            state.diff[statement.lval, sym] = TOP
+        diff.forget_row(statement.lval)
 
     # If lval != rval, set their delta to 1
     if statement.lval != statement.rval:
-        state.diff[statement.lval, statement.rval] = -1
+        diff[statement.lval, statement.rval] = -1
 
 
 @SumState.transforms(lang.Skip)
@@ -495,7 +890,7 @@ def assume(state, statement):
         if known_delta not in _SPECIAL and known_delta != 0:
             state.reset()
         elif known_delta in _SPECIAL:
-            state.diff[expr.lval, expr.rval] = 0
+            state.mutable('diff')[expr.lval, expr.rval] = 0
     elif isinstance(expr, lang_num.NotEqualsVar):
         if (
             state.sums[{expr.lval}] == state.sums[{expr.rval}]
@@ -504,7 +899,7 @@ def assume(state, statement):
         ):
             state.reset()
     elif isinstance(expr, lang_num.NotEqualsVal):
-        if state.sum[{expr.lval}] == expr.rval:
+        if state.sums[{expr.lval}] == expr.rval:
             state.reset()
     else:
         LOG.warning(f'Missing handling for {expr}')
@@ -0,0 +1,277 @@
+import dataclasses
+import typing
+
+import numpy
+
+from analyzeframework import lang
+from analyzeshape import closure, linear, structure, three_valued_logic
+
+TRUE = three_valued_logic.ThreeValuedBool.TRUE
+FALSE = three_valued_logic.ThreeValuedBool.FALSE
+MAYBE = three_valued_logic.ThreeValuedBool.MAYBE
+
+DTYPE = three_valued_logic.ARRAY_DTYPE
+
+_VALUES = (FALSE, MAYBE, TRUE)
+
+
+def _unary(pred, indiv):
+    return numpy.array([pred[v] for v in indiv], DTYPE)
+
+
+def _binary(pred, indiv):
+    return numpy.array(
+        [[pred.get((u,v), FALSE) for v in indiv] for u in indiv], DTYPE,
+    ).reshape(len(indiv), len(indiv))
+
+
+# Structure with its predicates held in int8 arrays of the three valued
+# constants. Individuals are positions along the arrays: the unary predicates
+# of the variables are (vars x indiv) matrices in the order of symbols, and n
+# and n_plus are (indiv x indiv) matrices.
+@dataclasses.dataclass(eq=False)
+class ArrayStructure:
+    symbols: typing.Tuple[lang.Symbol, ...]
+    var: numpy.ndarray
+    reach: numpy.ndarray
+    cycle: numpy.ndarray
+    shared: numpy.ndarray
+    sm: numpy.ndarray
+    n: numpy.ndarray
+    n_plus: numpy.ndarray
+    size: typing.List[linear.Linear]
+    arbitrary_terms_stack: typing.List[lang.Symbol]
+
+    @classmethod
+    def initial(cls, symbols):
+        symbols = tuple(sorted(symbols))
+        return cls(
+            symbols=symbols,
+            var=numpy.zeros((len(symbols), 0), DTYPE),
+            reach=numpy.zeros((len(symbols), 0), DTYPE),
+            cycle=numpy.zeros(0, DTYPE),
+            shared=numpy.zeros(0, DTYPE),
+            sm=numpy.zeros(0, DTYPE),
+            n=numpy.zeros((0, 0), DTYPE),
+            n_plus=numpy.zeros((0, 0), DTYPE),
+            size=[],
+            arbitrary_terms_stack=[],
+        )
+
+    # Individuals of the structure are numbered by their order in st.indiv,
+    # n and n_plus may be passed in when they are at hand as arrays
+    @classmethod
+    def from_structure(cls, st, n=None, n_plus=None):
+        symbols = tuple(sorted(st.var))
+        indiv = st.indiv
+        return cls(
+            symbols=symbols,
+            var=numpy.array(
+                [[st.var[key][v] for v in indiv] for key in symbols], DTYPE,
+            ).reshape(len(symbols), len(indiv)),
+            reach=numpy.array(
+                [[st.reach[key][v] for v in indiv] for key in symbols], DTYPE,
+            ).reshape(len(symbols), len(indiv)),
+            cycle=_unary(st.cycle, indiv),
+            shared=_unary(st.shared, indiv),
+            sm=_unary(st.sm, indiv),
+            n=_binary(st.n, indiv) if n is None else n,
+            # n_plus is only complete after update_n_plus
+            n_plus=_binary(st.n_plus, indiv) if n_plus is None else n_plus,
+            size=[st.size[v] for v in indiv],
+            arbitrary_terms_stack=list(st.arbitrary_terms_stack),
+        )
+
+    def to_structure(self, constr=None):
+        if constr is None:
+            constr = structure.Structure.init_constr(self.symbols)
+
+        indiv = list(self.indiv)
+
+        def unary(row):
+            return {v: _VALUES[val] for v, val in enumerate(row)}
+
+        def binary(matrix):
+            return {
+                (u,v): _VALUES[val]
+                for u, row in enumerate(matrix) for v, val in enumerate(row)
+            }
+
+        var = self.var.tolist()
+        reach = self.reach.tolist()
+        return structure.Structure(
+            indiv=indiv,
+            var={key: unary(var[i]) for i, key in enumerate(self.symbols)},
+            reach={key: unary(reach[i]) for i, key in enumerate(self.symbols)},
+            cycle=unary(self.cycle.tolist()),
+            shared=unary(self.shared.tolist()),
+            sm=unary(self.sm.tolist()),
+            n=binary(self.n.tolist()),
+            n_plus=binary(self.n_plus.tolist()),
+            size=dict(enumerate(self.size)),
+            arbitrary_terms_stack=list(self.arbitrary_terms_stack),
+            constr=constr,
+        )
+
+    def update_n_plus(self):
+        self.n_plus = closure.transitive_closure(self.n)
+
+    @property
+    def indiv(self):
+        return range(len(self.sm))
+
+    # Sizes are immutable, the list is enough to copy
+    def copy(self):
+        return ArrayStructure(
+            symbols=self.symbols,
+            var=self.var.copy(),
+            reach=self.reach.copy(),
+            cycle=self.cycle.copy(),
+            shared=self.shared.copy(),
+            sm=self.sm.copy(),
+            n=self.n.copy(),
+            n_plus=self.n_plus.copy(),
+            size=list(self.size),
+            arbitrary_terms_stack=list(self.arbitrary_terms_stack),
+        )
+
+    def __eq__(self, other):
+        if self.get_canonical_map(other, False):
+            return True
+        else:
+            return False
+
+    # Same matching as Structure.get_canonical_map: every individual is
+    # mapped to the first individual of other with the same unary predicates,
+    # summary flag and size symbols, then n has to agree under the mapping
+    def get_canonical_map(self, other, ignore_arbitrary_sizes):
+        if len(self.sm) != len(other.sm):
+            return None
+
+        mine = self._signatures(True)
+        theirs = other._signatures(True)
+        canonical_map = {}
+        for v in self.indiv:
+            candidates = numpy.flatnonzero((theirs == mine[v]).all(axis=1))
+            symbols = linear.free_symbols(self.size[v])
+            u = next(
+                (int(w) for w in candidates if linear.free_symbols(other.size[w]) == symbols),
+                None,
+            )
+            if u is None:
+                return None
+            if not ignore_arbitrary_sizes and not linear.equal(self.size[v], other.size[u]):
+                return None
+            canonical_map[v] = u
+
+        perm = numpy.array([canonical_map[v] for v in self.indiv], dtype=numpy.intp)
+        if not numpy.array_equal(self.n, other.n[numpy.ix_(perm, perm)]):
+            return None
+
+        return canonical_map
+
+    # Same key as Structure.canonical_key, so both kinds share an index
+    def canonical_key(self):
+        var = self.var.T.tolist()
+        reach = self.reach.T.tolist()
+        cycle = self.cycle.tolist()
+        shared = self.shared.tolist()
+        sm = self.sm.tolist()
+        signature = [
+            (
+                tuple(var[v]),
+                tuple(reach[v]),
+                cycle[v],
+                shared[v],
+                sm[v],
+                tuple(sorted(str(sym) for sym in linear.free_symbols(self.size[v]))),
+            )
+            for v in self.indiv
+        ]
+        us, vs = numpy.nonzero(self.n != FALSE)
+        n = self.n.tolist()
+        return (
+            tuple(sorted(signature)),
+            tuple(sorted(
+                (signature[u], signature[v], n[u][v])
+                for u, v in zip(us.tolist(), vs.tolist())
+            )),
+        )
+
+    # One row per individual: its variable, reach, cycle and shared values,
+    # followed by the summary flag if with_sm is set
+    def _signatures(self, with_sm):
+        rows = [self.var, self.reach, self.cycle[None], self.shared[None]]
+        if with_sm:
+            rows.append(self.sm[None])
+        return numpy.vstack(rows).T
+
+    def copy_indiv(self, u):
+        v = len(self.sm)
+        self.var = numpy.concatenate((self.var, self.var[:, u, None]), axis=1)
+        self.reach = numpy.concatenate((self.reach, self.reach[:, u, None]), axis=1)
+        self.cycle = numpy.append(self.cycle, self.cycle[u])
+        self.shared = numpy.append(self.shared, self.shared[u])
+        self.sm = numpy.append(self.sm, self.sm[u])
+        self.size.append(self.size[u])
+        self.n = self._copy_relation(self.n, u)
+        self.n_plus = self._copy_relation(self.n_plus, u)
+        return v
+
+    @staticmethod
+    def _copy_relation(rel, u):
+        k = len(rel)
+        res = numpy.empty((k + 1, k + 1), DTYPE)
+        res[:k, :k] = rel
+        res[k, :k] = rel[u]
+        res[:k, k] = rel[:, u]
+        res[k, k] = rel[u, u]
+        return res
+
+    def _v_concretisize(self, v):
+        self.sm[v] = FALSE
+        self.n[v, v] = FALSE
+        concrete = self.sm == FALSE
+        self.n[v, concrete & (self.n[v] == MAYBE)] = TRUE
+        self.n[concrete & (self.n[:, v] == MAYBE), v] = TRUE
+
+    # Summarize v into u, v itself is left in place for the caller to remove
+    def _v_summarize(self, u, v):
+        self.n[self.n[:, u] != self.n[:, v], u] = MAYBE
+        self.n[u, self.n[u] != self.n[v]] = MAYBE
+        self.sm[u] = MAYBE
+        self.size[u] += self.size[v]
+
+    def _v_embed(self, u, v):
+        self._v_summarize(u, v)
+        self._v_remove(v)
+
+    # Removes a single individual or a sequence of them
+    def _v_remove(self, v):
+        self.var = numpy.delete(self.var, v, axis=1)
+        self.reach = numpy.delete(self.reach, v, axis=1)
+        self.cycle = numpy.delete(self.cycle, v)
+        self.shared = numpy.delete(self.shared, v)
+        self.sm = numpy.delete(self.sm, v)
+        self.n = numpy.delete(numpy.delete(self.n, v, axis=0), v, axis=1)
+        self.n_plus = numpy.delete(numpy.delete(self.n_plus, v, axis=0), v, axis=1)
+        removed = set(numpy.atleast_1d(v).tolist())
+        self.size = [size for w, size in enumerate(self.size) if w not in removed]
+
+    # Embed operation of ShapeState.embed: every individual is summarized
+    # into the first individual with the same unary predicates
+    def embed(self):
+        canonical = self._signatures(False)
+        removed = []
+        for u in self.indiv:
+            if u in removed:
+                continue
+            for v in range(u + 1, len(self.sm)):
+                if v not in removed and numpy.array_equal(canonical[u], canonical[v]):
+                    self._v_summarize(u, v)
+                    removed.append(v)
+        if removed:
+            self._v_remove(removed)
+
+    def __str__(self):
+        return str(self.to_structure(constr=set()))
@@ -0,0 +1,56 @@
+import numpy
+
+from analyzeshape import three_valued_logic
+
+FALSE = three_valued_logic.ThreeValuedBool.FALSE
+TRUE = three_valued_logic.ThreeValuedBool.TRUE
+
+
+# Relational composition over the max-min semiring, a is (p x k) and b is
+# (k x q): res[v, w] = exists u. a[v, u] and b[u, w]
+def product(a, b):
+    return three_valued_logic.array_exists(
+        three_valued_logic.array_and(a[:, :, None], b[None, :, :]),
+        axis=1,
+    )
+
+
+# Transitive closure of a three valued relation over the max-min semiring.
+# This is Warshall's algorithm with every pivot step done on the whole
+# matrix at once; row and column u do not change while u is the pivot, so
+# the vectorized step computes the same values as the nested loops.
+def transitive_closure(rel):
+    res = rel.copy()
+    for u in range(len(res)):
+        numpy.maximum(
+            res,
+            three_valued_logic.array_and(res[:, u, None], res[None, u, :]),
+            out=res,
+        )
+    return res
+
+
+# Closure of rel, where only row r differs from the relation closure was
+# computed for (whose row r was old_row). If the row only gained values, the
+# new paths are those reaching r followed by a path leaving it through the
+# new row. Going around r more than once never raises the minimum, so the
+# paths leaving r are its new successors and the old paths from them.
+# A row that lost values is recomputed from scratch.
+def update_row(closure, rel, r, old_row):
+    row = rel[r]
+    if (row < old_row).any():
+        return transitive_closure(rel)
+
+    leaving = three_valued_logic.array_or(
+        row,
+        three_valued_logic.array_exists(
+            three_valued_logic.array_and(row[:, None], closure),
+            axis=0,
+        ),
+    )
+    reaching = closure[:, r].copy()
+    reaching[r] = TRUE
+    return three_valued_logic.array_or(
+        closure,
+        three_valued_logic.array_and(reaching[:, None], leaving[None, :]),
+    )
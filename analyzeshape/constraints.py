@@ -0,0 +1,180 @@
+import collections
+import dataclasses
+import typing
+
+import numpy
+
+from analyzeshape import closure, linear, three_valued_logic
+
+TRUE = three_valued_logic.ThreeValuedBool.TRUE
+FALSE = three_valued_logic.ThreeValuedBool.FALSE
+MAYBE = three_valued_logic.ThreeValuedBool.MAYBE
+
+_and = three_valued_logic.array_and
+_not = three_valued_logic.array_not
+
+
+# Equality taking summary nodes into account, as Structure._v_eq
+def _eq(st):
+    res = numpy.zeros(st.n.shape, three_valued_logic.ARRAY_DTYPE)
+    numpy.fill_diagonal(res, _not(st.sm))
+    return res
+
+
+def _reach(st):
+    return three_valued_logic.array_or(st.var, closure.product(st.var, st.n_plus))
+
+
+def _shared(st):
+    neq = _not(_eq(st))
+    return three_valued_logic.array_exists(
+        _and(st.n, closure.product(neq, st.n)), axis=0,
+    )
+
+
+def _setter(pred, value):
+    def fix(st, mask):
+        getattr(st, pred)[mask] = value
+        return (pred,)
+    return fix
+
+
+def _fix_sm_not(st, mask):  # mask is only set on the diagonal
+    for v in numpy.flatnonzero(mask.any(axis=1)):
+        st.sm[v] = FALSE
+        st.size[v] = linear.ONE
+    return ('sm',)
+
+
+# Whenever lh is TRUE rh has to hold: a FALSE rh rules the structure out and a
+# MAYBE rh is fixed by fix(st, mask). Both sides are computed for all the
+# individuals (pairs of individuals for binary constraints, variables and
+# individuals for the variable constraints) at once. reads lists the
+# predicates both sides depend on.
+@dataclasses.dataclass(frozen=True)
+class Constraint:
+    name: str
+    reads: typing.FrozenSet[str]
+    lh: typing.Callable
+    rh: typing.Callable
+    fix: typing.Callable
+
+
+CONSTRAINTS = (
+    Constraint(
+        'reach', frozenset({'var', 'n_plus', 'reach'}),
+        _reach, lambda st: st.reach, _setter('reach', TRUE),
+    ),
+    Constraint(
+        'reach-not', frozenset({'var', 'n_plus', 'reach'}),
+        lambda st: _not(_reach(st)), lambda st: _not(st.reach), _setter('reach', FALSE),
+    ),
+    Constraint(
+        'var-not', frozenset({'var', 'sm'}),
+        lambda st: closure.product(st.var, _not(_eq(st))), lambda st: _not(st.var), _setter('var', FALSE),
+    ),
+    Constraint(
+        'sm-var-not', frozenset({'var', 'sm'}),
+        lambda st: three_valued_logic.array_exists(
+            _and(st.var[:, :, None], st.var[:, None, :]), axis=0,
+        ),
+        _eq, _fix_sm_not,
+    ),
+    Constraint(
+        'shared', frozenset({'n', 'sm', 'shared'}),
+        _shared, lambda st: st.shared, _setter('shared', TRUE),
+    ),
+    Constraint(
+        'shared-not', frozenset({'n', 'sm', 'shared'}),
+        lambda st: _not(_shared(st)), lambda st: _not(st.shared), _setter('shared', FALSE),
+    ),
+    Constraint(
+        'cycle', frozenset({'n_plus', 'cycle'}),
+        lambda st: st.n_plus.diagonal(), lambda st: st.cycle, _setter('cycle', TRUE),
+    ),
+    Constraint(
+        'cycle-not', frozenset({'n_plus', 'cycle'}),
+        lambda st: _not(st.n_plus.diagonal()), lambda st: _not(st.cycle), _setter('cycle', FALSE),
+    ),
+    Constraint(
+        'n-not', frozenset({'n', 'sm'}),
+        lambda st: closure.product(st.n, _not(_eq(st))), lambda st: _not(st.n), _setter('n', FALSE),
+    ),
+    Constraint(
+        'n-not-shared', frozenset({'n', 'sm', 'shared'}),
+        lambda st: _and(closure.product(_not(_eq(st)), st.n), _not(st.shared)[None, :]),
+        lambda st: _not(st.n), _setter('n', FALSE),
+    ),
+    Constraint(
+        'sm-not', frozenset({'n', 'sm'}),
+        lambda st: closure.product(st.n.T, st.n), _eq, _fix_sm_not,
+    ),
+    Constraint(
+        'sm-not-shared', frozenset({'n', 'shared', 'sm'}),
+        lambda st: closure.product(_and(st.n, _not(st.shared)[None, :]), st.n.T),
+        _eq, _fix_sm_not,
+    ),
+)
+
+
+# The constraints of structures over a set of variables, built once and
+# shared by all of them. Works on ArrayStructures, whose variable rows are
+# laid out in the order of symbols.
+class ConstraintSet:
+    _SETS = {}
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.constraints = CONSTRAINTS
+        self.readers = collections.defaultdict(list)
+        for i, constraint in enumerate(self.constraints):
+            for pred in constraint.reads:
+                self.readers[pred].append(i)
+
+    @classmethod
+    def for_symbols(cls, symbols):
+        key = tuple(sorted(symbols))
+        try:
+            return cls._SETS[key]
+        except KeyError:
+            return cls._SETS.setdefault(key, cls(key))
+
+    # Pickled by its symbols, unpickling yields the shared set of the
+    # receiving process
+    def __reduce__(self):
+        return ConstraintSet.for_symbols, (self.symbols,)
+
+    def __iter__(self):
+        return iter(self.constraints)
+
+    def __len__(self):
+        return len(self.constraints)
+
+    # Fixes st in place until every constraint holds, a constraint is checked
+    # again only once a predicate it reads was fixed. n_plus is taken as is,
+    # it is not updated for fixes of n. Returns False if st violates a
+    # constraint.
+    def coerce(self, st):
+        pending = collections.deque(range(len(self.constraints)))
+        queued = set(pending)
+        while pending:
+            i = pending.popleft()
+            queued.remove(i)
+            constraint = self.constraints[i]
+
+            holds = constraint.lh(st) == TRUE
+            if not holds.any():
+                continue
+            rh = constraint.rh(st)
+            if (holds & (rh == FALSE)).any():
+                return False
+            mask = holds & (rh == MAYBE)
+            if not mask.any():
+                continue
+
+            for pred in constraint.fix(st, mask):
+                for j in self.readers[pred]:
+                    if j not in queued:
+                        queued.add(j)
+                        pending.append(j)
+        return True
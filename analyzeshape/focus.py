@@ -0,0 +1,71 @@
+import collections
+import dataclasses
+import logging
+
+from analyzeshape import structure
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class FocusStats:
+    calls: int = 0
+    generated: int = 0
+    duplicates: int = 0
+    pruned: int = 0
+
+    def __str__(self):
+        return (
+            f'{self.calls} calls, {self.generated} structures generated, '
+            f'{self.duplicates} duplicates, {self.pruned} pruned'
+        )
+
+
+# Totals over all focus operations of the current run, see reset_stats
+STATS = FocusStats()
+
+
+# Starts the totals of a new run, returns those of the previous one
+def reset_stats():
+    global STATS
+    stats, STATS = STATS, FocusStats()
+    return stats
+
+
+# Expands structures until refine has nothing left to focus on. refine(st)
+# returns None if st is focused, otherwise the structures it splits st into,
+# which are expanded in turn. A refinement equal to one generated before is
+# dropped, its own refinements come from that one. A refinement violating a
+# constraint is not expanded any further, since coerce would discard all of
+# its refinements. The focused structures are left to post_transform to
+# coerce.
+def focus(structures, refine):
+    stats = FocusStats(calls=1)
+    index = structure.StructureIndex()
+    # Only the generated structures are checked, the ones passed in were
+    # coerced or focused before
+    workset = collections.deque((st, True) for st in structures)
+    answerset = []
+    while workset:
+        st, feasible = workset.popleft()
+        refinements = refine(st)
+        if refinements is None:
+            answerset.append(st)
+            continue
+        if not feasible and not st.feasible():
+            stats.pruned += 1
+            continue
+
+        for new_st in refinements:
+            stats.generated += 1
+            key = new_st.canonical_key()
+            if index.contains(new_st, key):
+                stats.duplicates += 1
+                continue
+            index.add(new_st, key)
+            workset.append((new_st, False))
+
+    LOG.debug('Focus: %s', stats)
+    for field in dataclasses.fields(FocusStats):
+        setattr(STATS, field.name, getattr(STATS, field.name) + getattr(stats, field.name))
+    return answerset
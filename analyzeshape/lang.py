@@ -1,8 +1,10 @@
 import dataclasses
 import typing
 
-from pysmt import shortcuts
 from analyzeframework import lang
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
 
 
 
@@ -0,0 +1,252 @@
+import dataclasses
+import fractions
+import functools
+import math
+import numbers
+import typing
+
+from analyzeframework import lang
+
+# Arbitrary terms of loops left through a permanent (assume TRUE) or a
+# temporary (any other assume) edge, see cfg.Edge.arbitrary_term
+PERMANENT = 'P'
+TEMPORARY = 'T'
+
+
+def _lift(value):
+    if isinstance(value, Linear):
+        return value
+    elif isinstance(value, numbers.Rational):
+        return Linear(value)
+    elif isinstance(value, lang.Symbol):
+        return Linear.symbol(value)
+    return None
+
+
+def _div(a, b):
+    res = fractions.Fraction(a, b)
+    return res.numerator if res.denominator == 1 else res
+
+
+# Linear polynomial over the arbitrary terms, the sizes of the individuals.
+# Coefficients are ints, and Fractions once solving for a term divides them.
+# terms holds the non-zero coefficients sorted by symbol, so equal polynomials
+# have equal fields. Anything that is not linear, like the product of two
+# non-constant polynomials, is handed over to sympy.
+@dataclasses.dataclass(frozen=True, eq=False)
+class Linear:
+    const: numbers.Rational = 0
+    terms: typing.Tuple[typing.Tuple[lang.Symbol, numbers.Rational], ...] = ()
+
+    @classmethod
+    def of(cls, const, coefficients):
+        return cls(
+            const,
+            tuple(sorted((sym, c) for sym, c in coefficients.items() if c)),
+        )
+
+    @classmethod
+    def symbol(cls, sym):
+        return cls(0, ((sym, 1),))
+
+    @property
+    def free_symbols(self):
+        return frozenset(sym for sym, _ in self.terms)
+
+    def is_constant(self):
+        return not self.terms
+
+    def coefficient(self, sym):
+        return dict(self.terms).get(sym, 0)
+
+    def _scale(self, factor):
+        return Linear.of(
+            self.const * factor,
+            {sym: c * factor for sym, c in self.terms},
+        )
+
+    def __add__(self, other):
+        lifted = _lift(other)
+        if lifted is None:
+            return self._sympy_() + other
+
+        coefficients = dict(self.terms)
+        for sym, c in lifted.terms:
+            coefficients[sym] = coefficients.get(sym, 0) + c
+        return Linear.of(self.const + lifted.const, coefficients)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self._scale(-1)
+
+    def __sub__(self, other):
+        return self + -other
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        lifted = _lift(other)
+        if lifted is None:
+            return self._sympy_() * other
+        elif lifted.is_constant():
+            return self._scale(lifted.const)
+        elif self.is_constant():
+            return lifted._scale(self.const)
+        return self._sympy_() * lifted._sympy_()
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if isinstance(other, Linear):
+            return self.const == other.const and self.terms == other.terms
+        elif isinstance(other, numbers.Rational):
+            return not self.terms and self.const == other
+        elif hasattr(other, 'free_symbols'):
+            import sympy
+            return sympy.expand(self._sympy_() - other) == 0
+        return NotImplemented
+
+    # Constants hash as the ints they are equal to
+    def __hash__(self):
+        if not self.terms:
+            return hash(self.const)
+        return hash((self.const, self.terms))
+
+    def subs(self, sym, value):
+        coeff = self.coefficient(sym)
+        if not coeff:
+            return self
+        return self - coeff * Linear.symbol(sym) + coeff * value
+
+    # Value of sym that makes the polynomial zero, None if sym does not occur
+    def solve(self, sym):
+        coeff = self.coefficient(sym)
+        if not coeff:
+            return None
+        rest = self - coeff * Linear.symbol(sym)
+        return Linear.of(
+            _div(-rest.const, coeff),
+            {s: _div(-c, coeff) for s, c in rest.terms},
+        )
+
+    # Sign of the size as the arbitrary terms grow: it turns negative if a
+    # permanent term has a negative coefficient. Temporary terms only decide
+    # when there are no permanent ones, and the constant when there are no
+    # terms at all.
+    def is_negative(self):
+        for prefix in (PERMANENT, TEMPORARY):
+            coefficients = [c for sym, c in self.terms if sym.name.startswith(prefix)]
+            if coefficients:
+                return any(c < 0 for c in coefficients)
+        return self.const < 0
+
+    # Even for every value of the arbitrary terms: all coefficients are even
+    # integers
+    def is_even(self):
+        coefficients = [self.const, *(c for _, c in self.terms)]
+        if any(isinstance(c, fractions.Fraction) for c in coefficients):
+            return False
+        content = functools.reduce(math.gcd, coefficients)
+        return content != 0 and content % 2 == 0
+
+    def _sympy_(self):
+        import sympy
+        return sympy.Rational(self.const) + sum(
+            sympy.Rational(c) * sympy.Symbol(sym.name, positive=True)
+            for sym, c in self.terms
+        )
+
+    def __str__(self):
+        parts = [
+            f'{"-" if c < 0 else "+"} {"" if abs(c) == 1 else f"{abs(c)}*"}{sym}'
+            for sym, c in self.terms
+        ]
+        if self.const or not parts:
+            parts.append(f'{"-" if self.const < 0 else "+"} {abs(self.const)}')
+        res = ' '.join(parts)
+        return res[2:] if res.startswith('+') else '-' + res[2:]
+
+
+ONE = Linear(1)
+
+
+def _sympy_symbol(sym):
+    import sympy
+    return sympy.Symbol(sym.name, positive=True)
+
+
+# Sizes are Linear unless non-linear arithmetic fell back to sympy, the
+# helpers below take both
+
+def free_symbols(size):
+    if isinstance(size, Linear):
+        return size.free_symbols
+    return frozenset(lang.Symbol(str(sym)) for sym in size.free_symbols)
+
+
+def equal(a, b):
+    if isinstance(a, Linear):
+        return a == b
+    elif isinstance(b, Linear):
+        return b == a
+    import sympy
+    return sympy.expand(a - b) == 0
+
+
+def subs(size, sym, value):
+    if isinstance(size, Linear):
+        return size.subs(sym, value)
+    return size.subs(_sympy_symbol(sym), value)
+
+
+def solve(size, sym):
+    if isinstance(size, Linear):
+        return size.solve(sym)
+    import sympy
+    (res,) = sympy.solveset(size, _sympy_symbol(sym))
+    return res
+
+
+def is_negative(size):
+    if isinstance(size, Linear):
+        return size.is_negative()
+
+    import sympy
+    factored = sympy.factor(size)
+
+    if not factored.args:
+        return size < 0
+
+    for farg in factored.args:
+        perm_symbols = {sym for sym in farg.free_symbols if str(sym).startswith(PERMANENT)}
+        temp_symbols = {sym for sym in size.free_symbols if str(sym).startswith(TEMPORARY)}
+        if perm_symbols:
+            for arg in farg.args:
+                if perm_symbols.intersection(arg.free_symbols):
+                    expr = arg
+                    for sym in arg.free_symbols:
+                        expr = arg.subs(sym, 1)
+                    if expr < 0:
+                        return True
+        elif temp_symbols:
+            for arg in farg.args:
+                if temp_symbols.intersection(arg.free_symbols):
+                    expr = arg
+                    for sym in arg.free_symbols:
+                        expr = arg.subs(sym, 1)
+                    if expr < 0:
+                        return True
+        else:
+            if farg < 0:
+                return True
+
+
+def is_even(size):
+    if isinstance(size, Linear):
+        return size.is_even()
+
+    import sympy
+    factors = sympy.factor_list(size)
+    return any(factor for factor in factors if isinstance(factor, sympy.Integer) and factor % 2 == 0)
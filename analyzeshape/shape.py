@@ -5,14 +5,15 @@ import typing
 import copy
 import collections
 
-from pysmt import shortcuts
-
 from analyzeshape import lang as lang_shape, three_valued_logic
 from analyzeframework import abstract
 from analyzeframework import lang
+from analyzeframework import lazy
+from analyzeshape import focus
+from analyzeshape import linear
 from analyzeshape import structure
 
-from sympy import *
+shortcuts = lazy.module('pysmt.shortcuts')
 
 
 LOG = logging.getLogger(__name__)
@@ -34,75 +35,81 @@ def transforms(stmt_type):
 class ShapeState(abstract.AbstractState):
     structures: typing.List[structure.Structure]
 
+    COW_FIELDS = ('structures',)
+
+    def copy_field(self, field, value):
+        return [st.copy() for st in value]
+
     def focus(self, var):
-        workset = self.structures
-        answerset = []
-        while workset:
-            st = workset.pop(0)
+        def refine(st):
             u = next((u for u in st.indiv if st.var[var][u] == MAYBE), None)
             if u is None:
-                answerset.append(st)
-            else:
-                st0 = st.copy()
-                st0.var[var][u] = TRUE
-                workset.append(st0)
-                st1 = st.copy()
-                st1.var[var][u] = FALSE
-                workset.append(st1)
-                if st.sm[u] == MAYBE:
-                    st2 = st.copy()
-                    v = st2.copy_indiv(u)
-                    st2.var[var][u] = TRUE
-                    st2.var[var][v] = FALSE
-                    workset.append(st2)
-        self.structures = answerset
+                return None
+            st0 = st.copy()
+            st0.var[var][u] = TRUE
+            st1 = st.copy()
+            st1.var[var][u] = FALSE
+            if st.sm[u] != MAYBE:
+                return [st0, st1]
+            st2 = st.copy()
+            v = st2.copy_indiv(u)
+            st2.var[var][u] = TRUE
+            st2.var[var][v] = FALSE
+            return [st0, st1, st2]
+
+        self.structures = focus.focus(self.structures, refine)
 
     def focus_var_deref(self, var):
-        workset = self.structures
-        answerset = []
-        while workset:
-            st = workset.pop(0)
+        def refine(st):
             res = next(((v,u) for u in st.indiv for v in st.indiv if\
                 st.var[var][v] == TRUE and st.n[(v,u)] == MAYBE), None)
             if res is None:
-                answerset.append(st)
-            else:
-                (v,u) = res
-                st0 = st.copy()
-                st0.n[(v,u)] = TRUE
-                workset.append(st0)
-                st1 = st.copy()
-                st1.n[(v,u)] = FALSE
-                workset.append(st1)
-                if st.sm[u] == MAYBE:
-                    st2 = st.copy()
-                    w = st2.copy_indiv(u)
-                    st2.n[(v,u)] = TRUE
-                    st2.n[(v,w)] = FALSE
-                    workset.append(st2)
-        self.structures = answerset
+                return None
+            (v,u) = res
+            st0 = st.copy()
+            st0.n[(v,u)] = TRUE
+            st1 = st.copy()
+            st1.n[(v,u)] = FALSE
+            if st.sm[u] != MAYBE:
+                return [st0, st1]
+            st2 = st.copy()
+            w = st2.copy_indiv(u)
+            st2.n[(v,u)] = TRUE
+            st2.n[(v,w)] = FALSE
+            return [st0, st1, st2]
+
+        self.structures = focus.focus(self.structures, refine)
 
 
     def join(self, other, arbitrary_term):
+        return self.join_changed(other, arbitrary_term)[0]
+
+    # The join only ever appends to the structures of self
+    def join_changed(self, other, arbitrary_term):
 
         structures = [st for st in self.structures]
+        other.mutable('structures')
         other.embed()
 
         # If we are at an assume node we have an arbitrary value, so we ignore the sizes of the summary nodes
         # while comparing, so that we can factor the size with the arbitrary value
         # Otherwise we compare normally, taking sizes into account
         if arbitrary_term is None:
+            index = structure.StructureIndex(self.structures)
             for st in other.structures:
-                if st not in self.structures:
+                if st not in index:
                     structures.append(st)
         else:
+            index = structure.StructureIndex(structures)
             for st in other.structures:
 
-                next_st, canonical_map = st.get_matching_structure(structures)
+                key = st.canonical_key()
+                next_st, canonical_map = index.match(st, key)
 
                 # New structure, add to list of structures
                 if not canonical_map:
                     structures.append(st)
+                    index.add(st, key)
                 else:
                     summary_nodes = [v for v in canonical_map if next_st.sm[v] == MAYBE]
                     # Adding arbitraray term only once
@@ -110,15 +117,26 @@ class ShapeState(abstract.AbstractState):
                         add = False
                         next_st_copy = next_st.copy()
                         for v in summary_nodes:
-                            if expand(st.size[canonical_map[v]]) != expand(next_st_copy.size[v]):
+                            if not linear.equal(st.size[canonical_map[v]], next_st_copy.size[v]):
                                 next_st_copy.size[v] += arbitrary_term * (st.size[canonical_map[v]] - next_st_copy.size[v])
                                 add = True
 
-                        if add and next_st_copy not in structures:
+                        copy_key = next_st_copy.canonical_key()
+                        if add and not index.contains(next_st_copy, copy_key):
                             next_st_copy.arbitrary_terms_stack.append(arbitrary_term)
                             structures.append(next_st_copy)
+                            index.add(next_st_copy, copy_key)
+
+        return ShapeState(structures), len(structures) != len(self.structures)
+
+    def leq(self, other):
+        index = structure.StructureIndex(other.structures)
+        return all(st in index for st in self.structures)
 
-        return ShapeState(structures)
+    # post_transform only drops structures the join added, so the number of
+    # structures tells joined states apart
+    def fingerprint(self):
+        return len(self.structures)
 
 
     # Embed operation from paper where we look for summarizable nodes
@@ -133,6 +151,12 @@ class ShapeState(abstract.AbstractState):
     def __str__(self):
         return f'{len(self.structures)} structure(s)'
 
+    def metrics(self):
+        return {
+            'structures': len(self.structures),
+            'individuals': sum(len(st.indiv) for st in self.structures),
+        }
+
 
     def full_str(self):
         res = []
@@ -153,16 +177,42 @@ class ShapeState(abstract.AbstractState):
         formulas = [st.formula() for st in self.structures]
         return shortcuts.Or(*formulas)
 
+    # Structures are never changed once in a node's state, an edge keeps the
+    # ones it carried by identity
+    def delta(self, sent):
+        if sent is None:
+            return self, {id(st): st for st in self.structures}
+        new = [st for st in self.structures if id(st) not in sent]
+        if not new:
+            return None, sent
+        for st in new:
+            sent[id(st)] = st
+        return ShapeState(new), sent
+
     def post_transform(self):
+        # Structures still shared with the copied state were coerced already
+        if self.is_shared('structures'):
+            return
+
         new_structures = []
         for st in self.structures:
-            if st.coerce():
+            # So were the interned ones, which come from node states
+            if st.is_interned() or st.coerce():
                 new_structures.append(st)
         self.structures = new_structures
 
+    # States share their interned structures
+    def interned(self):
+        self.structures = [st.interned() for st in self.structures]
+        return super().interned()
+
+    def intern_key(self):
+        return hash(tuple(st.intern_key() for st in self.structures))
+
 
 @ShapeState.transforms(lang_shape.VarVarAssignment)
 def var_var_assignment(state, statement):
+    state.mutable('structures')
 
     lval = statement.lval
     rval = statement.rval
@@ -177,6 +227,7 @@ def var_var_assignment(state, statement):
 
 @ShapeState.transforms(lang_shape.VarNewAssignment)
 def var_new_assignment(state, statement):
+    state.mutable('structures')
 
     lval = statement.lval
 
@@ -199,13 +250,14 @@ def var_new_assignment(state, statement):
         st.cycle[v] = FALSE
         st.shared[v] = FALSE
         st.sm[v] = FALSE
-        st.size[v] = Integer(1)
+        st.size[v] = linear.ONE
 
         st.indiv.append(v)
 
 
 @ShapeState.transforms(lang_shape.VarNextAssignment)
 def var_next_assignment(state, statement):
+    state.mutable('structures')
     
     lval = statement.lval
     rval = statement.rval
@@ -237,6 +289,7 @@ def var_next_assignment(state, statement):
 
 @ShapeState.transforms(lang_shape.VarNullAssignment)
 def var_null_assignment(state, statement):
+    state.mutable('structures')
 
     lval = statement.lval
 
@@ -248,6 +301,7 @@ def var_null_assignment(state, statement):
 
 @ShapeState.transforms(lang_shape.NextVarAssignment)
 def next_var_assignment(state, statement):
+    state.mutable('structures')
     
     lval = statement.lval
     rval = statement.rval
@@ -324,6 +378,7 @@ def next_var_assignment(state, statement):
 
 @ShapeState.transforms(lang_shape.NextNullAssignment)
 def next_null_assignment(state, statement):
+    state.mutable('structures')
 
     lval = statement.lval
     state.focus(lval)
@@ -427,9 +482,12 @@ def assume(state, statement):
     expr = statement.expr
     if isinstance(expr, lang.Falsehood):
         state.structures = []
+        return
     elif isinstance(expr, lang.Truth):
-        pass
-    elif isinstance(expr, lang_shape.EqualsVarVar):
+        return
+
+    state.mutable('structures')
+    if isinstance(expr, lang_shape.EqualsVarVar):
 
         lval = expr.lval
         rval = expr.rval
@@ -6,10 +6,13 @@ import types
 import itertools
 import collections
 
-from pysmt import shortcuts
-from analyzeshape import lang as lang_shape, three_valued_logic
+import numpy
+from analyzeshape import array_structure, closure, constraints, lang as lang_shape, linear, three_valued_logic
+from analyzeframework import interning
 from analyzeframework import lang
-from sympy import *
+from analyzeframework import lazy
+
+shortcuts = lazy.module('pysmt.shortcuts')
 
 LOG = logging.getLogger(__name__)
 
@@ -18,40 +21,39 @@ TRUE = three_valued_logic.ThreeValuedBool.TRUE
 FALSE = three_valued_logic.ThreeValuedBool.FALSE
 MAYBE = three_valued_logic.ThreeValuedBool.MAYBE
 
+_VALUES = (FALSE, MAYBE, TRUE)
 
-def is_negative(size):
-
-    factored = factor(size)
-
-    if not factored.args:
-        return size < 0
-
-    for farg in factored.args:
-        perm_symbols = {sym for sym in farg.free_symbols if str(sym).startswith('P')}
-        temp_symbols = {sym for sym in size.free_symbols if str(sym).startswith('T')}
-        if perm_symbols:
-            for arg in farg.args:
-                if perm_symbols.intersection(arg.free_symbols):
-                    expr = arg
-                    for sym in arg.free_symbols:
-                        expr = arg.subs(sym, 1)
-                    if expr < 0:
-                        return True
-        elif temp_symbols:
-            for arg in farg.args:
-                if temp_symbols.intersection(arg.free_symbols):
-                    expr = arg
-                    for sym in arg.free_symbols:
-                        expr = arg.subs(sym, 1)
-                    if expr < 0:
-                        return True
-        else:
-            if farg < 0:
-                return True
 
-def is_even(size):
-    factors = factor_list(size)
-    return any(factor for factor in factors if isinstance(factor, Integer) and factor % 2 == 0)
+# Structures of node states, by their exact contents
+STRUCTURES = interning.Table()
+
+
+# Structures bucketed by their canonical key, membership and matching only
+# compare a structure against the candidates in its own bucket
+class StructureIndex:
+    def __init__(self, structures=()):
+        self._buckets = collections.defaultdict(list)
+        for st in structures:
+            self.add(st)
+
+    def add(self, st, key=None):
+        if key is None:
+            key = st.canonical_key()
+        self._buckets[key].append(st)
+
+    def candidates(self, st, key=None):
+        if key is None:
+            key = st.canonical_key()
+        return self._buckets.get(key, ())
+
+    def contains(self, st, key=None):
+        return any(candidate == st for candidate in self.candidates(st, key))
+
+    def __contains__(self, st):
+        return self.contains(st)
+
+    def match(self, st, key=None):
+        return st.get_matching_structure(self.candidates(st, key))
 
 
 @dataclasses.dataclass
@@ -64,25 +66,92 @@ class Structure:
     sm: typing.Mapping[int, three_valued_logic.ThreeValuedBool]
     n: typing.Mapping[typing.Tuple[int, int], three_valued_logic.ThreeValuedBool]
     n_plus: typing.Mapping[typing.Tuple[int, int], three_valued_logic.ThreeValuedBool]
-    size: typing.Mapping[int, Expr]
-    arbitrary_terms_stack: typing.List[Symbol]
+    size: typing.Mapping[int, linear.Linear]
+    arbitrary_terms_stack: typing.List[lang.Symbol]
+
+    constr: 'constraints.ConstraintSet'
+
+    # Individuals, n and n_plus as arrays from the last update_n_plus, the
+    # arrays are never written to so copies share them
+    _closure: typing.Tuple = dataclasses.field(
+        default=None, compare=False, repr=False,
+    )
+    # Set once the structure is in STRUCTURES, it is never changed again
+    _interned: bool = dataclasses.field(
+        default=False, compare=False, repr=False,
+    )
+    # intern_key of an interned structure
+    _key: int = dataclasses.field(
+        default=None, compare=False, repr=False,
+    )
+
+    # Predicate values and sizes are immutable so copying the maps is enough,
+    # the constraints only refer to the structure they are applied to
+    def copy(self):
+        return Structure(
+            indiv=list(self.indiv),
+            var={key: dict(val) for key, val in self.var.items()},
+            reach={key: dict(val) for key, val in self.reach.items()},
+            cycle=dict(self.cycle),
+            shared=dict(self.shared),
+            sm=dict(self.sm),
+            n=dict(self.n),
+            n_plus=dict(self.n_plus),
+            size=dict(self.size),
+            arbitrary_terms_stack=list(self.arbitrary_terms_stack),
+            constr=self.constr,
+            _closure=self._closure,
+        )
 
-    constr: typing.Set[typing.Tuple[int, callable, callable, callable]]
 
-    def copy(self):
-        newst = Structure.initial(self.var.keys())
-        newst.indiv = copy.deepcopy(self.indiv)
-        for var in self.var:
-            newst.var[var] = copy.deepcopy(self.var[var])
-            newst.reach[var] = copy.deepcopy(self.reach[var])
-        newst.cycle = copy.deepcopy(self.cycle)
-        newst.shared = copy.deepcopy(self.shared)
-        newst.sm = copy.deepcopy(self.sm)
-        newst.n = copy.deepcopy(self.n)
-        newst.size = copy.deepcopy(self.size)
-        newst.arbitrary_terms_stack = copy.deepcopy(self.arbitrary_terms_stack)
-        return newst
+    # Digest of the exact contents, individual labels included
+    def intern_key(self):
+        if self._key is not None:
+            return self._key
+        return hash((
+            tuple(self.indiv),
+            frozenset((key, frozenset(val.items())) for key, val in self.var.items()),
+            frozenset((key, frozenset(val.items())) for key, val in self.reach.items()),
+            frozenset(self.cycle.items()),
+            frozenset(self.shared.items()),
+            frozenset(self.sm.items()),
+            frozenset(self.n.items()),
+            frozenset(self.n_plus.items()),
+            frozenset(self.size.items()),
+            tuple(self.arbitrary_terms_stack),
+            self.constr,
+        ))
+
+    # Unlike __eq__, which holds for isomorphic structures
+    def same_contents(self, other):
+        return (
+            self.indiv == other.indiv
+            and self.var == other.var
+            and self.reach == other.reach
+            and self.cycle == other.cycle
+            and self.shared == other.shared
+            and self.sm == other.sm
+            and self.n == other.n
+            and self.n_plus == other.n_plus
+            and self.size == other.size
+            and self.arbitrary_terms_stack == other.arbitrary_terms_stack
+            and self.constr is other.constr
+        )
 
+    # The structure stored once for all structures of the same contents. It
+    # is marked interned even if a digest collision left it out of the
+    # table, either way it is coerced and never changed again.
+    def interned(self):
+        if self._interned:
+            return self
+        key = self.intern_key()
+        res = STRUCTURES.intern(key, self, Structure.same_contents)
+        res._interned = True
+        res._key = key
+        return res
+
+    def is_interned(self):
+        return self._interned
 
     def get_matching_structure(self, structures):
         for st in structures:
@@ -92,10 +161,39 @@ class Structure:
         return None, None
 
 
+    # Isomorphism invariant made of the sorted unary signatures of the
+    # individuals and the sorted n relation between signatures. Structures
+    # matched by get_canonical_map share the key as long as their individuals
+    # have distinct signatures, which is what embed establishes. Exact sizes
+    # are left out so the same key serves both matching and equality.
+    def canonical_key(self):
+        signature = {v: self._v_signature(v) for v in self.indiv}
+        return (
+            tuple(sorted(signature.values())),
+            tuple(sorted(
+                (signature[u], signature[v], self.n[(u,v)])
+                for u in self.indiv for v in self.indiv
+                if self.n[(u,v)] != FALSE
+            )),
+        )
+
+    def _v_signature(self, v):
+        return (
+            tuple(self.var[key][v] for key in sorted(self.var)),
+            tuple(self.reach[key][v] for key in sorted(self.reach)),
+            self.cycle[v],
+            self.shared[v],
+            self.sm[v],
+            tuple(sorted(str(sym) for sym in linear.free_symbols(self.size[v]))),
+        )
+
+
     # Equality should be agnostic to the label assigned to each individual, which means this is the graph isomporphism problem
     # This is the efficient version from the paper, that compares canonical representations of an individual
     def __eq__(self, other):
 
+        if self is other:
+            return True
         if self.get_canonical_map(other, False):
             return True
         else:
@@ -114,12 +212,12 @@ class Structure:
         for v in self.indiv:
 
             u = next((w for w in other.indiv if self._v_canonical_eq(v, other, w) and self.sm[v] == other.sm[w] and \
-                self.size[v].free_symbols == other.size[w].free_symbols), None)
+                linear.free_symbols(self.size[v]) == linear.free_symbols(other.size[w])), None)
 
             if u is not None:
                 if ignore_arbitrary_sizes:
                     canonical_map[v] = u
-                elif expand(self.size[v]) == expand(other.size[u]):
+                elif linear.equal(self.size[v], other.size[u]):
                     canonical_map[v] = u
                 else:
                     return None
@@ -137,113 +235,7 @@ class Structure:
 
     @classmethod
     def init_constr(cls, symbols):
-
-        constr = set()
-
-        # Coerce fixing functions
-        def fix_shared(st,v):
-            st.shared[v] = TRUE
-        def fix_shared_not(st,v):
-            st.shared[v] = FALSE
-        def fix_cycle(st,v):
-            st.cycle[v] = TRUE
-        def fix_cycle_not(st,v):
-            st.cycle[v] = FALSE
-        def fix_n_not(st,v1,v2):
-            st.n[(v1,v2)] = FALSE
-        def fix_sm_not(st,v1,v2): # v1=v2 if this function is called
-            st.sm[v1] = FALSE
-            st.size[v1] = Integer(1)
-
-        def get_reach_lh(var):
-            def reach_lh(st,v):
-                return st._v_reach(var,v)
-            return reach_lh
-
-        def get_reach_rh(var):
-            def reach_rh(st,v):
-                return st.reach[var][v]
-            return reach_rh
-
-        def get_reach_fix(var):
-            def reach_fix(st,v):
-                st.reach[var][v] = TRUE
-            return reach_fix
-
-        def get_reach_not_lh(var):
-            def reach_not_lh(st,v):
-                return st._v_reach(var,v)._not()
-            return reach_not_lh
-
-        def get_reach_not_rh(var):
-            def reach_not_rh(st,v):
-                return st.reach[var][v]._not()
-            return reach_not_rh
-
-        def get_reach_not_fix(var):
-            def reach_not_fix(st,v):
-                st.reach[var][v] = FALSE
-            return reach_not_fix
-
-        def get_var_not_lh(var):
-            def var_not_lh(st,v):
-                return st._v_not_var(var,v)
-            return var_not_lh
-
-        def get_var_not_rh(var):
-            def var_not_rh(st,v):
-                return st.var[var][v]._not()
-            return var_not_rh
-
-        def get_var_not_fix(var):
-            def var_not_fix(st,v):
-                st.var[var][v] = FALSE
-            return var_not_fix
-
-        def get_sm_not_lh(var):
-            def sm_not_lh(st,v1,v2):
-                return st._v_both_var(var,v1,v2)
-            return sm_not_lh
-
-        for var in symbols:
-
-            constr.add((f'reach-{var}', 1, 
-                get_reach_lh(var), get_reach_rh(var), get_reach_fix(var)))
-
-            constr.add((f'reach-{var}-not', 1, 
-                get_reach_not_lh(var), get_reach_not_rh(var), get_reach_not_fix(var)))
-
-            constr.add((f'var-{var}-not', 1, 
-                get_var_not_lh(var), get_var_not_rh(var), get_var_not_fix(var)))
-
-            constr.add((f'sm-{var}-not', 2, 
-                get_sm_not_lh(var), lambda st,v1,v2: st._v_eq(v1,v2), fix_sm_not))
-
-        constr.add(('shared', 1, 
-            lambda st,v: st._v_shared(v), lambda st,v: st.shared[v], fix_shared))
-
-        constr.add(('shared-not', 1, 
-            lambda st,v: st._v_shared(v)._not(), lambda st,v: st.shared[v]._not(), fix_shared_not))
-
-        constr.add(('cycle', 1, 
-            lambda st,v: st._v_cycle(v), lambda st,v: st.cycle[v], fix_cycle))
-
-        constr.add(('cycle-not', 1, 
-            lambda st,v: st._v_cycle(v)._not(), lambda st,v: st.cycle[v]._not(), fix_cycle_not))
-
-        constr.add(('n-not', 2, 
-            lambda st,v1,v2: st._v_not_n(v1,v2), lambda st,v1,v2: st.n[(v1,v2)]._not(), fix_n_not))
-
-        constr.add(('n-not-shared', 2, 
-            lambda st,v1,v2: st._v_not_n_hs(v1,v2), lambda st,v1,v2: st.n[(v1,v2)]._not(), fix_n_not))
-
-        constr.add(('sm-not', 2, 
-            lambda st,v1,v2: st._v_both_n(v1,v2), lambda st,v1,v2: st._v_eq(v1,v2), fix_sm_not))
-        
-        constr.add(('sm-not-shared', 2, 
-            lambda st,v1,v2: st._v_both_n_hs(v1,v2), lambda st,v1,v2: st._v_eq(v1,v2), fix_sm_not))
-
-        return constr
+        return constraints.ConstraintSet.for_symbols(symbols)
 
 
     def __str__(self):
@@ -362,24 +354,6 @@ class Structure:
     def _v_cycle(self, v):
         return self.n_plus[(v,v)]
 
-    def _v_not_var(self, var, v):
-        return self._exists(lambda u : self.var[var][u]._and(self._v_eq(v, u)._not()))
-
-    def _v_not_n(self, v1, v2):
-        return self._exists(lambda u : self.n[(v1,u)]._and(self._v_eq(u, v2)._not()))
-
-    def _v_not_n_hs(self, v1, v2):
-        return self._exists(lambda u : self.n[(u,v2)]._and(self._v_eq(u, v1)._not())._and(self.shared[v2]._not()))
-
-    def _v_both_n(self, v1, v2):
-        return self._exists(lambda u : self.n[(u,v1)]._and(self.n[(u,v2)]))
-
-    def _v_both_n_hs(self, v1, v2):
-        return self._exists(lambda u : self.n[(v1,u)]._and(self.n[(v2,u)])._and(self.shared[u]._not()))
-
-    def _v_both_var(self, var, v1, v2):
-        return self.var[var][v1]._and(self.var[var][v2])
-
     def _var_not_null(self, var1):
         return self._exists(lambda u : self.var[var1][u])
 
@@ -404,14 +378,14 @@ class Structure:
         v2 = self._var_get_indiv(var2)
 
         if v1 is None or v2 is None:
-            return Integer(-1)
+            return linear.Linear(-1)
 
         size = self.size[v1]
         v = v1
         while v != v2:
             v = next((w for w in self.indiv if self.n[(v,w)] != FALSE and v != w), None)
             if v is None:
-                return Integer(-1)
+                return linear.Linear(-1)
             size += self.size[v]
 
         return size
@@ -420,13 +394,39 @@ class Structure:
         return next((u for u in self.indiv if self.var[var][u] != FALSE), None)
 
 
-    # Transitive closure of n
     def update_n_plus(self):
-        self.n_plus = copy.deepcopy(self.n)
-        for u in self.indiv:
-            for v in self.indiv:
-                for w in self.indiv:
-                    self.n_plus[(v,w)] = self.n_plus[(v,w)]._or(self.n_plus[(v,u)]._and(self.n_plus[(u,w)]))
+        indiv, _, res = self._n_closure()
+        values = res.tolist()
+        self.n_plus = {
+            (u,v): _VALUES[values[i][j]]
+            for i, u in enumerate(indiv) for j, v in enumerate(indiv)
+        }
+
+    # Transitive closure of n as an array, n_plus is left as is. If n differs
+    # in a single row from the relation of the last closure, as after a field
+    # assignment, the previous closure is updated rather than recomputed.
+    def _n_closure(self):
+        indiv = tuple(self.indiv)
+        rel = numpy.array(
+            [[self.n[(u,v)] for v in indiv] for u in indiv],
+            three_valued_logic.ARRAY_DTYPE,
+        ).reshape(len(indiv), len(indiv))
+
+        if self._closure is not None and self._closure[0] == indiv:
+            _, old_rel, old_closure = self._closure
+            changed = numpy.flatnonzero((rel != old_rel).any(axis=1))
+            if not changed.size:
+                res = old_closure
+            elif changed.size == 1:
+                r = changed[0]
+                res = closure.update_row(old_closure, rel, r, old_rel[r])
+            else:
+                res = closure.transitive_closure(rel)
+        else:
+            res = closure.transitive_closure(rel)
+
+        self._closure = (indiv, rel, res)
+        return self._closure
 
     def _exists(self, pred):
         return max(pred(v) for v in self.indiv) if self.indiv else FALSE
@@ -456,29 +456,48 @@ class Structure:
         self.update_n_plus()
         old_size = copy.deepcopy(self.size)
 
-        for constraint in self.constr:
-            (name, par_num, lh, rh, fix) = constraint
-            if par_num == 1:
-                for v in self.indiv:
-                    if lh(self,v) == TRUE:
-                        res = rh(self,v)
-                        if res == FALSE:
-                            return False
-                        elif res == MAYBE:
-                            fix(self,v)
-            elif par_num == 2:
-                for v1 in self.indiv:
-                    for v2 in self.indiv:
-                        if lh(self,v1,v2) == TRUE:
-                            res = rh(self,v1,v2)
-                            if res == FALSE:
-                                return False
-                            elif res == MAYBE:
-                                fix(self,v1,v2)
-
+        _, n, n_plus = self._closure
+        arrays = array_structure.ArrayStructure.from_structure(self, n=n.copy(), n_plus=n_plus)
+        fixed = arrays.copy()
+        if not self.constr.coerce(fixed):
+            return False
+        self._apply_fixes(arrays, fixed)
 
         return self.coerce_size(old_size)
 
+    # False if coerce would discard the structure for violating a constraint,
+    # which then holds for every refinement of it too. The structure itself
+    # is not changed.
+    def feasible(self):
+        _, n, n_plus = self._n_closure()
+        arrays = array_structure.ArrayStructure.from_structure(self, n=n.copy(), n_plus=n_plus)
+        return self.constr.coerce(arrays)
+
+    # Writes back the predicate values coerce fixed on the array form
+    def _apply_fixes(self, arrays, fixed):
+        indiv = self.indiv
+        for preds, before, after in (
+            (self.var, arrays.var, fixed.var),
+            (self.reach, arrays.reach, fixed.reach),
+        ):
+            for x, v in zip(*numpy.nonzero(before != after)):
+                preds[arrays.symbols[x]][indiv[v]] = _VALUES[after[x, v]]
+
+        for preds, before, after in (
+            (self.cycle, arrays.cycle, fixed.cycle),
+            (self.shared, arrays.shared, fixed.shared),
+            (self.sm, arrays.sm, fixed.sm),
+        ):
+            for v in numpy.flatnonzero(before != after):
+                preds[indiv[v]] = _VALUES[after[v]]
+
+        # Only the summary fix changes sizes
+        for v in numpy.flatnonzero(arrays.sm != fixed.sm):
+            self.size[indiv[v]] = fixed.size[v]
+
+        for u, v in zip(*numpy.nonzero(arrays.n != fixed.n)):
+            self.n[(indiv[u],indiv[v])] = _VALUES[fixed.n[u, v]]
+
 
     def coerce_size(self, old_size):
 
@@ -493,19 +512,20 @@ class Structure:
                     old_size[v] -= 1 # Diff to add to prev node
                     volatile_variable = self.arbitrary_terms_stack[-1] if self.arbitrary_terms_stack else None
 
-                    if not str(volatile_variable).startswith('T') or volatile_variable not in old_size[v].free_symbols:
+                    if not str(volatile_variable).startswith(linear.TEMPORARY) or \
+                        volatile_variable not in linear.free_symbols(old_size[v]):
                         return False
 
-                    (volatile_size,) = solveset(old_size[v], volatile_variable) 
+                    volatile_size = linear.solve(old_size[v], volatile_variable)
 
                     for w in self.indiv:
-                        if volatile_variable in self.size[w].free_symbols:
-                            self.size[w] = self.size[w].subs(volatile_variable, volatile_size)
+                        if volatile_variable in linear.free_symbols(self.size[w]):
+                            self.size[w] = linear.subs(self.size[w], volatile_variable, volatile_size)
                             if self.size[w] == 1:
                                 self._v_concretisize(w)
                             elif self.size[w] == 0:
                                 self._v_remove(w)
-                            elif is_negative(self.size[w]): # Illegal state
+                            elif linear.is_negative(self.size[w]): # Illegal state
                                 return False
 
                     self.arbitrary_terms_stack.pop()
@@ -577,7 +597,7 @@ class Structure:
                     shortcuts.Implies(
                         shortcuts.And(
                             shortcuts.Bool(len12 != -1),
-                            shortcuts.Bool(is_even(len12))
+                            shortcuts.Bool(linear.is_even(len12))
                         ),
                         lang_shape.Even(var1, var2).formula()
                     ),
@@ -586,7 +606,7 @@ class Structure:
                     shortcuts.Implies(
                         shortcuts.And(
                             shortcuts.Bool(len12 != -1),
-                            shortcuts.Bool(not is_even(len12))
+                            shortcuts.Bool(not linear.is_even(len12))
                         ),
                         lang_shape.Odd(var1, var2).formula()
                     ),
@@ -599,7 +619,7 @@ class Structure:
                                 shortcuts.And(
                                     shortcuts.Bool(len12 != -1),
                                     shortcuts.Bool(len34 != -1),
-                                    shortcuts.Bool(expand(len12) == expand(len34))
+                                    shortcuts.Bool(linear.equal(len12, len34))
                                 ),
                                 lang_shape.Len(var1, var2, var3, var4).formula()
                             )
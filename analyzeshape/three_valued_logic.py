@@ -1,4 +1,5 @@
 from enum import IntEnum
+import numpy
 
 class ThreeValuedBool(IntEnum):
     TRUE = 2
@@ -41,4 +42,28 @@ class ThreeValuedBool(IntEnum):
 
 TRUE = ThreeValuedBool.TRUE
 FALSE = ThreeValuedBool.FALSE
-MAYBE = ThreeValuedBool.MAYBE
\ No newline at end of file
+MAYBE = ThreeValuedBool.MAYBE
+
+# Three valued predicates over NumPy arrays hold the integer values of the
+# enum, so conjunction and disjunction become element-wise min and max
+ARRAY_DTYPE = 'int8'
+
+
+def array_and(a, b):
+    return numpy.minimum(a, b)
+
+
+def array_or(a, b):
+    return numpy.maximum(a, b)
+
+
+def array_not(a):
+    return (TRUE - a).astype(a.dtype, copy=False)
+
+
+def array_exists(a, axis=None):
+    return a.max(axis=axis, initial=FALSE)
+
+
+def array_forall(a, axis=None):
+    return a.min(axis=axis, initial=TRUE)
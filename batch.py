@@ -0,0 +1,265 @@
+import argparse
+import dataclasses
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import analyze
+from analyzeframework import cache
+from analyzeframework import chaotic
+from analyzeframework import lang
+from analyzeframework import validity
+
+ANALYSES = analyze.ANALYSES
+
+# Set in every worker by _init_worker
+_OPTIONS = None
+_CACHE = None
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Analyze many programs on a pool of worker processes',
+    )
+    parser.add_argument(
+        'input',
+        help='Directory of programs, or a manifest listing one '
+             '"path [type]" per line',
+    )
+    parser.add_argument(
+        '--type',
+        choices=ANALYSES,
+        required=False,
+        default=None,
+        help='Type of analysis for programs the manifest gives no type for',
+    )
+    parser.add_argument(
+        '--output',
+        required=False,
+        default=None,
+        help='JSON lines output file (default: stdout)',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes',
+    )
+    parser.add_argument(
+        '--worklist',
+        choices=chaotic.WORKLIST_ORDERS,
+        default=chaotic.FIFO,
+        help='Order in which chaotic iteration visits pending nodes',
+    )
+    parser.add_argument(
+        '--widening-delay',
+        type=int,
+        required=False,
+        default=None,
+        help='Widen at loop heads after this many visits (default: never)',
+    )
+    parser.add_argument(
+        '--narrowing-passes',
+        type=int,
+        default=0,
+        help='Maximal number of narrowing passes after the fixpoint',
+    )
+    parser.add_argument(
+       '--sum-max-combination-size',
+       type=int,
+       required=False,
+       default=None,
+       help='Sum analysis: maximal combination size of variables to track',
+    )
+    parser.add_argument(
+        '--sum-demand-driven',
+        action='store_true',
+        help='Sum analysis: only track combinations the asserts refer to',
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cache_dir',
+        action='store_const',
+        const=cache.DEFAULT_DIR,
+        help=f'Keep parsed programs in {cache.DEFAULT_DIR}',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=os.path.abspath,
+        default=cache.ENV_DIR,
+        help='Keep parsed programs in this directory (default: $ANALYZE_CACHE_DIR, '
+        'no caching when unset)',
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='cache_dir',
+        action='store_const',
+        const=None,
+        help='Always parse the programs',
+    )
+    parser.add_argument(
+        '--no-states',
+        dest='states',
+        action='store_false',
+        help='Do not include per-node states in the results',
+    )
+    return parser.parse_args(args)
+
+
+# Returns (path, analysis type) pairs for a directory or a manifest file
+def collect_jobs(source, default_type):
+    jobs = []
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if not name.startswith('.'):
+                    jobs.append((os.path.join(root, name), default_type))
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                path, *rest = line.split()
+                analysis = rest[0] if rest else default_type
+                jobs.append((os.path.join(base, path), analysis))
+
+    for path, analysis in jobs:
+        if analysis not in ANALYSES:
+            raise ValueError(f'No valid analysis type given for {path}')
+    return jobs
+
+
+def _init_worker(options):
+    global _OPTIONS, _CACHE
+    _OPTIONS = options
+    if options.get('cache_dir') is not None:
+        _CACHE = cache.ProgramCache(options['cache_dir'])
+    logging.basicConfig(level=logging.WARNING)
+    # The sum domain is only loaded when its option is given, the default is
+    # already in place
+    if options['sum_max_combination_size'] is not None:
+        from analyzenumerical import sum as sum_domain
+        sum_domain.MAX_COMBINATION_SIZE = options['sum_max_combination_size']
+
+
+def _state_str(state):
+    full_str = getattr(state, 'full_str', None)
+    return full_str() if full_str is not None else str(state)
+
+
+def analyze_program(job):
+    path, analysis = job
+    result = {'path': path, 'type': analysis}
+    timings = {}
+    start = time.perf_counter()
+    # A checker of its own, so verdicts do not pile up over the programs a
+    # worker analyzes
+    checker = validity.ValidityChecker()
+    try:
+        control = analyze.build_cfg(
+            path, analysis, _CACHE, sum_demand_driven=_OPTIONS['sum_demand_driven'],
+        )
+        timings['parse'] = time.perf_counter() - start
+
+        # Focus totals are kept per program
+        if analysis == 'shape':
+            from analyzeshape import focus
+            focus.reset_stats()
+        stats = chaotic.chaotic_iteration(
+            control,
+            order=_OPTIONS['worklist'],
+            widening_delay=_OPTIONS['widening_delay'],
+            narrowing_passes=_OPTIONS['narrowing_passes'],
+        )
+        timings['fixpoint'] = stats.elapsed
+
+        validate_start = time.perf_counter()
+        asserts = []
+        for node in control.nodes.values():
+            for edge in node.out_edges:
+                if isinstance(edge.statement, lang.Assert):
+                    asserts.append({
+                        'source': node.name,
+                        'destination': edge.successor.name,
+                        'statement': str(edge.statement),
+                        'valid': edge.valid(checker),
+                    })
+        timings['validate'] = time.perf_counter() - validate_start
+
+        result['status'] = 'ok'
+        result['asserts'] = asserts
+        result['stats'] = {
+            'visits': stats.visits,
+            'transforms': stats.transforms,
+            'widenings': stats.widenings,
+            'component_iterations': stats.component_iterations,
+        }
+        if analysis == 'shape':
+            result['stats']['focus'] = dataclasses.asdict(focus.STATS)
+        if _OPTIONS['states']:
+            result['states'] = {
+                node.name: _state_str(node.state)
+                for node in control.nodes.values()
+            }
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        checker.clear()
+
+    timings['total'] = time.perf_counter() - start
+    result['timings'] = timings
+    return result
+
+
+# What every worker is set up with
+def worker_options(opts):
+    return {
+        'worklist': opts.worklist,
+        'widening_delay': opts.widening_delay,
+        'narrowing_passes': opts.narrowing_passes,
+        'sum_max_combination_size': opts.sum_max_combination_size,
+        'sum_demand_driven': opts.sum_demand_driven,
+        'states': opts.states,
+        'cache_dir': opts.cache_dir,
+    }
+
+
+def main():
+    opts = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    jobs = collect_jobs(opts.input, opts.type)
+    options = worker_options(opts)
+
+    out = open(opts.output, 'w') if opts.output else sys.stdout
+    failed = 0
+    try:
+        with multiprocessing.Pool(
+            processes=opts.jobs,
+            initializer=_init_worker,
+            initargs=(options,),
+        ) as pool:
+            for result in pool.imap_unordered(analyze_program, jobs):
+                if result['status'] != 'ok':
+                    failed += 1
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f'Analyzed {len(jobs)} programs, {failed} failed',
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import analyze
+import batch
+import generate
+from analyzeframework import chaotic
+from analyzeframework import lang
+from analyzeframework import validity
+
+# Example directories and the analyses run on every program in them
+EXAMPLES = (
+    ('examples/parity', 'parity'),
+    ('examples/parity', 'parity-bits'),
+    ('examples/sum', 'sum'),
+    ('examples/shape', 'shape'),
+)
+
+# Programs analyze.py is timed on from start to exit, for the import and
+# setup costs a short run pays
+STARTUP = (
+    ('examples/parity/example1', 'parity'),
+    ('examples/parity/example1', 'parity-bits'),
+    ('examples/sum/example1', 'sum'),
+    ('examples/shape/reference-v1', 'shape'),
+)
+
+ANALYZE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyze.py')
+
+# Kinds of cases
+ANALYSIS = 'analysis'
+STARTUP_TIME = 'startup'
+
+# Relative increase over the baseline reported as a regression, the counts
+# are deterministic so any increase is
+TOLERANCES = {
+    'wall_time': 0.25,
+    'peak_rss_kb': 0.25,
+    'visits': 0.0,
+    'transforms': 0.0,
+    'solver_calls': 0.0,
+}
+# Timer noise, smaller increases of wall_time are never regressions
+MIN_TIME_DELTA = 0.05
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Time the analyses on the examples and on scaled '
+                    'synthetic programs, and compare against a baseline',
+    )
+    parser.add_argument(
+        '--match',
+        required=False,
+        default=None,
+        help='Only run cases whose name matches this regular expression',
+    )
+    parser.add_argument(
+        '--no-examples',
+        dest='examples',
+        action='store_false',
+        help='Do not run the programs under examples/',
+    )
+    parser.add_argument(
+        '--no-synthetic',
+        dest='synthetic',
+        action='store_false',
+        help='Do not run the scaled synthetic programs',
+    )
+    parser.add_argument(
+        '--no-startup',
+        dest='startup',
+        action='store_false',
+        help='Do not time whole analyze.py runs',
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='Runs per case, the fastest one is reported',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Number of cases run at once, more than one skews the times',
+    )
+    parser.add_argument(
+        '--output',
+        required=False,
+        default=None,
+        help='Write the results to this JSON file',
+    )
+    parser.add_argument(
+        '--baseline',
+        required=False,
+        default=None,
+        help='Compare the results against this JSON file of earlier results',
+    )
+    parser.add_argument(
+        '--save-baseline',
+        required=False,
+        default=None,
+        help='Write the results to this JSON file to compare later runs against',
+    )
+    return parser.parse_args()
+
+
+# Scaled synthetic programs from the families of generate.py:
+# (family, analyses, scales)
+VARIANTS = (
+    ('counters', ('parity', 'parity-bits'), (8, 32, 128)),
+    ('counters', ('sum',), (4, 8, 16)),
+    ('many-sums', ('sum',), (2, 4, 8)),
+    ('nested-loops', ('parity', 'parity-bits'), (4, 8, 16)),
+    ('nested-loops', ('sum',), (2, 4, 8)),
+    ('random-numerical', ('parity', 'parity-bits', 'sum'), (4, 8, 16)),
+    ('unrolled-list', ('shape',), (8, 32, 128)),
+    # Grows steeply, scale 8 takes minutes
+    ('list-loop', ('shape',), (2, 3, 4)),
+    ('random-shape', ('shape',), (4, 8, 16)),
+    ('branch-loops', ('shape',), (2, 4)),
+)
+
+
+# Returns (name, path, analysis type, kind) tuples, synthetic programs are
+# written to directory
+def collect_cases(directory, examples=True, synthetic=True, startup=True):
+    cases = []
+    if startup:
+        for path, analysis in STARTUP:
+            cases.append((f'startup:{analysis}', path, analysis, STARTUP_TIME))
+    if examples:
+        for source, analysis in EXAMPLES:
+            for path, _ in batch.collect_jobs(source, analysis):
+                cases.append((f'{analysis}:{path}', path, analysis, ANALYSIS))
+    if synthetic:
+        for name, analyses, scales in VARIANTS:
+            _, family = generate.FAMILIES[name]
+            for scale in scales:
+                path = os.path.join(directory, f'{name}-{scale}')
+                if not os.path.exists(path):
+                    with open(path, 'w') as f:
+                        f.write(family(scale))
+                for analysis in analyses:
+                    cases.append((
+                        f'{analysis}:synthetic/{name}-{scale}', path, analysis, ANALYSIS,
+                    ))
+    return cases
+
+
+# Runs analyze.py, the peak memory is that of the child
+def _run_startup(path, analysis):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, ANALYZE, '--type', analysis, '--no-cache', path],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    return {
+        'wall_time': time.perf_counter() - start,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+# Runs a single case, in a process of its own so the peak memory is its own
+def run_case(case):
+    name, path, analysis, kind = case
+    logging.basicConfig(level=logging.WARNING)
+    result = {'name': name, 'type': analysis}
+    if kind == STARTUP_TIME:
+        try:
+            result.update(_run_startup(path, analysis))
+        except subprocess.CalledProcessError as e:
+            lines = e.stderr.decode().strip().splitlines()
+            result['status'] = 'error'
+            result['error'] = lines[-1] if lines else str(e)
+            return result
+        result['status'] = 'ok'
+        return result
+
+    start = time.perf_counter()
+    try:
+        control = analyze.build_cfg(path, analysis)
+        stats = chaotic.chaotic_iteration(control)
+        checker = validity.ValidityChecker()
+        for node in control.nodes.values():
+            for edge in node.out_edges:
+                if isinstance(edge.statement, lang.Assert):
+                    edge.valid(checker)
+        checker.clear()
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+
+    result['status'] = 'ok'
+    result['wall_time'] = time.perf_counter() - start
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['visits'] = stats.visits
+    result['transforms'] = stats.transforms
+    result['solver_calls'] = checker.solver_calls
+    return result
+
+
+# Keeps the fastest run of every case
+def _best(results):
+    best = {}
+    for result in results:
+        name = result['name']
+        if name not in best or (
+            result['status'] == 'ok'
+            and
+            result['wall_time'] < best[name].get('wall_time', float('inf'))
+        ):
+            best[name] = result
+    return best
+
+
+def run_cases(cases, repeat=1, jobs=1):
+    with multiprocessing.Pool(processes=jobs, maxtasksperchild=1) as pool:
+        results = pool.map(run_case, [case for case in cases for _ in range(repeat)])
+    return _best(results)
+
+
+# Returns (name, metric, baseline value, value) for every metric of a case
+# that grew by more than its tolerance, and for cases that ran in the
+# baseline but fail now
+def compare(results, baseline, tolerances=TOLERANCES):
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None or old['status'] != 'ok':
+            continue
+        if result['status'] != 'ok':
+            regressions.append((name, 'status', old['status'], result['status']))
+            continue
+        for metric, tolerance in tolerances.items():
+            if metric not in old:
+                continue
+            limit = old[metric] * (1 + tolerance)
+            if metric == 'wall_time':
+                limit = max(limit, old[metric] + MIN_TIME_DELTA)
+            if result[metric] > limit:
+                regressions.append((name, metric, old[metric], result[metric]))
+    return regressions
+
+
+def _format(result, old):
+    if result['status'] != 'ok':
+        return f'{result["name"]}: {result["error"]}'
+    res = (
+        f'{result["name"]}: {result["wall_time"]:.3f}s'
+        f', {result["peak_rss_kb"] // 1024}MB'
+    )
+    if 'visits' in result:
+        res += f', {result["visits"]} visits, {result["solver_calls"]} solver calls'
+    if old is not None and old['status'] == 'ok' and old['wall_time']:
+        res += f' ({result["wall_time"] / old["wall_time"]:.2f}x baseline)'
+    return res
+
+
+def main():
+    opts = parse_args()
+    baseline = {}
+    if opts.baseline is not None:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cases = collect_cases(directory, opts.examples, opts.synthetic, opts.startup)
+        if opts.match is not None:
+            cases = [case for case in cases if re.search(opts.match, case[0])]
+        results = run_cases(cases, opts.repeat, opts.jobs)
+
+    for name, result in sorted(results.items()):
+        print(_format(result, baseline.get(name)))
+
+    for path in (opts.output, opts.save_baseline):
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    regressions = compare(results, baseline)
+    for name, metric, old, new in regressions:
+        print(f'Regression in {name}: {metric} {old} -> {new}', file=sys.stderr)
+    print(
+        f'Ran {len(results)} cases, {len(regressions)} regressions',
+        file=sys.stderr,
+    )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+import argparse
+import dataclasses
+import os
+import random
+import sys
+
+NUMERICAL = 'numerical'
+SHAPE = 'shape'
+GRAMMARS = (NUMERICAL, SHAPE)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Generate programs for scaling studies of the analyses',
+    )
+    parser.add_argument(
+        '--grammar',
+        choices=GRAMMARS,
+        default=NUMERICAL,
+        help='Grammar of random programs',
+    )
+    parser.add_argument(
+        '--family',
+        choices=sorted(FAMILIES),
+        required=False,
+        default=None,
+        help='Generate a program of this family instead of a random one',
+    )
+    parser.add_argument(
+        '--scale',
+        type=int,
+        default=8,
+        help='Size of family programs',
+    )
+    parser.add_argument('--vars', type=int, default=Config.vars, help='Number of variables')
+    parser.add_argument(
+        '--statements',
+        type=int,
+        default=Config.statements,
+        help='Number of statements (CFG edges) of random programs',
+    )
+    parser.add_argument('--nesting', type=int, default=Config.nesting, help='Maximal loop depth')
+    parser.add_argument(
+        '--branching',
+        type=int,
+        default=Config.branching,
+        help='Number of alternatives of a branch',
+    )
+    parser.add_argument(
+        '--assert-density',
+        type=float,
+        default=Config.assert_density,
+        help='Share of the statements that are asserts',
+    )
+    parser.add_argument(
+        '--no-conditions',
+        dest='conditions',
+        action='store_false',
+        help='Make every branch and loop nondeterministic',
+    )
+    parser.add_argument('--seed', type=int, default=Config.seed, help='Seed of the first program')
+    parser.add_argument(
+        '--count',
+        type=int,
+        default=1,
+        help='Number of random programs, seeded with consecutive seeds',
+    )
+    parser.add_argument(
+        '--output-dir',
+        required=False,
+        default=None,
+        help='Write the programs to this directory (default: stdout)',
+    )
+    return parser.parse_args()
+
+
+# Program text built edge by edge, labels are numbered in order of creation
+class Program:
+    def __init__(self, vars):
+        self.vars = vars
+        self.lines = []
+        self._labels = 0
+
+    def label(self):
+        self._labels += 1
+        return f'L{self._labels}'
+
+    def add(self, source, stmt, destination):
+        self.lines.append(f'{source} {stmt} {destination}')
+
+    # Chains the statements from source, returns the last label
+    def chain(self, source, stmts):
+        for stmt in stmts:
+            destination = self.label()
+            self.add(source, stmt, destination)
+            source = destination
+        return source
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __str__(self):
+        return '\n'.join([' '.join(self.vars), *self.lines]) + '\n'
+
+
+@dataclasses.dataclass
+class Config:
+    vars: int = 4
+    # Number of statements, which is the number of CFG edges, including the
+    # initialization of the variables
+    statements: int = 40
+    nesting: int = 2
+    branching: int = 2
+    assert_density: float = 0.1
+    seed: int = 0
+    # Chances of a statement opening a loop or a branch
+    loops: float = 0.1
+    branches: float = 0.1
+    # Without conditions every branch and loop is nondeterministic. The parity
+    # domains need that: a contradicting assume leaves them a state they
+    # cannot increment in
+    conditions: bool = True
+
+
+# Statements of the numerical grammar (analyzenumerical/parser.py)
+class _Numerical:
+    @staticmethod
+    def vars(n):
+        return [f'x{i}' for i in range(n)]
+
+    @staticmethod
+    def initialize(rng, vars):
+        return [f'{x} := {rng.randrange(10)}' for x in vars]
+
+    # The grammar reads any number after + and -, the statement always
+    # steps by one though (lang.VarIncAssignment), so only 1 is written
+    @staticmethod
+    def statements(rng, vars):
+        x, y = rng.choice(vars), rng.choice(vars)
+        n = rng.randrange(10)
+        return [rng.choice((
+            f'{x} := {y}',
+            f'{x} := {n}',
+            f'{x} := ?',
+            f'{x} := {y} + 1',
+            f'{x} := {y} - 1',
+        ))]
+
+    # A condition and its negation
+    @staticmethod
+    def condition(rng, vars):
+        x, y = rng.choice(vars), rng.choice(vars)
+        n = rng.randrange(10)
+        return rng.choice((
+            (f'{x} = {y}', f'{x} != {y}'),
+            (f'{x} = {n}', f'{x} != {n}'),
+            ('TRUE', 'TRUE'),
+        ))
+
+    @staticmethod
+    def assertion(rng, vars):
+        x = rng.choice(vars)
+        kind = rng.randrange(3)
+        if kind == 0:
+            return f'(EVEN {x})'
+        elif kind == 1:
+            return f'(ODD {x})'
+        lhs = rng.sample(vars, rng.randint(1, min(3, len(vars))))
+        rhs = rng.sample(vars, rng.randint(1, min(3, len(vars))))
+        return f'(SUM {" ".join(lhs)} = SUM {" ".join(rhs)})'
+
+
+# Statements of the shape grammar (analyzeshape/parser.py)
+class _Shape:
+    @staticmethod
+    def vars(n):
+        return [f'p{i}' for i in range(n)]
+
+    @staticmethod
+    def initialize(rng, vars):
+        return [f'{x} := NULL' for x in vars]
+
+    @staticmethod
+    def statements(rng, vars):
+        x, y = rng.choice(vars), rng.choice(vars)
+        return rng.choice((
+            [f'{x} := {y}'],
+            [f'{x} := {y}.n'],
+            # Fields are only assigned once cleared
+            [f'{x}.n := NULL', f'{x}.n := {y}'],
+            [f'{x}.n := NULL'],
+            [f'{x} := new'],
+            [f'{x} := NULL'],
+        ))
+
+    @staticmethod
+    def condition(rng, vars):
+        x, y = rng.choice(vars), rng.choice(vars)
+        return rng.choice((
+            (f'{x} = NULL', f'{x} != NULL'),
+            (f'{x} = {y}', f'{x} != {y}'),
+            ('TRUE', 'TRUE'),
+        ))
+
+    @staticmethod
+    def assertion(rng, vars):
+        x, y, z, w = (rng.choice(vars) for _ in range(4))
+        return rng.choice((
+            f'(LS {x} {y})',
+            f'(LEN {x} {y} = LEN {z} {w})',
+            f'(EVEN {x} {y})',
+            f'(ODD {x} {y})',
+        ))
+
+
+_GRAMMARS = {
+    NUMERICAL: _Numerical,
+    SHAPE: _Shape,
+}
+
+
+# Structured random program: a sequence of statements, asserts, branches
+# whose alternatives join again and loops, nested up to config.nesting.
+class _Generator:
+    def __init__(self, grammar, config):
+        self.grammar = _GRAMMARS[grammar]
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.program = Program(self.grammar.vars(config.vars))
+
+    # Every variable is assigned before the random statements, which may
+    # read any of them
+    def generate(self):
+        source = self.program.chain(
+            self.program.label(),
+            self.grammar.initialize(self.rng, self.program.vars),
+        )
+        self._block(source, 0, None)
+        return str(self.program)
+
+    def _condition(self):
+        if not self.config.conditions:
+            return 'TRUE', 'TRUE'
+        return self.grammar.condition(self.rng, self.program.vars)
+
+    def _statements(self):
+        return self.grammar.statements(self.rng, self.program.vars)
+
+    def _full(self):
+        return len(self.program) >= self.config.statements
+
+    # Appends up to length units (all that fit if None) to source, returns
+    # the label the block ends at
+    def _block(self, source, depth, length):
+        units = 0
+        while not self._full() and (length is None or units < length):
+            units += 1
+            roll = self.rng.random()
+            if roll < self.config.assert_density:
+                assertion = self.grammar.assertion(self.rng, self.program.vars)
+                source = self.program.chain(source, [f'assert {assertion}'])
+            elif depth < self.config.nesting and roll < self.config.assert_density + self.config.loops:
+                source = self._loop(source, depth)
+            elif roll < self.config.assert_density + self.config.loops + self.config.branches:
+                source = self._branch(source, depth)
+            else:
+                source = self.program.chain(source, self._statements())
+        return source
+
+    def _loop(self, source, depth):
+        # The head is never the first label, which has to stay the CFG head
+        head = self.program.chain(source, self._statements())
+        enter, leave = self._condition()
+        body = self.program.label()
+        self.program.add(head, f'assume({enter})', body)
+        back = self._block(body, depth + 1, self.rng.randint(1, 4))
+        self.program.add(back, 'skip', head)
+        done = self.program.label()
+        self.program.add(head, f'assume({leave})', done)
+        return done
+
+    # Two alternatives are a condition and its negation, any other number
+    # are nondeterministic
+    def _branch(self, source, depth):
+        if self.config.branching == 2:
+            conditions = self._condition()
+        else:
+            conditions = ['TRUE'] * max(self.config.branching, 1)
+        done = self.program.label()
+        for condition in conditions:
+            alternative = self.program.label()
+            self.program.add(source, f'assume({condition})', alternative)
+            end = self._block(alternative, depth, self.rng.randint(1, 3))
+            self.program.add(end, 'skip', done)
+        return done
+
+
+def random_program(grammar, config):
+    return _Generator(grammar, config).generate()
+
+
+# Families of programs scaled by a single number, each aimed at a hot path.
+# Every function returns the program text for a scale.
+
+# Many variables stepped by two in a loop, their parity asserted after it:
+# the number of variables for the parity domains, the number of tracked
+# combinations for SumTracker
+def counters_program(n):
+    program = Program(_Numerical.vars(n))
+    head = program.chain(
+        program.label(), [f'x{i} := {i}' for i in range(n)],
+    )
+    body = program.label()
+    program.add(head, 'assume (TRUE)', body)
+    back = program.chain(body, [f'x{i} := x{i} + 1' for i in range(n) for _ in range(2)])
+    program.add(back, 'skip', head)
+    done = program.label()
+    program.add(head, 'assume (TRUE)', done)
+    program.chain(done, [
+        f'assert ({"EVEN" if i % 2 == 0 else "ODD"} x{i})' for i in range(n)
+    ])
+    return str(program)
+
+
+# Variables assigned in pairs and asserted to sum up pairwise, every assert
+# is a SumTracker deduction
+def many_sums_program(n):
+    vars = _Numerical.vars(2 * n)
+    program = Program(vars)
+    stmts = []
+    for i in range(n):
+        stmts += [f'x{2 * i} := {i}', f'x{2 * i + 1} := x{2 * i} + 1']
+    source = program.chain(program.label(), stmts)
+    body = program.label()
+    program.add(source, 'assume (TRUE)', body)
+    back = program.chain(body, [
+        f'x{i} := x{(i + 2) % (2 * n)}' for i in range(2 * n)
+    ])
+    program.add(back, 'skip', source)
+    done = program.label()
+    program.add(source, 'assume (TRUE)', done)
+    program.chain(done, [
+        f'assert (SUM x{i} x{(i + 1) % (2 * n)} = SUM x{(i + 2) % (2 * n)} x{(i + 3) % (2 * n)})'
+        for i in range(2 * n)
+    ])
+    return str(program)
+
+
+# depth loops nested in each other, each stepping its own counter
+def nested_loops_program(depth):
+    program = Program([f'i{d}' for d in range(depth)] + ['s'])
+    entry = program.chain(program.label(), ['s := 0'])
+
+    def loop(d, source):
+        head = program.chain(source, [f'i{d} := 0'])
+        body = program.label()
+        program.add(head, 'assume (TRUE)', body)
+        if d + 1 < depth:
+            body = loop(d + 1, body)
+        back = program.chain(body, ['s := s + 1', 's := s + 1', f'i{d} := i{d} + 1'])
+        program.add(back, 'skip', head)
+        done = program.label()
+        program.add(head, 'assume (TRUE)', done)
+        return done
+
+    done = loop(0, entry)
+    program.chain(done, ['assert (EVEN s)', 'assert (SUM s = SUM s)'])
+    return str(program)
+
+
+# A list of length cells built without a loop, then walked to its end
+def unrolled_list_program(length):
+    program = Program(['x', 'y', 't'])
+    stmts = ['x := NULL']
+    for _ in range(length):
+        stmts += ['t := new', 't.n := NULL', 't.n := x', 'x := t']
+    stmts += ['t := NULL', 'y := x']
+    head = program.chain(program.label(), stmts)
+    body = program.label()
+    program.add(head, 'assume(y != NULL)', body)
+    back = program.chain(body, ['y := y.n'])
+    program.add(back, 'skip', head)
+    done = program.label()
+    program.add(head, 'assume(y = NULL)', done)
+    program.chain(done, ['assert (LS x y)', f'assert ({"EVEN" if length % 2 == 0 else "ODD"} x y)'])
+    return str(program)
+
+
+# n lists grown together by one loop, as in examples/shape/reference: every
+# visit of the loop head joins structures differing in the list sizes,
+# which exercises the arbitrary terms of ShapeState.join
+def list_loop_program(n):
+    lists = [f'h{i}' for i in range(n)]
+    program = Program([*lists, 't', 'y', 'z'])
+    source = program.chain(program.label(), [f'{h} := NULL' for h in lists])
+    head = program.chain(source, ['t := NULL'])
+    body = program.label()
+    program.add(head, 'assume(TRUE)', body)
+    stmts = []
+    for h in lists:
+        stmts += ['t := new', 't.n := NULL', f't.n := {h}', f'{h} := t']
+    back = program.chain(body, stmts)
+    program.add(back, 'skip', head)
+    done = program.label()
+    program.add(head, 'assume(TRUE)', done)
+    program.chain(done, [
+        f'assert (LEN {lists[0]} y = LEN {h} z)' for h in lists[1:]
+    ] or ['skip'])
+    return str(program)
+
+
+# A branch of n alternatives, each growing two lists of its own in a loop:
+# the loops are independent components of the weak topological order
+def branch_loops_program(n):
+    lists = [(f'a{i}', f'b{i}') for i in range(n)]
+    program = Program([h for pair in lists for h in pair] + ['t'])
+    source = program.chain(program.label(), [
+        f'{h} := NULL' for pair in lists for h in pair
+    ])
+    done = program.label()
+    for a, b in lists:
+        alternative = program.label()
+        program.add(source, 'assume(TRUE)', alternative)
+        head = program.chain(alternative, ['t := NULL'])
+        body = program.label()
+        program.add(head, 'assume(TRUE)', body)
+        back = program.chain(body, [
+            't := new', 't.n := NULL', f't.n := {a}', f'{a} := t',
+            't := new', 't.n := NULL', f't.n := {b}', f'{b} := t',
+            't := NULL',
+        ])
+        program.add(back, 'skip', head)
+        exit = program.label()
+        program.add(head, 'assume(TRUE)', exit)
+        end = program.chain(exit, [f'assert (LEN {a} t = LEN {b} t)'])
+        program.add(end, 'skip', done)
+    return str(program)
+
+
+def random_numerical_program(scale):
+    return random_program(
+        NUMERICAL, Config(vars=scale, statements=8 * scale, conditions=False),
+    )
+
+
+def random_shape_program(scale):
+    return random_program(SHAPE, Config(vars=3, statements=4 * scale, nesting=1))
+
+
+# name -> (grammar, program of a scale)
+FAMILIES = {
+    'counters': (NUMERICAL, counters_program),
+    'many-sums': (NUMERICAL, many_sums_program),
+    'nested-loops': (NUMERICAL, nested_loops_program),
+    'random-numerical': (NUMERICAL, random_numerical_program),
+    'unrolled-list': (SHAPE, unrolled_list_program),
+    'list-loop': (SHAPE, list_loop_program),
+    'branch-loops': (SHAPE, branch_loops_program),
+    'random-shape': (SHAPE, random_shape_program),
+}
+
+
+def main():
+    opts = parse_args()
+    if opts.family is not None:
+        grammar, family = FAMILIES[opts.family]
+        programs = [(f'{opts.family}-{opts.scale}', family(opts.scale))]
+    else:
+        grammar = opts.grammar
+        programs = []
+        for i in range(opts.count):
+            config = Config(
+                vars=opts.vars,
+                statements=opts.statements,
+                nesting=opts.nesting,
+                branching=opts.branching,
+                assert_density=opts.assert_density,
+                conditions=opts.conditions,
+                seed=opts.seed + i,
+            )
+            programs.append((f'{grammar}-{config.seed}', random_program(grammar, config)))
+
+    if opts.output_dir is None:
+        sys.stdout.write('\n'.join(text for _, text in programs))
+        return
+
+    os.makedirs(opts.output_dir, exist_ok=True)
+    for name, text in programs:
+        with open(os.path.join(opts.output_dir, name), 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import pytest
+
+import analyze
+from analyzeframework import chaotic
+from analyzeshape import array_structure
+
+
+@pytest.fixture(scope='module')
+def structures():
+    control = analyze.build_cfg('examples/shape/reference-v5', 'shape')
+    chaotic.chaotic_iteration(control)
+    res = [
+        st
+        for node in control.nodes.values()
+        for st in node.state.structures
+        if st.indiv
+    ]
+    assert res
+    return res
+
+
+def test_round_trip(structures):
+    for st in structures:
+        arrays = array_structure.ArrayStructure.from_structure(st)
+        back = arrays.to_structure(st.constr)
+
+        assert back == st
+        assert arrays == array_structure.ArrayStructure.from_structure(back)
+        assert arrays.canonical_key() == st.canonical_key()
+
+
+def test_copy_embed_remove_agree(structures):
+    for st in structures:
+        arrays = array_structure.ArrayStructure.from_structure(st)
+        st = st.copy()
+        copied = arrays.copy()
+
+        u = st.indiv[0]
+        st.copy_indiv(u)
+        copied.copy_indiv(0)
+        assert copied.to_structure(st.constr) == st
+        assert arrays.indiv == range(len(st.indiv) - 1)
+
+        for v in list(st.indiv):
+            for w in list(st.indiv):
+                if v in st.indiv and w in st.indiv and v < w and st._v_canonical_eq(v, st, w):
+                    st._v_embed(v, w)
+        copied.embed()
+        assert copied.to_structure(st.constr) == st
+        assert copied.canonical_key() == st.canonical_key()
+
+        # Empty structures never compare equal
+        if len(st.indiv) > 1:
+            copied._v_remove(0)
+            st._v_remove(st.indiv[0])
+            assert copied.to_structure(st.constr) == st
@@ -0,0 +1,77 @@
+import batch
+from analyzeframework import cache
+
+
+OPTIONS = {
+    'worklist': 'fifo',
+    'widening_delay': None,
+    'narrowing_passes': 0,
+    'sum_max_combination_size': None,
+    'sum_demand_driven': False,
+    'states': True,
+}
+
+
+def test_collect_jobs_from_manifest(tmp_path):
+    manifest = tmp_path / 'manifest'
+    manifest.write_text(
+        '# programs\n'
+        'a sum\n'
+        '\n'
+        'b  # uses the default type\n'
+    )
+
+    assert batch.collect_jobs(str(manifest), 'parity') == [
+        (str(tmp_path / 'a'), 'sum'),
+        (str(tmp_path / 'b'), 'parity'),
+    ]
+
+
+def test_collect_jobs_from_directory(tmp_path):
+    (tmp_path / 'x').write_text('')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'y').write_text('')
+
+    assert batch.collect_jobs(str(tmp_path), 'sum') == [
+        (str(tmp_path / 'x'), 'sum'),
+        (str(tmp_path / 'sub' / 'y'), 'sum'),
+    ]
+
+
+def test_analyze_program():
+    batch._init_worker(OPTIONS)
+
+    result = batch.analyze_program(('examples/sum/example5', 'sum'))
+
+    assert result['status'] == 'ok'
+    assert all(a['valid'] for a in result['asserts'])
+    assert set(result['states']) == {
+        'L0', 'L1', 'L10', 'L11', 'L20', 'L21', 'L30', 'L31',
+    }
+    assert result['timings']['total'] >= result['timings']['fixpoint']
+
+
+def test_analyze_program_error():
+    batch._init_worker(OPTIONS)
+
+    result = batch.analyze_program(('examples/missing', 'parity'))
+
+    assert result['status'] == 'error'
+    assert 'FileNotFoundError' in result['error']
+
+
+def test_cache_is_opt_in(monkeypatch):
+    monkeypatch.setattr(cache, 'ENV_DIR', None)
+
+    assert batch.parse_args(['programs']).cache_dir is None
+    assert batch.parse_args(['programs', '--cache']).cache_dir == cache.DEFAULT_DIR
+
+
+def test_focus_stats_are_per_program():
+    batch._init_worker(OPTIONS)
+
+    first = batch.analyze_program(('examples/shape/reference-v1', 'shape'))
+    second = batch.analyze_program(('examples/shape/reference-v1', 'shape'))
+
+    assert first['stats']['focus']['calls'] > 0
+    assert second['stats']['focus'] == first['stats']['focus']
@@ -0,0 +1,47 @@
+import benchmark
+
+
+def test_collect_cases(tmp_path):
+    cases = benchmark.collect_cases(str(tmp_path), examples=False)
+
+    names = [name for name, _, _, _ in cases]
+    assert len(names) == len(set(names))
+    assert 'shape:synthetic/unrolled-list-8' in names
+    assert 'sum:synthetic/random-numerical-4' in names
+    assert 'startup:shape' in names
+    assert all(
+        path.startswith(str(tmp_path)) for name, path, _, _ in cases
+        if not name.startswith('startup:')
+    )
+
+
+def test_startup_case():
+    result = benchmark.run_case(
+        ('startup:parity', 'examples/parity/example1', 'parity', benchmark.STARTUP_TIME),
+    )
+
+    assert result['status'] == 'ok', result.get('error')
+    assert result['wall_time'] > 0 and result['peak_rss_kb'] > 0
+
+
+def test_compare():
+    old = {'wall_time': 1.0, 'peak_rss_kb': 1000, 'visits': 10, 'transforms': 12, 'solver_calls': 2}
+    baseline = {
+        'a': {'status': 'ok', **old},
+        'b': {'status': 'ok', **old},
+        'c': {'status': 'ok', **old},
+        'd': {'status': 'error'},
+    }
+    results = {
+        'a': {'status': 'ok', **old, 'wall_time': 1.2, 'visits': 9},
+        'b': {'status': 'ok', **old, 'wall_time': 2.0, 'visits': 11},
+        'c': {'status': 'error'},
+        'd': {'status': 'ok', **old},
+        'e': {'status': 'ok', **old},
+    }
+
+    assert benchmark.compare(results, baseline) == [
+        ('b', 'wall_time', 1.0, 2.0),
+        ('b', 'visits', 10, 11),
+        ('c', 'status', 'ok', 'error'),
+    ]
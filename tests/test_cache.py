@@ -0,0 +1,37 @@
+import analyze
+from analyzeframework import cache
+
+
+def test_parse_is_cached(tmp_path):
+    program_cache = cache.ProgramCache(str(tmp_path))
+    path = 'examples/shape/reference-v1'
+
+    parsed = analyze.parse(path, 'shape', program_cache)
+    cached = analyze.parse(path, 'shape', program_cache)
+
+    assert (program_cache.misses, program_cache.hits) == (1, 1)
+    assert cached == parsed == analyze.parse(path, 'shape')
+
+
+def test_key_depends_on_grammar(tmp_path):
+    program_cache = cache.ProgramCache(str(tmp_path))
+    grammar = tmp_path / 'grammar.py'
+    grammar.write_text('old')
+    old = program_cache.key([str(grammar)], 'x\nL1 skip L2\n')
+    grammar.write_text('new')
+
+    assert cache.ProgramCache(str(tmp_path)).key([str(grammar)], 'x\nL1 skip L2\n') != old
+    assert program_cache.key([str(grammar)], 'x\nL1 skip L3\n') != old
+
+
+def test_unreadable_entry_is_parsed_again(tmp_path):
+    program_cache = cache.ProgramCache(str(tmp_path))
+    path = 'examples/parity/example1'
+    parsed = analyze.parse(path, 'parity', program_cache)
+    for entry in tmp_path.glob('*/*'):
+        entry.write_bytes(b'garbage')
+
+    assert analyze.parse(path, 'parity', program_cache) == parsed
+    assert program_cache.hits == 0
+    assert analyze.parse(path, 'parity', program_cache) == parsed
+    assert program_cache.hits == 1
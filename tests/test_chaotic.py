@@ -0,0 +1,292 @@
+import pytest
+
+import analyze
+import generate
+from analyzeframework import cfg
+from analyzeframework import chaotic
+from analyzeframework import parallel
+from analyzeframework import profiling
+from analyzenumerical import parser
+from analyzenumerical import parity
+from analyzenumerical import sum
+
+
+# Builds the CFG of a numerical program, with the nodes set to the initial
+# state when the abstract state class is given
+def _cfg(input_path, abstract_state=None):
+    lexer = parser.Lexer()
+    par = parser.Parser()
+    with open(input_path) as f:
+        par.parse(lexer.tokenize(f.read()))
+    control = cfg.ControlFlowGraph(par.lines)
+    if abstract_state is not None:
+        for node in control.nodes.values():
+            node.state = abstract_state.initial(par.vars)
+    return control
+
+
+def _analyze(input_path, abstract_state, order, **kwargs):
+    control = _cfg(input_path, abstract_state)
+    stats = chaotic.chaotic_iteration(control, order=order, **kwargs)
+    return control, stats
+
+
+def test_reverse_postorder():
+    control = _cfg('examples/parity/example5')
+
+    order = control.reverse_postorder()
+    assert order[0] is control.head
+    assert len(order) == len(control.nodes)
+
+    index = {node.name: i for i, node in enumerate(order)}
+    # Every edge that does not close a loop goes forward in the order
+    for node in control.nodes.values():
+        for edge in node.out_edges:
+            if index[edge.successor.name] <= index[node.name]:
+                assert edge.successor.in_edges[1:], (
+                    f'{node.name}->{edge.successor.name} is backwards'
+                )
+
+
+@pytest.mark.parametrize(
+    ('input_path', 'abstract_state'),
+    (
+        ('examples/parity/example5', parity.ParityState),
+        ('examples/parity/reference', parity.ParityState),
+        ('examples/sum/example5', sum.SumState),
+        ('examples/sum/example6', sum.SumState),
+    ),
+)
+# Holds for these programs only: the parity and sum transformers are not
+# monotone, on other programs the orders may reach different fixpoints
+def test_worklist_orders_agree(input_path, abstract_state):
+    fifo, fifo_stats = _analyze(input_path, abstract_state, chaotic.FIFO)
+    rpo, rpo_stats = _analyze(input_path, abstract_state, chaotic.RPO)
+    recursive, recursive_stats = _analyze(input_path, abstract_state, chaotic.RECURSIVE)
+
+    for name, node in fifo.nodes.items():
+        assert node.state == rpo.nodes[name].state
+        assert node.state == recursive.nodes[name].state
+    assert rpo_stats.visits <= fifo_stats.visits
+    assert recursive_stats.transforms <= rpo_stats.transforms
+
+
+# What every order guarantees: no edge adds anything to its successor once
+# the iteration is done
+@pytest.mark.parametrize('analysis', ('parity', 'parity-bits', 'sum'))
+@pytest.mark.parametrize('seed', range(4))
+def test_worklist_orders_reach_fixpoints(tmp_path, analysis, seed):
+    path = tmp_path / 'program'
+    config = generate.Config(vars=3, statements=30, seed=seed, conditions=False)
+    path.write_text(generate.random_program(generate.NUMERICAL, config))
+
+    for order in chaotic.WORKLIST_ORDERS:
+        control = analyze.build_cfg(str(path), analysis)
+        chaotic.chaotic_iteration(control, order=order)
+        for node in control.nodes.values():
+            if not node.visits:
+                continue
+            for edge in node.out_edges:
+                state = edge.successor.state
+                transformed = node.state.transform(edge.statement)
+                assert state.join(transformed) == state, (
+                    f'{order}: {node.name}->{edge.successor.name}'
+                )
+
+
+def test_loop_heads():
+    control = _cfg('examples/parity/reference')
+
+    assert control.loop_heads() == {'L3'}
+
+
+def test_weak_topological_order(tmp_path):
+    control = _cfg('examples/parity/reference')
+
+    wto = control.weak_topological_order()
+
+    assert ' '.join(cfg._element_str(e) for e in wto) == 'L0 L1 L2 (L3 L4 L5) L6 L7'
+
+    path = tmp_path / 'program'
+    path.write_text(generate.nested_loops_program(2))
+    wto = _cfg(path).weak_topological_order()
+
+    assert ' '.join(cfg._element_str(e) for e in wto) == (
+        'L1 L2 (L3 L4 (L5 L6 L7 L8 L9) L10 L11 L12 L13) L14 L15 L16'
+    )
+
+
+# Loops one after the other: the recursive strategy finishes each loop
+# before the next one, a worklist keeps revisiting the earlier ones
+def test_recursive_strategy_sequential_loops(tmp_path):
+    program = generate.Program(['x', 'y'])
+    source = program.chain(program.label(), ['x := 0', 'y := 1'])
+    heads = []
+    for _ in range(4):
+        head = program.chain(source, ['skip'])
+        heads.append(head)
+        body = program.label()
+        program.add(head, 'assume(TRUE)', body)
+        back = program.chain(body, ['x := x + 1', 'y := x + 1'])
+        program.add(back, 'skip', head)
+        source = program.label()
+        program.add(head, 'assume(TRUE)', source)
+    path = tmp_path / 'program'
+    path.write_text(str(program))
+
+    fifo, fifo_stats = _analyze(path, parity.ParityState, chaotic.FIFO)
+    recursive, stats = _analyze(path, parity.ParityState, chaotic.RECURSIVE)
+
+    for name, node in fifo.nodes.items():
+        assert node.state == recursive.nodes[name].state
+    assert stats.transforms < fifo_stats.transforms
+    # The parities are unknown after the first loop, the others are stable
+    # after one iteration
+    assert stats.component_iterations == {heads[0]: 2, **{head: 1 for head in heads[1:]}}
+    assert 'component iterations' in str(stats)
+
+
+@pytest.mark.parametrize(
+    ('input_path', 'abstract_state'),
+    (
+        ('examples/parity/reference', parity.ParityState),
+        ('examples/parity/count-down', parity.ParityState),
+        ('examples/sum/example3', sum.SumState),
+    ),
+)
+@pytest.mark.parametrize('order', (chaotic.FIFO, chaotic.RECURSIVE))
+def test_widening_and_narrowing(input_path, abstract_state, order):
+    plain, _ = _analyze(input_path, abstract_state, chaotic.FIFO)
+    widened, stats = _analyze(
+        input_path,
+        abstract_state,
+        order,
+        widening_delay=0,
+        narrowing_passes=2,
+    )
+
+    # Both domains have finite height, widening is their join
+    for name, node in plain.nodes.items():
+        assert node.state == widened.nodes[name].state
+    assert stats.narrowing_passes == 1
+
+
+def test_profiler():
+    profiler = profiling.Profiler()
+    control, stats = _analyze(
+        'examples/sum/example5', sum.SumState, chaotic.FIFO, profiler=profiler,
+    )
+
+    visited = {name: node.visits for name, node in control.nodes.items() if node.visits}
+    assert {name: node.visits for name, node in profiler.nodes.items()} == visited
+    transforms = 0
+    for edge in profiler.edges.values():
+        transforms += edge.transforms
+    assert transforms == stats.transforms
+    assert all(
+        edge.seconds.keys() == {profiling.TRANSFORM, profiling.JOIN, profiling.POST_TRANSFORM}
+        for edge in profiler.edges.values()
+    )
+    assert all('known_sums' in edge.metrics for edge in profiler.edges.values())
+
+    exported = profiler.to_json()
+    assert exported['edges'].keys() == profiler.edges.keys()
+    folded = profiler.folded()
+    assert len(folded) == 3 * len(profiler.edges)
+    stack, micros = folded[0].rsplit(' ', 1)
+    assert len(stack.split(';')) == 3 and int(micros) >= 0
+
+
+# A branch into two loops that meet again after them
+def _diamond_program():
+    program = generate.Program(['x', 'y'])
+    source = program.chain(program.label(), ['x := 0', 'y := 1'])
+    done = program.label()
+    for lval, rval in (('x', 'y'), ('y', 'x')):
+        head = program.label()
+        program.add(source, 'assume(TRUE)', head)
+        body = program.label()
+        program.add(head, 'assume(TRUE)', body)
+        back = program.chain(body, [f'{lval} := {rval} + 1', f'{rval} := {lval} + 1'])
+        program.add(back, 'skip', head)
+        program.add(head, 'assume(TRUE)', done)
+    program.chain(done, ['skip'])
+    return str(program)
+
+
+@pytest.mark.skipif(not parallel.available(), reason='Needs the fork start method')
+@pytest.mark.parametrize('analysis', ('parity', 'parity-bits', 'sum', 'shape'))
+def test_parallel_iteration(tmp_path, analysis):
+    path = tmp_path / 'program'
+    if analysis == 'shape':
+        path.write_text(generate.branch_loops_program(2))
+    else:
+        path.write_text(_diamond_program())
+    control = analyze.build_cfg(str(path), analysis)
+    stats = chaotic.chaotic_iteration(control, order=chaotic.RECURSIVE)
+    parallel_control = analyze.build_cfg(str(path), analysis)
+    parallel_stats = chaotic.chaotic_iteration(parallel_control, order=chaotic.RECURSIVE, jobs=2)
+
+    # The loops may finish in any order, which orders the structures where
+    # their results are joined
+    for name, node in control.nodes.items():
+        other = parallel_control.nodes[name]
+        if analysis == 'shape':
+            assert (
+                sorted(node.state.full_str().splitlines())
+                ==
+                sorted(other.state.full_str().splitlines())
+            )
+        else:
+            assert node.state == other.state
+        assert node.visits == other.visits
+        # The edges remember what they carried, as in this process
+        for edge, other_edge in zip(node.out_edges, other.out_edges):
+            assert (
+                (node.state.delta(edge.sent)[0] is None)
+                ==
+                (other.state.delta(other_edge.sent)[0] is None)
+            )
+    assert parallel_stats.transforms == stats.transforms
+    assert parallel_stats.component_iterations.keys() == stats.component_iterations.keys()
+    assert len(stats.component_iterations) == 2
+
+
+def test_parallel_iteration_needs_fork(monkeypatch):
+    monkeypatch.setattr(parallel, 'available', lambda: False)
+    control = analyze.build_cfg('examples/parity/reference', 'parity')
+
+    stats = chaotic.chaotic_iteration(control, order=chaotic.RECURSIVE, jobs=2)
+
+    assert stats.visits > 0
+
+
+def test_parallel_iteration_needs_recursive_order():
+    control = analyze.build_cfg('examples/parity/reference', 'parity')
+
+    with pytest.raises(ValueError):
+        chaotic.chaotic_iteration(control, order=chaotic.RPO, jobs=2)
+
+
+@pytest.mark.parametrize(
+    ('input_path', 'analysis'),
+    (
+        ('examples/parity/reference', 'parity'),
+        ('examples/parity/reference', 'parity-bits'),
+        ('examples/sum/example6', 'sum'),
+    ),
+)
+def test_join_changed_and_leq(input_path, analysis):
+    control = analyze.build_cfg(input_path, analysis)
+    chaotic.chaotic_iteration(control)
+
+    states = [node.state for node in control.nodes.values()]
+    for state in states:
+        for other in states:
+            joined = state.join(other)
+            flagged, changed = state.join_changed(other)
+            assert changed == (joined != state)
+            assert flagged == joined
+            assert other.leq(state) == (joined == state)
+            if state.fingerprint() != other.fingerprint():
+                assert state.differs(other)
@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+from analyzeshape import closure
+from analyzeshape import three_valued_logic
+
+
+def _naive_closure(rel):
+    res = rel.tolist()
+    k = len(res)
+    for u in range(k):
+        for v in range(k):
+            for w in range(k):
+                res[v][w] = max(res[v][w], min(res[v][u], res[u][w]))
+    return numpy.array(res, three_valued_logic.ARRAY_DTYPE).reshape(k, k)
+
+
+def _random_relation(rng, k):
+    return rng.integers(0, 3, (k, k)).astype(three_valued_logic.ARRAY_DTYPE)
+
+
+@pytest.mark.parametrize('k', (0, 1, 2, 5, 9))
+def test_transitive_closure(k):
+    rng = numpy.random.default_rng(k)
+    for _ in range(20):
+        rel = _random_relation(rng, k)
+        assert numpy.array_equal(closure.transitive_closure(rel), _naive_closure(rel))
+
+
+@pytest.mark.parametrize('k', (1, 2, 5, 9))
+def test_update_row(k):
+    rng = numpy.random.default_rng(k)
+    for _ in range(50):
+        rel = _random_relation(rng, k)
+        # Sparse relations, like the n of a list
+        rel[rng.random((k, k)) < 0.7] = three_valued_logic.FALSE
+        res = closure.transitive_closure(rel)
+
+        r = rng.integers(k)
+        new_rel = rel.copy()
+        new_rel[r] = numpy.maximum(rel[r], _random_relation(rng, k)[0])
+        if rng.random() < 0.3:
+            new_rel[r] = three_valued_logic.FALSE
+
+        assert numpy.array_equal(
+            closure.update_row(res, new_rel, r, rel[r]),
+            _naive_closure(new_rel),
+        )
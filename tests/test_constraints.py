@@ -0,0 +1,55 @@
+import numpy
+
+import analyze
+from analyzeframework import chaotic
+from analyzeframework import lang
+from analyzeshape import array_structure
+from analyzeshape import constraints
+from analyzeshape import lang as lang_shape
+from analyzeshape import shape
+
+
+X = lang.Symbol('x')
+Y = lang.Symbol('y')
+
+
+def test_constraint_set_is_shared():
+    first = shape.ShapeState.initial([X, Y])
+    first.initialize_head([X, Y])
+    second = shape.ShapeState.initial([Y, X])
+    second.initialize_head([Y, X])
+
+    (st,) = first.structures
+    assert st.constr is second.structures[0].constr
+    assert st.copy().constr is st.constr
+    assert st.constr is constraints.ConstraintSet.for_symbols({X, Y})
+
+
+def test_coerced_structures_are_stable():
+    control = analyze.build_cfg('examples/shape/reference-v1', 'shape')
+    chaotic.chaotic_iteration(control)
+
+    checked = 0
+    for node in control.nodes.values():
+        for st in node.state.structures:
+            st.update_n_plus()
+            arrays = array_structure.ArrayStructure.from_structure(st)
+            fixed = arrays.copy()
+            assert st.constr.coerce(fixed)
+            # Nothing is left to fix
+            for pred in ('var', 'reach', 'cycle', 'shared', 'sm', 'n'):
+                assert numpy.array_equal(getattr(fixed, pred), getattr(arrays, pred))
+            checked += 1
+    assert checked
+
+
+def test_violation_rules_out_structure():
+    state = shape.ShapeState.initial([X, Y])
+    state.initialize_head([X, Y])
+    state = state.transform(lang_shape.VarNewAssignment(X))
+    (st,) = state.structures
+
+    # x points to two distinct concrete individuals
+    u = st.indiv[0]
+    st.copy_indiv(u)
+    assert not st.coerce()
@@ -0,0 +1,40 @@
+from analyzeframework import lang
+from analyzenumerical import lang as lang_num
+from analyzenumerical import parity
+from analyzenumerical import sum
+
+
+X = lang.Symbol('x')
+Y = lang.Symbol('y')
+
+
+def test_parity_transform_leaves_source_intact():
+    state = parity.ParityState.initial([X, Y])
+    state.mutable('modulo')[Y] = parity.ODD
+
+    res = state.transform(lang_num.VarAssignment(X, Y))
+
+    assert res.modulo[X] == parity.ODD
+    assert res.samepar[X] == {Y}
+    assert state.modulo[X] == parity.BOTTOM
+    assert state.samepar[X] == set()
+
+
+def test_noop_transform_shares_fields():
+    state = parity.ParityState.initial([X, Y])
+
+    res = state.transform(lang.Skip())
+
+    assert res.modulo is state.modulo
+    assert res.samepar is state.samepar
+    assert res == state
+
+
+def test_sum_transform_leaves_source_intact():
+    state = sum.SumState.initial([X, Y])
+
+    res = state.transform(lang_num.ValAssignment(X, 3))
+
+    assert res.sums[{X}] == 3
+    assert state.sums[{X}] is sum.BOTTOM
+    assert res.diff is not state.diff
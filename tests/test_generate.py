@@ -0,0 +1,101 @@
+import pytest
+
+import analyze
+import benchmark
+import generate
+from analyzeframework import chaotic
+from analyzeframework import lang
+
+
+@pytest.mark.parametrize(
+    ('family', 'analysis', 'asserts'),
+    (
+        ('counters', 'parity', 3),
+        ('counters', 'sum', 3),
+        ('many-sums', 'sum', 6),
+        ('nested-loops', 'parity-bits', 2),
+        ('unrolled-list', 'shape', 2),
+        ('list-loop', 'shape', 2),
+    ),
+)
+def test_families(tmp_path, family, analysis, asserts):
+    _, program = generate.FAMILIES[family]
+    path = tmp_path / 'program'
+    path.write_text(program(3))
+
+    result = benchmark.run_case(('case', str(path), analysis, benchmark.ANALYSIS))
+
+    assert result['status'] == 'ok', result.get('error')
+    assert result['solver_calls'] == asserts
+    assert result['visits'] > 0 and result['peak_rss_kb'] > 0
+
+
+# The parity asserts of these families hold, which needs every step the
+# program text shows to be the one analyzed
+@pytest.mark.parametrize('family', ('counters', 'nested-loops'))
+@pytest.mark.parametrize('analysis', ('parity', 'parity-bits'))
+def test_family_asserts_hold(tmp_path, family, analysis):
+    _, program = generate.FAMILIES[family]
+    path = tmp_path / 'program'
+    path.write_text(program(3))
+    control = analyze.build_cfg(str(path), analysis)
+    chaotic.chaotic_iteration(control)
+
+    edges = [
+        edge for node in control.nodes.values() for edge in node.out_edges
+        if type(edge.statement) is lang.Assert
+    ]
+    assert edges and all(edge.valid() for edge in edges)
+
+
+def test_random_numerical_steps_by_one():
+    config = generate.Config(vars=3, statements=200)
+
+    text = generate.random_program(generate.NUMERICAL, config)
+
+    steps = [
+        words[i + 1] for words in map(str.split, text.splitlines())
+        for i, word in enumerate(words) if word in ('+', '-')
+    ]
+    assert steps and set(steps) == {'1'}
+
+
+def test_random_program_is_seeded():
+    config = generate.Config(seed=3)
+
+    text = generate.random_program(generate.NUMERICAL, config)
+
+    assert text == generate.random_program(generate.NUMERICAL, config)
+    assert text != generate.random_program(generate.NUMERICAL, generate.Config(seed=4))
+
+
+@pytest.mark.parametrize('statements', (5, 20, 60))
+def test_random_program_size(statements):
+    config = generate.Config(vars=3, statements=statements)
+
+    text = generate.random_program(generate.SHAPE, config)
+
+    lines = text.splitlines()
+    assert lines[0] == 'p0 p1 p2'
+    # Loops and branches open when the program is nearly full still add
+    # their closing edges
+    assert statements <= len(lines) - 1 < 2 * statements
+
+
+@pytest.mark.parametrize(
+    ('grammar', 'analyses', 'conditions'),
+    (
+        (generate.NUMERICAL, ('parity', 'parity-bits', 'sum'), False),
+        (generate.NUMERICAL, ('sum',), True),
+        (generate.SHAPE, ('shape',), True),
+    ),
+)
+@pytest.mark.parametrize('seed', range(3))
+def test_random_programs_analyze(tmp_path, grammar, analyses, conditions, seed):
+    config = generate.Config(vars=3, statements=20, seed=seed, conditions=conditions)
+    path = tmp_path / 'program'
+    path.write_text(generate.random_program(grammar, config))
+
+    for analysis in analyses:
+        result = benchmark.run_case(('case', str(path), analysis, benchmark.ANALYSIS))
+        assert result['status'] == 'ok', result.get('error')
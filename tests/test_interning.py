@@ -0,0 +1,84 @@
+import gc
+
+import pytest
+
+import analyze
+from analyzeframework import chaotic
+from analyzeframework import interning
+
+
+class _Value:
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __eq__(self, other):
+        return self.contents == other.contents
+
+
+def test_table():
+    table = interning.Table()
+    first = _Value(1)
+    assert table.intern(1, first) is first
+    assert table.intern(1, _Value(1)) is first
+    # A digest collision keeps both values
+    other = _Value(2)
+    assert table.intern(1, other) is other
+    assert (table.hits, table.misses, table.collisions) == (1, 1, 1)
+
+    del first
+    gc.collect()
+    assert len(table) == 0
+
+
+@pytest.mark.parametrize(
+    ('input_path', 'analysis'),
+    (
+        ('examples/parity/reference', 'parity'),
+        ('examples/parity/reference', 'parity-bits'),
+        ('examples/sum/example6', 'sum'),
+        ('examples/shape/reference-v1', 'shape'),
+    ),
+)
+def test_equal_states_are_shared(input_path, analysis):
+    control = analyze.build_cfg(input_path, analysis)
+    chaotic.chaotic_iteration(control, order=chaotic.RECURSIVE)
+
+    states = [node.state for node in control.nodes.values()]
+    for state in states:
+        for other in states:
+            if state.intern_key() == other.intern_key() and state == other:
+                assert state is other
+
+
+def test_structures_are_shared():
+    control = analyze.build_cfg('examples/shape/reference-v1', 'shape')
+    chaotic.chaotic_iteration(control, order=chaotic.RECURSIVE)
+
+    structures = [st for node in control.nodes.values() for st in node.state.structures]
+    assert all(st.is_interned() for st in structures)
+    distinct = {id(st) for st in structures}
+    assert len(distinct) < len(structures)
+    for st in structures:
+        for other in structures:
+            if st.same_contents(other):
+                assert st is other
+
+
+# intern_key only reads the state, equal contents give equal keys before
+# anything is interned
+@pytest.mark.parametrize(
+    ('input_path', 'analysis'),
+    (
+        ('examples/sum/example6', 'sum'),
+        ('examples/shape/reference-v1', 'shape'),
+    ),
+)
+def test_intern_key_has_no_side_effects(input_path, analysis):
+    control = analyze.build_cfg(input_path, analysis)
+    chaotic.chaotic_iteration(control)
+    state = next(node.state for node in control.nodes.values() if node.visits)
+    copy = state.copy()
+    fields = {name: getattr(copy, name) for name in copy.COW_FIELDS}
+
+    assert copy.intern_key() == state.intern_key()
+    assert all(getattr(copy, name) is value for name, value in fields.items())
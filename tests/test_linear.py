@@ -0,0 +1,62 @@
+import fractions
+
+from analyzeframework import lang
+from analyzeshape import linear
+
+
+P = lang.Symbol('PL1')
+T = lang.Symbol('TL2')
+
+
+def test_canonical_form():
+    a = linear.Linear.symbol(P) * 2 + 3 - linear.Linear.symbol(T)
+    b = 3 - (linear.Linear.symbol(T) - 2 * linear.Linear.symbol(P))
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a.free_symbols == {P, T}
+    assert a - b == 0
+    assert (a - b).free_symbols == set()
+    assert linear.ONE == 1
+    assert hash(linear.ONE) == hash(1)
+    assert str(a) == '2*PL1 - TL2 + 3'
+
+
+def test_solve_and_subs():
+    # 2 * T - 4 - P == 0
+    size = 2 * linear.Linear.symbol(T) - 4 - linear.Linear.symbol(P)
+    half = size.solve(T)
+    assert half == linear.Linear.symbol(P) * fractions.Fraction(1, 2) + 2
+    assert str(half) == '1/2*PL1 + 2'
+    assert not linear.is_even(2 * half)
+    assert linear.equal(half, half._sympy_())
+    assert (size + linear.Linear.symbol(P)).solve(T) == 2
+    assert size.solve(lang.Symbol('TL3')) is None
+
+    size = 4 - linear.Linear.symbol(T) + linear.Linear.symbol(P)
+    solution = size.solve(T)
+    assert solution == linear.Linear.symbol(P) + 4
+    assert size.subs(T, solution) == 0
+    assert linear.subs(3 * linear.Linear.symbol(T), T, solution) == 3 * solution
+
+
+def test_parity():
+    assert linear.is_even(linear.Linear(4))
+    assert linear.is_even(2 * linear.Linear.symbol(P) - 6)
+    assert not linear.is_even(2 * linear.Linear.symbol(P) + 1)
+    assert not linear.is_even(linear.Linear.symbol(P) + 1)
+
+
+# The sign does not depend on a common factor of the coefficients
+def test_sign_ignores_content():
+    for factor in (1, 2, 3):
+        assert not linear.is_negative(factor * (linear.Linear.symbol(P) - 1))
+        assert linear.is_negative(factor * (1 - linear.Linear.symbol(P)))
+        assert linear.is_negative(linear.Linear(-factor))
+
+
+def test_sympy_fallback():
+    product = linear.Linear.symbol(P) * (linear.Linear.symbol(T) + 1)
+    assert not isinstance(product, linear.Linear)
+    assert linear.free_symbols(product) == {P, T}
+    assert linear.equal(product - linear.Linear.symbol(P), product + 0 - linear.Linear.symbol(P))
+    assert linear.equal(linear.Linear.symbol(P) + 1, product - product + linear.Linear.symbol(P) + 1)
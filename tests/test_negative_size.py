@@ -1,57 +1,60 @@
 import pytest
 
-from analyzeshape import structure
-from pysmt import shortcuts
-import collections
+from analyzeframework import lang
+from analyzeshape import linear
 
-from sympy import *
+
+def symbols(names):
+	return [linear.Linear.symbol(lang.Symbol(name)) for name in names.split()]
 
 
 def test_negative_size_perm1():
 
-	p1, p2 = symbols('p-L1 p-L2')
+	p1, p2 = symbols('P-L1 P-L2')
 
 	expr = 2*p1 - p2*2 + 6
-	assert(structure.is_negative(expr))
+	assert(linear.is_negative(expr))
 
 
 def test_negative_size_perm2():
 
-	p1, p2 = symbols('p-L1 p-L2')
+	p1, p2 = symbols('P-L1 P-L2')
 
 	expr = 2*p1 + p2*2 - 6
-	assert(not structure.is_negative(expr))
+	assert(not linear.is_negative(expr))
 
 def test_negative_size_both():
 
-	p1, t1 = symbols('p-L1 t-L2')
+	p1, t1 = symbols('P-L1 T-L2')
 
 	expr = 2*p1 - t1*2 - 6
-	assert(not structure.is_negative(expr))
+	assert(not linear.is_negative(expr))
 
 def test_negative_size_temp1():
 
-	t1, t2 = symbols('t-L1 t-L2')
+	t1, t2 = symbols('T-L1 T-L2')
 
 	expr = 2*t1 - t2*2 + 6
-	assert(structure.is_negative(expr))
+	assert(linear.is_negative(expr))
 
 def test_negative_size_temp2():
 
-	t1, t2 = symbols('t-L1 t-L2')
+	t1, t2 = symbols('T-L1 T-L2')
 
 	expr = 2*t1 + t2*2 - 6
-	assert(not structure.is_negative(expr))
+	assert(not linear.is_negative(expr))
 
 def test_negative_size_none():
 
-	expr = Integer(-50)
-	assert(structure.is_negative(expr))
+	expr = linear.Linear(-50)
+	assert(linear.is_negative(expr))
 
 
 def test_negative_size_factored():
 
-	p1, p2 = symbols('p-L1 p-L2')
+	p1, p2 = symbols('P-L1 P-L2')
 
+	# Not linear, checked by sympy
 	expr = (p1 - 5) * (3*p2 - 2)
-	assert(not structure.is_negative(expr))
+	assert(not isinstance(expr, linear.Linear))
+	assert(not linear.is_negative(expr))
@@ -1,7 +1,13 @@
+import gc
+
 import pytest
 
+from analyzeframework import cfg
+from analyzeframework import chaotic
+from analyzeframework import lang
 from analyzenumerical import parser
 from analyzenumerical import parity
+from analyzenumerical import bitparity
 
 from tests import harness
 
@@ -72,11 +78,53 @@ from tests import harness
         ),
     ),
 )
-def test_parity_analysis(input_path, asserts):
+@pytest.mark.parametrize(
+    'abstract_state',
+    (parity.ParityState, bitparity.BitParityState),
+)
+def test_parity_analysis(input_path, asserts, abstract_state):
     harness.check_asserts(
         lexer=parser.Lexer(),
         parser=parser.Parser(),
         input=input_path,
-        abstract_state=parity.ParityState,
+        abstract_state=abstract_state,
         asserts=asserts,
     )
+
+
+def test_bit_parity_matches_sets():
+    lexer = parser.Lexer()
+    par = parser.Parser()
+    with open('examples/parity/reference-weird-mixed') as f:
+        par.parse(lexer.tokenize(f.read()))
+    control = cfg.ControlFlowGraph(par.lines)
+    bits = cfg.ControlFlowGraph(par.lines)
+    for node in control.nodes.values():
+        node.state = parity.ParityState.initial(par.vars)
+    for node in bits.nodes.values():
+        node.state = bitparity.BitParityState.initial(par.vars)
+
+    chaotic.chaotic_iteration(control)
+    chaotic.chaotic_iteration(bits)
+
+    for name, node in control.nodes.items():
+        state = bits.nodes[name].state
+        for symbol in par.vars:
+            assert bitparity._VALUES[state.get_modulo(symbol)] == \
+                node.state.modulo[symbol]
+            i = state.table.index[symbol]
+            assert set(state.table.row(state.samepar, i)) == \
+                node.state.samepar[symbol]
+            assert set(state.table.row(state.antipar, i)) == \
+                node.state.antipar[symbol]
+
+
+def test_symbol_tables_live_with_their_states():
+    symbols = [lang.Symbol('test-table-a'), lang.Symbol('test-table-b')]
+    state = bitparity.BitParityState.initial(symbols)
+    assert bitparity.BitParityState.initial(symbols).table is state.table
+
+    del state
+    gc.collect()
+
+    assert tuple(symbols) not in bitparity.SymbolTable._TABLES
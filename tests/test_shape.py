@@ -1,7 +1,15 @@
 import pytest
 
+import analyze
+import generate
+from analyzeframework import abstract
+from analyzeframework import chaotic
+from analyzeframework import lang
+from analyzeshape import focus
+from analyzeshape import lang as lang_shape
 from analyzeshape import parser
 from analyzeshape import shape
+from analyzeshape import structure
 
 from tests import harness
 
@@ -38,3 +46,102 @@ def test_shape_analysis(input_path, asserts):
         abstract_state=shape.ShapeState,
         asserts=asserts,
     )
+
+
+X = lang.Symbol('x')
+Y = lang.Symbol('y')
+
+
+def _allocate(order):
+    state = shape.ShapeState.initial([X, Y])
+    state.initialize_head([X, Y])
+    for var in order:
+        state = state.transform(lang_shape.VarNewAssignment(var))
+    (st,) = state.structures
+    return st
+
+
+def test_canonical_key_ignores_labels():
+    xy = _allocate((X, Y))
+    yx = _allocate((Y, X))
+    assert xy.indiv == yx.indiv
+    assert xy.canonical_key() == yx.canonical_key()
+
+    index = structure.StructureIndex([xy])
+    assert yx in index
+    assert index.match(yx)[0] is xy
+
+    only_x = _allocate((X,))
+    assert only_x.canonical_key() != xy.canonical_key()
+    assert only_x not in index
+
+
+def test_focus_prunes_and_deduplicates():
+    st = _allocate((X, Y))
+    x_node = next(u for u in st.indiv if st.var[X][u] == shape.TRUE)
+    y_node = next(u for u in st.indiv if st.var[Y][u] == shape.TRUE)
+    st.var[X][y_node] = shape.MAYBE
+    st.var[Y][x_node] = shape.MAYBE
+
+    # Focuses x and then y, every FALSE refinement comes twice
+    def refine(st):
+        for var in (X, Y):
+            u = next((u for u in st.indiv if st.var[var][u] == shape.MAYBE), None)
+            if u is not None:
+                break
+        else:
+            return None
+        refinements = []
+        for value in (shape.TRUE, shape.FALSE, shape.FALSE):
+            refinement = st.copy()
+            refinement.var[var][u] = value
+            refinements.append(refinement)
+        return refinements
+
+    focus.reset_stats()
+    focused = focus.focus([st], refine)
+
+    # x pointing to both individuals is not focused on y any further, the
+    # focused structures are all kept
+    assert focus.reset_stats() == focus.FocusStats(
+        calls=1, generated=6, duplicates=2, pruned=1,
+    )
+
+    assert len(focused) == 2
+    assert all(refined.var[X][y_node] == shape.FALSE for refined in focused)
+    assert {refined.var[Y][x_node] for refined in focused} == {shape.TRUE, shape.FALSE}
+
+
+# Runs the analysis counting the structures transformed along edges
+def _transformed_structures(path, monkeypatch):
+    counted = []
+    transform = shape.ShapeState.transform
+
+    def counting(self, *args, **kwargs):
+        counted.append(len(self.structures))
+        return transform(self, *args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(shape.ShapeState, 'transform', counting)
+        control = analyze.build_cfg(path, 'shape')
+        chaotic.chaotic_iteration(control)
+    return control, sum(counted)
+
+
+def test_delta_propagation(tmp_path, monkeypatch):
+    path = tmp_path / 'list-loop'
+    path.write_text(str(generate.list_loop_program(2)))
+
+    delta, delta_count = _transformed_structures(path, monkeypatch)
+    monkeypatch.setattr(shape.ShapeState, 'delta', abstract.AbstractState.delta)
+    full, full_count = _transformed_structures(path, monkeypatch)
+
+    assert delta_count < full_count
+    for name, node in full.nodes.items():
+        # Structures sent again only add copies of sizes generalized before
+        delta_lines = set(delta.nodes[name].state.full_str().splitlines())
+        assert delta_lines <= set(node.state.full_str().splitlines())
+        for edge in node.out_edges:
+            if type(edge.statement) is lang.Assert:
+                delta_edge = delta.nodes[name].out_edges[node.out_edges.index(edge)]
+                assert delta_edge.valid() == edge.valid()
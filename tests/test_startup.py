@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Runs the fixpoint of an analysis in a fresh interpreter and prints which
+# of the heavy modules it loaded
+_SCRIPT = '''
+import json, sys
+import analyze
+from analyzeframework import chaotic
+chaotic.chaotic_iteration(analyze.build_cfg(sys.argv[1], sys.argv[2]))
+heavy = ('pysmt.environment', 'z3', 'sympy', 'numpy', 'sly', 'analyzenumerical', 'analyzeshape')
+print(json.dumps(sorted(m for m in heavy if m in sys.modules)))
+'''
+
+# The same for a batch worker, which also validates the asserts and so
+# always loads pysmt
+_BATCH_SCRIPT = '''
+import json, sys
+import batch
+path, analysis = sys.argv[1:]
+batch._init_worker(batch.worker_options(batch.parse_args([path, '--type', analysis, '--no-cache'])))
+batch.analyze_program((path, analysis))
+heavy = ('sympy', 'numpy', 'analyzenumerical', 'analyzeshape')
+print(json.dumps(sorted(m for m in heavy if m in sys.modules)))
+'''
+
+
+@pytest.mark.parametrize(
+    ('path', 'analysis', 'loaded'),
+    (
+        ('examples/parity/example1', 'parity', ['analyzenumerical', 'sly']),
+        ('examples/parity/example1', 'parity-bits', ['analyzenumerical', 'sly']),
+        ('examples/sum/example1', 'sum', ['analyzenumerical', 'numpy', 'sly']),
+        ('examples/shape/reference-v1', 'shape', ['analyzeshape', 'numpy', 'sly']),
+    ),
+)
+def test_analyses_load_only_their_domain(path, analysis, loaded):
+    assert _loaded(_SCRIPT, path, analysis) == loaded
+
+
+@pytest.mark.parametrize(
+    ('path', 'analysis', 'loaded'),
+    (
+        ('examples/parity/example1', 'parity', ['analyzenumerical']),
+        ('examples/sum/example1', 'sum', ['analyzenumerical', 'numpy']),
+        ('examples/shape/reference-v1', 'shape', ['analyzeshape', 'numpy']),
+    ),
+)
+def test_batch_workers_load_only_their_domain(path, analysis, loaded):
+    assert _loaded(_BATCH_SCRIPT, path, analysis) == loaded
+
+
+def _loaded(script, path, analysis):
+    out = subprocess.run(
+        [sys.executable, '-c', script, path, analysis],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out)
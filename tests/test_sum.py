@@ -1,5 +1,11 @@
+import gc
+
 import pytest
 
+import analyze
+from analyzeframework import chaotic
+from analyzeframework import lang
+from analyzenumerical import lang as lang_num
 from analyzenumerical import parser
 from analyzenumerical import sum
 
@@ -48,3 +54,133 @@ def test_sum_analysis(input_path, asserts):
         abstract_state=sum.SumState,
         asserts=asserts,
     )
+
+
+def test_diff_matrix_row_updates():
+    a, b, c = (lang.Symbol(name) for name in 'abc')
+    rows = sum.DiffMatrix.initial([c, a, b])
+    entries = sum.DiffMatrix.initial([c, a, b])
+    for diff in (rows, entries):
+        diff[a, b] = 2
+        diff[c, a] = 5
+
+    rows.add_to_row(a, 3)
+    for sym in (c, a, b):
+        entries[a, sym] += 3
+    assert rows == entries
+    assert rows[a, b] == rows[b, a]
+
+    rows.forget_row(b)
+    for sym in (c, a, b):
+        entries[b, sym] = sum.TOP
+    assert rows == entries
+    assert rows[a, b] is sum.TOP
+
+
+@pytest.mark.parametrize(
+    'input_path',
+    (
+        'examples/sum/example3',
+        'examples/sum/example6',
+        'examples/sum/example8',
+    ),
+)
+def test_demand_driven_sums(input_path):
+    verdicts = []
+    for demand_driven in (False, True):
+        control = analyze.build_cfg(input_path, 'sum', sum_demand_driven=demand_driven)
+        chaotic.chaotic_iteration(control)
+        verdicts.append([
+            edge.valid()
+            for node in control.nodes.values()
+            for edge in node.out_edges
+            if isinstance(edge.statement, lang.Assert)
+        ])
+
+    assert verdicts[0] == verdicts[1]
+    assert len(control.head.state.sums.keys()) <= 8
+
+
+# The combinations of one program do not carry over to states built later
+def test_demand_driven_sums_stay_with_their_cfg():
+    full = analyze.build_cfg('examples/sum/example4', 'sum')
+    demanded = analyze.build_cfg('examples/sum/example4', 'sum', sum_demand_driven=True)
+
+    assert demanded.head.state.sums.keys() < full.head.state.sums.keys()
+    assert analyze.build_cfg('examples/sum/example4', 'sum').head.state.sums.keys() == (
+        full.head.state.sums.keys()
+    )
+    vars = full.head.state.vars
+    assert sum.SumState.initial(vars).sums.keys() == full.head.state.sums.keys()
+
+
+def test_post_transform_closure():
+    a, b, c = (lang.Symbol(name) for name in 'abc')
+    state = sum.SumState.initial([a, b, c])
+    state.sums[{a}] = 1
+    state.sums[{b}] = 2
+    state.sums[{b, c}] = 5
+
+    state.post_transform()
+
+    # c is split off b + c, then a + c and a + b + c are summed up
+    assert state.sums[{c}] == 3
+    assert state.sums[{a, c}] == 4
+    assert state.sums[{a, b, c}] == 6
+    assert state.diff[a, b] == -1
+
+
+def _known(**sums):
+    symbols = {name: lang.Symbol(name) for name in sums}
+    state = sum.SumState.initial(list(symbols.values()))
+    for name, value in sums.items():
+        state.sums[{symbols[name]}] = value
+    return state, symbols
+
+
+def test_assume_false_resets():
+    state, _ = _known(x=1, y=2)
+
+    res = state.transform(lang.Assume(lang.Falsehood()))
+
+    assert all(val is sum.BOTTOM for val in res.sums.sums.values())
+
+
+def test_assume_not_equals_known_sum():
+    state, symbols = _known(x=3)
+    x = symbols['x']
+
+    assert state.transform(lang.Assume(lang_num.NotEqualsVal(x, 4))).sums[{x}] == 3
+    res = state.transform(lang.Assume(lang_num.NotEqualsVal(x, 3)))
+    assert res.sums[{x}] is sum.BOTTOM
+
+
+@pytest.mark.parametrize('old', (sum.TOP, sum.BOTTOM))
+def test_decrement_into_unknown_sum(old):
+    state, symbols = _known(x=old, y=5)
+
+    res = state.transform(lang_num.VarDecAssignment(symbols['x'], symbols['y']))
+
+    assert res.sums[{symbols['x']}] == 4
+
+
+def test_sum_indices_live_with_their_trackers():
+    state, symbols = _known(**{'test-index-a': 1, 'test-index-b': 2})
+    keys = tuple(state.sums.keys())
+    assert sum.SumState.initial(list(symbols.values())).sums.index() is state.sums.index()
+
+    del state
+    gc.collect()
+
+    assert keys not in sum._SumIndex._INDICES
+
+
+def test_layouts_live_with_their_matrices():
+    state, symbols = _known(**{'test-layout-a': 1, 'test-layout-b': 2})
+    vars = tuple(symbols.values())
+    assert sum.SumState.initial(list(vars)).diff.layout is state.diff.layout
+
+    del state
+    gc.collect()
+
+    assert vars not in sum._Layout._LAYOUTS
@@ -0,0 +1,41 @@
+from pysmt import shortcuts
+
+from analyzeframework import validity
+
+
+def test_verdicts_are_cached():
+    checker = validity.ValidityChecker()
+    a = shortcuts.Symbol('test-validity-a')
+    b = shortcuts.Symbol('test-validity-b')
+    state = shortcuts.And(a, shortcuts.Implies(a, b))
+
+    assert checker.valid(state, b)
+    assert not checker.valid(state, shortcuts.Not(a))
+    assert checker.valid(shortcuts.And(a, shortcuts.Implies(a, b)), b)
+
+    assert checker.checks == 3
+    assert checker.solver_calls == 2
+
+
+def test_checks_do_not_leak_assertions():
+    checker = validity.ValidityChecker()
+    a = shortcuts.Symbol('test-validity-a')
+
+    assert checker.valid(a, a)
+    assert not checker.valid(shortcuts.TRUE(), a)
+    assert checker.valid(shortcuts.Not(a), shortcuts.Not(a))
+
+
+def test_cache_is_bounded():
+    checker = validity.ValidityChecker(max_cached=2)
+    a, b, c = (shortcuts.Symbol(f'test-validity-{name}') for name in 'abc')
+
+    assert checker.valid(a, a)
+    assert checker.valid(b, b)
+    assert checker.valid(a, a)
+    assert checker.valid(c, c)
+    assert checker.solver_calls == 3
+
+    # b was the least recently used
+    assert checker.valid(a, a) and checker.valid(b, b)
+    assert checker.solver_calls == 4